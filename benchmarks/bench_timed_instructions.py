@@ -0,0 +1,471 @@
+"""Benchmarks for the timed instructions engine.
+
+The benchmarks are run on instructions shaped like the output of a real shot, with
+digital and analog channels made of long constant steps, ramps, pulse trains and
+short arbitrary waveforms.
+
+Run the benchmarks and store the results in a JSON file with::
+
+    python benchmarks/bench_timed_instructions.py run --output results.json
+
+Compare the results of two runs, for example before and after a change, with::
+
+    python benchmarks/bench_timed_instructions.py compare before.json after.json
+
+The comparison exits with a non-zero status if a benchmark got slower than the given
+threshold.
+
+Benchmarks of functions that don't exist in the benchmarked version of the package are
+skipped, so that older versions can be compared with newer ones.
+"""
+
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import json
+import pickle
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable, Iterator, Mapping
+from datetime import datetime, timezone
+from typing import Any
+
+import attrs
+import numpy as np
+
+from caqtus.shot_compilation.timed_instructions import (
+    Pattern,
+    TimedInstruction,
+    concatenate,
+    convert_to_change_arrays,
+    create_ramp,
+    merge_instructions,
+    stack_instructions,
+    with_name,
+)
+
+
+@attrs.frozen
+class ShotShape:
+    """The shape of the shot on which the benchmarks are run.
+
+    Attributes:
+        digital_channels: The number of digital channels.
+        analog_channels: The number of analog channels.
+        ticks: The number of time steps of the shot.
+        steps: The number of steps in the shot.
+            Each step is a segment of the shot in which the channels have a single
+            type of output.
+        seed: The seed of the random generator used to build the channels.
+    """
+
+    digital_channels: int = 30
+    analog_channels: int = 30
+    ticks: int = 10**7
+    steps: int = 200
+    seed: int = 0
+
+
+# Steps shorter than this can contain pulse trains and explicit waveforms.
+# Longer steps are only constants and ramps, as is the case in real shots where long
+# steps are used to wait or to sweep a parameter.
+_SHORT_STEP = 20_000
+
+
+@attrs.frozen
+class Shot:
+    """The instructions on which the benchmarks are run.
+
+    The steps of each channel are kept separate, so that their concatenation can be
+    benchmarked.
+    """
+
+    digital_steps: dict[str, list[TimedInstruction[np.bool_]]]
+    analog_steps: dict[str, list[TimedInstruction[np.float64]]]
+
+    @classmethod
+    def build(cls, shape: ShotShape) -> Shot:
+        rng = np.random.default_rng(shape.seed)
+        durations = _split_duration(shape.ticks, shape.steps, rng)
+        digital_steps = {
+            f"digital {i}": [_digital_step(duration, rng) for duration in durations]
+            for i in range(shape.digital_channels)
+        }
+        analog_steps = {
+            f"analog {i}": [_analog_step(duration, rng) for duration in durations]
+            for i in range(shape.analog_channels)
+        }
+        return cls(digital_steps, analog_steps)
+
+    def digital_channels(self) -> dict[str, TimedInstruction[np.bool_]]:
+        return {name: concatenate(*steps) for name, steps in self.digital_steps.items()}
+
+    def analog_channels(self) -> dict[str, TimedInstruction[np.float64]]:
+        return {name: concatenate(*steps) for name, steps in self.analog_steps.items()}
+
+
+def _split_duration(ticks: int, steps: int, rng: np.random.Generator) -> list[int]:
+    # Step durations are spread over several orders of magnitude, like in a real shot
+    # where a few long steps are surrounded by many short ones.
+    weights = np.exp(rng.uniform(0, np.log(10**4), size=steps))
+    durations = np.maximum(np.floor(weights / weights.sum() * ticks), 1).astype(int)
+    durations[np.argmax(durations)] += ticks - durations.sum()
+    return [int(duration) for duration in durations]
+
+
+def _digital_step(duration: int, rng: np.random.Generator) -> TimedInstruction:
+    if duration <= _SHORT_STEP and rng.random() < 0.3:
+        period = int(rng.integers(2, 50))
+        high = int(rng.integers(1, period))
+        block = Pattern([True] * high + [False] * (period - high))
+        repetitions, remainder = divmod(duration, period)
+        return block * repetitions + block[:remainder]
+    return Pattern([bool(rng.integers(2))]) * duration
+
+
+def _analog_step(duration: int, rng: np.random.Generator) -> TimedInstruction:
+    kind = rng.random()
+    if duration <= _SHORT_STEP and kind < 0.1:
+        block = Pattern(rng.uniform(-10, 10, size=min(duration, 1000)))
+        repetitions, remainder = divmod(duration, len(block))
+        return block * repetitions + block[:remainder]
+    if kind < 0.4:
+        start, stop = rng.uniform(-10, 10, size=2)
+        return create_ramp(start, stop, duration)
+    return Pattern([rng.uniform(-10, 10)]) * duration
+
+
+def _deep_tree(depth: int) -> TimedInstruction[np.float64]:
+    instruction = Pattern([0.0, 1.0]) * 3 + create_ramp(0, 1, 5)
+    for level in range(depth):
+        instruction = (instruction + Pattern([float(level)])) * 3 + create_ramp(
+            level, 0, 7
+        )
+    return instruction
+
+
+def _random_slices(
+    length: int, count: int, rng: np.random.Generator
+) -> list[tuple[int, int]]:
+    bounds = np.sort(rng.integers(0, length + 1, size=(count, 2)), axis=1)
+    return [(int(start), int(stop)) for start, stop in bounds]
+
+
+type Benchmark = Callable[[Shot], Callable[[], object]]
+"""A function that prepares the inputs of a benchmark and returns the code to time."""
+
+
+class SkipBenchmarkError(Exception):
+    """Raised when a benchmark can't run on this version of the package."""
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(name: str) -> Callable[[Benchmark], Benchmark]:
+    def decorator(func: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+@benchmark("concatenate.channels")
+def _(shot: Shot):
+    return lambda: (shot.digital_channels(), shot.analog_channels())
+
+
+@benchmark("merge_instructions.digital")
+def _(shot: Shot):
+    channels = shot.digital_channels()
+    return lambda: merge_instructions(**channels)
+
+
+@benchmark("merge_instructions.analog")
+def _(shot: Shot):
+    channels = shot.analog_channels()
+    return lambda: merge_instructions(**channels)
+
+
+@benchmark("stack_instructions.halves")
+def _(shot: Shot):
+    named = [
+        with_name(channel, name) for name, channel in shot.digital_channels().items()
+    ]
+    first = stack_instructions(*named[: len(named) // 2])
+    second = stack_instructions(*named[len(named) // 2 :])
+    return lambda: stack_instructions(first, second)
+
+
+@benchmark("slice.merged_shot")
+def _(shot: Shot):
+    merged = merge_instructions(**shot.digital_channels())
+    slices = _random_slices(len(merged), 200, np.random.default_rng(0))
+    return lambda: [merged[start:stop] for start, stop in slices]
+
+
+@benchmark("slice.deep_tree")
+def _(shot: Shot):
+    tree = _deep_tree(12)
+    slices = _random_slices(len(tree), 200, np.random.default_rng(0))
+    return lambda: [tree[start:stop] for start, stop in slices]
+
+
+@benchmark("to_pattern.digital_channel")
+def _(shot: Shot):
+    channel = next(iter(shot.digital_channels().values()))
+    return channel.to_pattern
+
+
+@benchmark("to_pattern.analog_channel")
+def _(shot: Shot):
+    channel = next(iter(shot.analog_channels().values()))
+    return channel.to_pattern
+
+
+@benchmark("convert_to_change_arrays.digital")
+def _(shot: Shot):
+    merged = merge_instructions(**shot.digital_channels())
+    return lambda: convert_to_change_arrays(merged)
+
+
+@benchmark("convert_to_change_arrays.analog")
+def _(shot: Shot):
+    merged = merge_instructions(**shot.analog_channels())
+    return lambda: convert_to_change_arrays(merged)
+
+
+@benchmark("ramp.concatenate")
+def _(shot: Shot):
+    rng = np.random.default_rng(0)
+    values = rng.uniform(-10, 10, size=(10_000, 2))
+    return lambda: concatenate(
+        *(create_ramp(start, stop, 100) for start, stop in values)
+    )
+
+
+@benchmark("ramp.piecewise_linear")
+def _(shot: Shot):
+    try:
+        from caqtus.shot_compilation.timed_instructions import create_piecewise_linear
+    except ImportError as error:
+        raise SkipBenchmarkError(error) from None
+
+    rng = np.random.default_rng(0)
+    starts, stops = rng.uniform(-10, 10, size=(2, 10_000))
+    return lambda: create_piecewise_linear(starts, stops, np.full(10_000, 100))
+
+
+@benchmark("ramp.slice")
+def _(shot: Shot):
+    ramp = create_ramp(0, 1, 10**7)
+    slices = _random_slices(len(ramp), 10_000, np.random.default_rng(0))
+    return lambda: [ramp[start:stop] for start, stop in slices]
+
+
+@benchmark("ramp.to_pattern")
+def _(shot: Shot):
+    ramp = create_ramp(0, 1, 10**7)
+    return ramp.to_pattern
+
+
+@benchmark("ramp.merge")
+def _(shot: Shot):
+    ramps = {
+        f"ramp {i}": create_ramp(0, i, 1000) * 10 + create_ramp(i, 0, 10**4)
+        for i in range(30)
+    }
+    return lambda: merge_instructions(**ramps)
+
+
+@benchmark("pickle.dumps")
+def _(shot: Shot):
+    merged = merge_instructions(**shot.analog_channels())
+    return lambda: pickle.dumps(merged, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+@benchmark("pickle.loads")
+def _(shot: Shot):
+    merged = merge_instructions(**shot.analog_channels())
+    pickled = pickle.dumps(merged, protocol=pickle.HIGHEST_PROTOCOL)
+    return lambda: pickle.loads(pickled)
+
+
+@benchmark("encoding.encode")
+def _(shot: Shot):
+    try:
+        from caqtus.shot_compilation.timed_instructions import encode_instruction
+    except ImportError as error:
+        raise SkipBenchmarkError(error) from None
+
+    merged = merge_instructions(**shot.analog_channels())
+    return lambda: encode_instruction(merged)
+
+
+@benchmark("encoding.decode")
+def _(shot: Shot):
+    try:
+        from caqtus.shot_compilation.timed_instructions import (
+            decode_instruction,
+            encode_instruction,
+        )
+    except ImportError as error:
+        raise SkipBenchmarkError(error) from None
+
+    encoded = encode_instruction(merge_instructions(**shot.analog_channels()))
+    return lambda: decode_instruction(encoded)
+
+
+def run_benchmarks(
+    shape: ShotShape, pattern: str = "*", repeat: int = 5
+) -> dict[str, Any]:
+    """Runs the benchmarks whose name matches the pattern.
+
+    Each benchmark is run `repeat` times, and the duration of each run is recorded.
+
+    Returns:
+        A JSON serializable dictionary with the results and the conditions of the run.
+    """
+
+    shot = Shot.build(shape)
+    results = {}
+    for name, func in _matching(pattern):
+        try:
+            code = func(shot)
+        except SkipBenchmarkError:
+            print(f"{name:<40} {'skipped':>15}", file=sys.stderr)
+            continue
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            code()
+            times.append(time.perf_counter() - start)
+        results[name] = {
+            "min": min(times),
+            "median": statistics.median(times),
+            "times": times,
+        }
+        print(f"{name:<40} {min(times) * 1e3:>12.3f} ms", file=sys.stderr)
+    return {"metadata": _metadata(shape, repeat), "results": results}
+
+
+def compare_results(
+    before: Mapping[str, Any], after: Mapping[str, Any], threshold: float
+) -> bool:
+    """Prints the ratio of the durations of two runs.
+
+    The minimum duration of each benchmark is compared, since it is the least
+    sensitive to noise from the rest of the system.
+
+    Returns:
+        True if no benchmark got slower by more than the threshold, False otherwise.
+    """
+
+    passed = True
+    before_results = before["results"]
+    after_results = after["results"]
+    for name in sorted(before_results.keys() & after_results.keys()):
+        ratio = after_results[name]["min"] / before_results[name]["min"]
+        is_regression = ratio > threshold
+        passed &= not is_regression
+        print(f"{name:<40} {ratio:>8.2f}x" + ("  REGRESSION" if is_regression else ""))
+    for name in sorted(before_results.keys() ^ after_results.keys()):
+        print(f"{name:<40} {'missing':>9}")
+    return passed
+
+
+def _matching(pattern: str) -> Iterator[tuple[str, Benchmark]]:
+    for name, func in BENCHMARKS.items():
+        if fnmatch.fnmatch(name, pattern):
+            yield name, func
+
+
+def _metadata(shape: ShotShape, repeat: int) -> dict[str, Any]:
+    return {
+        "date": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "shape": attrs.asdict(shape),
+        "repeat": repeat,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def main(argv: list[str] | None = None) -> int:
+    default_shape = ShotShape()
+    # The docstring is stripped when running with -OO.
+    description = __doc__.splitlines()[0] if __doc__ else None
+    parser = argparse.ArgumentParser(description=description)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument("--output", "-o", help="File to write the results to.")
+    run_parser.add_argument(
+        "--filter", "-k", default="*", help="Glob pattern of benchmarks to run."
+    )
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--ticks", type=int, default=default_shape.ticks)
+    run_parser.add_argument(
+        "--digital-channels", type=int, default=default_shape.digital_channels
+    )
+    run_parser.add_argument(
+        "--analog-channels", type=int, default=default_shape.analog_channels
+    )
+    run_parser.add_argument("--steps", type=int, default=default_shape.steps)
+    run_parser.add_argument("--seed", type=int, default=default_shape.seed)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare the results of two runs."
+    )
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="Ratio of durations above which a benchmark is considered a regression.",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        shape = ShotShape(
+            digital_channels=args.digital_channels,
+            analog_channels=args.analog_channels,
+            ticks=args.ticks,
+            steps=args.steps,
+            seed=args.seed,
+        )
+        results = run_benchmarks(shape, args.filter, args.repeat)
+        dumped = json.dumps(results, indent=2)
+        if args.output is None:
+            print(dumped)
+        else:
+            with open(args.output, "w") as file:
+                file.write(dumped)
+        return 0
+    else:
+        with open(args.before) as file:
+            before = json.load(file)
+        with open(args.after) as file:
+            after = json.load(file)
+        return 0 if compare_results(before, after, args.threshold) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,13 +18,16 @@ from caqtus.types.timelane import CameraTimeLane, TakePicture
 from ._configuration import CameraConfiguration
 from ..sequencer import TimeStep
 from ..sequencer.compilation import TriggerableDeviceCompiler
-from ..sequencer.timing import ns, number_time_steps_between
+from ..sequencer.timing import ns, step_start_time_steps
 from ...types.image.roi import RectangularROI
 
 
 class CameraCompiler(TriggerableDeviceCompiler):
     """Computes parameters for a camera device."""
 
+    # The parameters only depend on what is read from the shot context.
+    reuse_shot_parameters = True
+
     def __init__(self, device_name: DeviceName, sequence_context: SequenceContext):
         super().__init__(device_name, sequence_context)
         self.__device_name = device_name
@@ -127,14 +130,13 @@ class CameraCompiler(TriggerableDeviceCompiler):
         """
 
         step_bounds = shot_context.get_step_start_times()
+        time_steps = step_start_time_steps(step_bounds, sequencer_time_step)
 
         instructions: list[TimedInstruction[np.bool_]] = []
         for value, (start, stop) in zip(
             self.__lane.block_values(), self.__lane.block_bounds(), strict=True
         ):
-            length = number_time_steps_between(
-                step_bounds[start], step_bounds[stop], sequencer_time_step
-            )
+            length = int(time_steps[stop] - time_steps[start])
             if isinstance(value, TakePicture):
                 if length == 0:
                     raise InvalidValueError(
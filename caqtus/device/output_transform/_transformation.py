@@ -11,7 +11,7 @@ from caqtus.types.expression import Expression
 from caqtus.types.parameter import Parameters
 from caqtus.types.recoverable_exceptions import InvalidTypeError
 from caqtus.types.units import is_scalar_quantity, Quantity, dimensionless
-from caqtus.types.units.base import BaseUnit
+from caqtus.types.units.base import BaseUnit, magnitude_in_base_units
 from caqtus.types.variable_name import DottedVariableName
 
 
@@ -58,7 +58,8 @@ def evaluate(input_: EvaluableOutput, variables: Parameters) -> OutputValue:
         if isinstance(evaluated, (float, int, bool)):
             result = evaluated
         elif is_scalar_quantity(evaluated):
-            result = evaluated.to_base_units()
+            magnitude, unit = magnitude_in_base_units(evaluated)
+            result = magnitude if unit == dimensionless else Quantity(magnitude, unit)
         else:
             raise InvalidTypeError(
                 f"{fmt.expression(input_)} does not evaluate to a parameter, "
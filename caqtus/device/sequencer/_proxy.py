@@ -2,8 +2,12 @@ import contextlib
 from typing import TypeVar
 
 from caqtus.device.remote import DeviceProxy, AsyncConverter
-from caqtus.shot_compilation.timed_instructions import TimedInstruction
-from .runtime import Sequencer
+from caqtus.shot_compilation.timed_instructions import (
+    TimedInstruction,
+    encode_instruction,
+    decode_instruction,
+)
+from .runtime import Sequencer, ProgrammedSequence
 from .trigger import Trigger
 from ..remote.rpc import Proxy
 
@@ -13,8 +17,12 @@ SequencerType = TypeVar("SequencerType", bound=Sequencer)
 class SequencerProxy(DeviceProxy[SequencerType]):
     @contextlib.asynccontextmanager
     async def program_sequence(self, sequence: TimedInstruction):
-        async with self.call_method_proxy_result(
-            "program_sequence", sequence
+        # The sequence is sent with its binary encoding, which is much smaller and
+        # faster to decode than the pickled instruction tree.
+        async with self.async_converter.call_proxy_result(
+            _program_encoded_sequence,
+            self._device_proxy,
+            encode_instruction(sequence),
         ) as sequence_proxy:
             yield ProgrammedSequenceProxy(self.async_converter, sequence_proxy)
 
@@ -22,6 +30,12 @@ class SequencerProxy(DeviceProxy[SequencerType]):
         return await self.get_attribute("trigger")
 
 
+def _program_encoded_sequence(
+    sequencer: Sequencer, encoded_sequence: bytes
+) -> ProgrammedSequence:
+    return sequencer.program_sequence(decode_instruction(encoded_sequence))
+
+
 class ProgrammedSequenceProxy:
     def __init__(self, async_converter: AsyncConverter, proxy: Proxy):
         self._async_converter = async_converter
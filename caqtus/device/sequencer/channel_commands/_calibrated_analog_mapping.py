@@ -19,6 +19,8 @@ from caqtus.shot_compilation.timed_instructions import (
     Repeated,
     Ramp,
     create_ramp,
+    PiecewiseLinear,
+    create_piecewise_linear,
 )
 from caqtus.types.units import Unit, InvalidDimensionalityError, Quantity, dimensionless
 from caqtus.types.variable_name import DottedVariableName
@@ -311,16 +313,53 @@ class DimensionlessCalibration:
 
     @_apply_without_checks.register
     def _apply_calibration_ramp(self, r: Ramp) -> TimedInstruction[np.float64]:
-        # Ramp maps t -> x(t) = a + (b - a) * t / length
-        # Calibration maps x -> y in a piecewise linear way
-        # We want to map t -> y(t)
-        length = len(r)
         a = r.start
         b = r.stop
+        length = len(r)
 
         if a == b:
             return Pattern([self._apply_explicit(a)]) * length
 
+        segments = self._map_linear_segment(float(a), float(b), length)
+        if len(segments) == 1:
+            y_0, y_1, segment_length = segments[0]
+            if segment_length == 1:
+                return Pattern([y_0])
+            return create_ramp(y_0, y_1, segment_length)
+        return create_piecewise_linear(*zip(*segments, strict=True))
+
+    @_apply_without_checks.register
+    def _apply_calibration_piecewise_linear(
+        self, instruction: PiecewiseLinear
+    ) -> TimedInstruction[np.float64]:
+        segments = []
+        for a, b, length in zip(
+            instruction.starts,
+            instruction.stops,
+            np.diff(instruction.bounds),
+            strict=True,
+        ):
+            if a == b:
+                y = float(self._apply_explicit(a))
+                segments.append((y, y, int(length)))
+            else:
+                segments.extend(self._map_linear_segment(float(a), float(b), length))
+        return create_piecewise_linear(*zip(*segments, strict=True))
+
+    def _map_linear_segment(
+        self, a: float, b: float, length: int
+    ) -> list[tuple[float, float, int]]:
+        """Maps a non-constant linear segment through the calibration.
+
+        Returns:
+            The (start, stop, length) of the linear segments of the output.
+        """
+
+        # Ramp maps t -> x(t) = a + (b - a) * t / length
+        # Calibration maps x -> y in a piecewise linear way
+        # We want to map t -> y(t)
+        assert a != b
+
         def map_x_segment_to_t(x_0, x_1) -> tuple[float, float]:
             if b > a:
                 return length * (x_0 - a) / (b - a), length * (x_1 - a) / (b - a)
@@ -343,24 +382,30 @@ class DimensionlessCalibration:
             i_max = math.ceil(higher)
             sections.append((i_min, i_max))
 
-        sub_ramps = []
+        segments = []
         for i_min, i_max in sections:
             if i_max == i_min:
                 continue
-            in_0 = evaluate_ramp(r, i_min)
-            y_0 = self._apply_explicit(in_0)
+            y_0 = float(self._apply_explicit(_evaluate_linear(a, b, length, i_min)))
             if i_max == i_min + 1:
-                sub_ramps.append(Pattern([y_0]))
+                segments.append((y_0, y_0, 1))
             else:
-                in_1 = evaluate_ramp(r, i_max - 1)
-                y_1 = self._apply_explicit(in_1)
-                length = i_max - i_min
-                sub_ramp = create_ramp(
-                    y_0, y_0 + length * (y_1 - y_0) / (length - 1), i_max - i_min
+                in_1 = _evaluate_linear(a, b, length, i_max - 1)
+                y_1 = float(self._apply_explicit(in_1))
+                section_length = i_max - i_min
+                segments.append(
+                    (
+                        y_0,
+                        y_0 + section_length * (y_1 - y_0) / (section_length - 1),
+                        section_length,
+                    )
                 )
-                sub_ramps.append(sub_ramp)
-        return concatenate(*sub_ramps)
+        return segments
 
 
 def evaluate_ramp(r: Ramp, t) -> float:
-    return r.start + (r.stop - r.start) * t / len(r)
+    return _evaluate_linear(r.start, r.stop, len(r), t)
+
+
+def _evaluate_linear(a, b, length: int, t) -> float:
+    return a + (b - a) * t / length
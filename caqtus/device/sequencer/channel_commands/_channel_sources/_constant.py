@@ -16,6 +16,7 @@ from caqtus.shot_compilation.timed_instructions import Pattern
 from caqtus.types.expression import Expression
 from caqtus.types.recoverable_exceptions import InvalidTypeError
 from caqtus.types.units import Quantity, Unit, dimensionless
+from caqtus.types.units.base import magnitude_in_base_units
 from caqtus.types.variable_name import DottedVariableName
 from ...timing import TimeStep, number_time_steps
 
@@ -69,9 +70,8 @@ class Constant(ChannelOutput):
 
 def split_magnitude_units(value: Any) -> tuple[bool | int | float, Optional[Unit]]:
     if isinstance(value, Quantity):
-        in_base_units = value.to_base_units()
-        magnitude = float(in_base_units.magnitude)
-        units = in_base_units.units if in_base_units.units != dimensionless else None
+        magnitude, base_units = magnitude_in_base_units(value)
+        units = base_units if base_units != dimensionless else None
     elif isinstance(value, bool):
         magnitude = value
         units = None
@@ -6,16 +6,10 @@ import attrs
 
 import caqtus.formatter as fmt
 from caqtus.shot_compilation import ShotContext
-from caqtus.shot_compilation.lane_compilation import (
-    compile_digital_lane,
-    compile_analog_lane,
-    DimensionedSeries,
-)
+from caqtus.shot_compilation.lane_compilation import DimensionedSeries
 from caqtus.shot_compilation.timed_instructions import Pattern
 from caqtus.shot_compilation.timing import Time
-from caqtus.types.recoverable_exceptions import InvalidValueError, InvalidTypeError
-from caqtus.types.timelane import DigitalTimeLane, AnalogTimeLane
-from caqtus.types.units import dimensionless
+from caqtus.types.recoverable_exceptions import InvalidValueError
 from caqtus.types.variable_name import DottedVariableName
 from ..channel_output import ChannelOutput
 from ...timing import TimeStep, ns
@@ -67,7 +61,7 @@ class LaneValues(ChannelOutput):
 
         lane_name = self.lane
         try:
-            lane = shot_context.get_lane(lane_name)
+            shot_context.get_lane(lane_name)
         except KeyError:
             if self.default is not None:
                 return self.default.evaluate(
@@ -80,26 +74,7 @@ class LaneValues(ChannelOutput):
                 raise InvalidValueError(
                     f"Could not find {fmt.lane(lane_name)}"
                 ) from None
-        if isinstance(lane, DigitalTimeLane):
-            lane_values = compile_digital_lane(
-                lane,
-                shot_context.get_step_start_times(),
-                Time(required_time_step * ns),
-                shot_context.get_parameters(),
-            )
-            result = DimensionedSeries(lane_values, units=dimensionless)
-        elif isinstance(lane, AnalogTimeLane):
-            result = compile_analog_lane(
-                lane,
-                shot_context.get_parameters(),
-                shot_context.get_step_start_times(),
-                Time(required_time_step * ns),
-            )
-        else:
-            raise InvalidTypeError(
-                f"Don't know how to compile lane {fmt.lane(lane_name)} with type "
-                f"{fmt.type_(type(lane))}"
-            )
+        result = shot_context.compile_lane(lane_name, Time(required_time_step * ns))
 
         prepend_value = result.values[0]
         prepend_pattern = prepend * Pattern([prepend_value])
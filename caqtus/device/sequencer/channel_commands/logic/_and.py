@@ -1,4 +1,3 @@
-import functools
 from typing import Any, Mapping
 
 import attrs
@@ -7,14 +6,7 @@ import numpy as np
 from caqtus.device.sequencer.channel_commands import ChannelOutput
 from caqtus.shot_compilation import ShotContext
 from caqtus.shot_compilation.lane_compilation import DimensionedSeries
-from caqtus.shot_compilation.timed_instructions import (
-    Concatenated,
-    Pattern,
-    Repeated,
-    TimedInstruction,
-    concatenate,
-    merge_instructions,
-)
+from caqtus.shot_compilation.timed_instructions import combine_instructions
 from caqtus.types.recoverable_exceptions import InvalidTypeError
 from caqtus.types.units import dimensionless
 from caqtus.types.variable_name import DottedVariableName
@@ -70,11 +62,7 @@ class AndGate(ChannelOutput):
                 f"not a logic level."
             )
         assert input_2.units is dimensionless
-        merged = merge_instructions(
-            lhs=input_1.values,
-            rhs=input_2.values,
-        )
-        result = binary_operator(merged, np.logical_and)
+        result = combine_instructions(input_1.values, input_2.values, np.bitwise_and)
         return DimensionedSeries(result, dimensionless)
 
     def evaluate_max_advance_and_delay(
@@ -141,11 +129,7 @@ class OrGate(ChannelOutput):
                 f"not a logic level."
             )
         assert input_2.units is dimensionless
-        merged = merge_instructions(
-            lhs=input_1.values,
-            rhs=input_2.values,
-        )
-        result = binary_operator(merged, np.logical_or)
+        result = combine_instructions(input_1.values, input_2.values, np.bitwise_or)
         return DimensionedSeries(result, dimensionless)
 
     def evaluate_max_advance_and_delay(
@@ -212,11 +196,7 @@ class XorGate(ChannelOutput):
                 f"not a logic level."
             )
         assert input_2.units is dimensionless
-        merged = merge_instructions(
-            lhs=input_1.values,
-            rhs=input_2.values,
-        )
-        result = binary_operator(merged, np.logical_xor)
+        result = combine_instructions(input_1.values, input_2.values, np.bitwise_xor)
         return DimensionedSeries(result, dimensionless)
 
     def evaluate_max_advance_and_delay(
@@ -233,30 +213,3 @@ class XorGate(ChannelOutput):
         advance = max(advance_1, advance_2)
         delay = max(delay_1, delay_2)
         return advance, delay
-
-
-@functools.singledispatch
-def binary_operator(instr: TimedInstruction, op) -> TimedInstruction:
-    raise NotImplementedError(
-        f"Cannot apply binary operator to instruction with type {type(instr)}"
-    )
-
-
-@binary_operator.register
-def _(instr: Pattern, op) -> TimedInstruction:
-    lhs = instr["lhs"]
-    rhs = instr["rhs"]
-    return Pattern.create_without_copy(op(lhs, rhs))
-
-
-@binary_operator.register
-def _(instr: Concatenated, op) -> TimedInstruction:
-    result = []
-    for instruction in instr.instructions:
-        result.append(binary_operator(instruction, op))
-    return concatenate(*result)
-
-
-@binary_operator.register
-def _(instr: Repeated, op) -> TimedInstruction:
-    return instr.repetitions * binary_operator(instr.instruction, op)
@@ -45,7 +45,7 @@ class NotGate(ChannelOutput):
                 "logic level."
             )
         assert input_.units is dimensionless
-        return DimensionedSeries(input_.values.apply(np.logical_not), dimensionless)
+        return DimensionedSeries(input_.values.apply(np.invert), dimensionless)
 
     def evaluate_max_advance_and_delay(
         self,
@@ -14,6 +14,7 @@ from caqtus.types.units import (
     InvalidDimensionalityError,
     NANOSECOND,
 )
+from caqtus.types.units.base import magnitude_in_unit
 from caqtus.types.variable_name import DottedVariableName
 from ..channel_output import ChannelOutput
 from ...timing import TimeStep
@@ -140,7 +141,7 @@ def _evaluate_in_nanoseconds(
     if not is_scalar_quantity(evaluated):
         raise InvalidValueError("Advance must be a scalar quantity.")
     try:
-        evaluated_advance = evaluated.to_unit(NANOSECOND).magnitude
+        evaluated_advance = magnitude_in_unit(evaluated, NANOSECOND)
     except DimensionalityError as e:
         raise InvalidDimensionalityError(
             f"Advance must be expressed in seconds, not {evaluated.units}"
@@ -9,14 +9,17 @@ from caqtus.device import DeviceName
 from caqtus.shot_compilation import SequenceContext, ShotContext
 from caqtus.shot_compilation.lane_compilation import DimensionedSeries
 from caqtus.shot_compilation.timed_instructions import (
-    with_name,
     stack_instructions,
+    stack_digital,
     TimedInstruction,
     Pattern,
     Ramp,
+    PiecewiseLinear,
     Concatenated,
     concatenate,
     Repeated,
+    intern_instruction,
+    defer,
 )
 from caqtus.types.recoverable_exceptions import InvalidValueError
 from caqtus.types.units import Unit, InvalidDimensionalityError, BaseUnit, dimensionless
@@ -38,13 +41,15 @@ from ..trigger import (
     Trigger,
 )
 
-
 # TODO: Can remove tblib support once the experiment manager runs in a single process
 
 
 class SequencerCompiler(TriggerableDeviceCompiler):
     """Compile parameters for a sequencer device."""
 
+    # The parameters only depend on what is read from the shot context.
+    reuse_shot_parameters = True
+
     def __init__(self, device_name: DeviceName, sequence_context: SequenceContext):
         super().__init__(device_name, sequence_context)
         configuration = sequence_context.get_device_configuration(device_name)
@@ -220,7 +225,7 @@ def compile_parallel_instructions(
         shot_context.get_parameters(),
     )
 
-    channel_instructions = []
+    channel_instructions: dict[str, TimedInstruction] = {}
     exceptions = []
     for label, to_compile in instructions.items():
         try:
@@ -230,8 +235,12 @@ def compile_parallel_instructions(
                 max_delay,
                 shot_context,
             )
-            instruction = _convert_series_to_instruction(output_series, to_compile)
-            channel_instructions.append(with_name(instruction, label))
+            instruction = _convert_series_to_instruction(
+                output_series, to_compile, label
+            )
+            # Interning shares identical sub-instructions within a channel and with
+            # the instructions of previous shots.
+            channel_instructions[label] = intern_instruction(instruction)
         except Exception as e:
             try:
                 raise ChannelCompilationError(
@@ -245,10 +254,30 @@ def compile_parallel_instructions(
             "Errors occurred when evaluating outputs",
             exceptions,
         )
-    stacked = stack_instructions(*channel_instructions)
+    stacked = stack_instructions(*_stack_digital_runs(channel_instructions))
     return stacked
 
 
+def _stack_digital_runs(
+    channel_instructions: Mapping[str, TimedInstruction],
+) -> list[TimedInstruction[np.void]]:
+    # Digital channels are left unnamed by _convert_series_to_instruction, and runs of
+    # consecutive digital channels are stacked together, possibly as packed words.
+    result = []
+    run: dict[str, TimedInstruction[np.bool_]] = {}
+    for label, instruction in channel_instructions.items():
+        if instruction.dtype == np.bool_:
+            run[label] = instruction
+            continue
+        if run:
+            result.append(stack_digital(**run))
+            run = {}
+        result.append(instruction)
+    if run:
+        result.append(stack_digital(**run))
+    return result
+
+
 def _find_max_advance_and_delays(
     outputs: Iterable[ChannelOutput],
     time_step: TimeStep,
@@ -317,7 +346,7 @@ def get_adaptive_clock(
 
 @get_adaptive_clock.register
 def _(
-    target_sequence: Pattern | Ramp, clock_pulse: TimedInstruction
+    target_sequence: Pattern | Ramp | PiecewiseLinear, clock_pulse: TimedInstruction
 ) -> TimedInstruction:
     return clock_pulse * len(target_sequence)
 
@@ -353,11 +382,21 @@ class ChannelCompilationError(Exception):
 
 
 def _convert_series_to_instruction(
-    series: DimensionedSeries, instruction: InstructionCompilationParameters
+    series: DimensionedSeries, instruction: InstructionCompilationParameters, name: str
 ) -> TimedInstruction:
     if instruction.units != series.units:
         raise InvalidDimensionalityError(
             f"Instruction {instruction.description} output has units {series.units}, "
             f"expected {instruction.units}"
         )
-    return series.values.as_type(instruction.dtype)
+    if instruction.dtype == np.bool_:
+        # Digital channels are named when they are stacked, since they can be packed
+        # together before.
+        return defer(series.values).as_type(instruction.dtype).evaluate()
+    # Both conversions are fused in a single pass over the values.
+    return (
+        defer(series.values)
+        .as_type(instruction.dtype)
+        .as_type(np.dtype([(name, instruction.dtype)]))
+        .evaluate()
+    )
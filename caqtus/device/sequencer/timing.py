@@ -1,7 +1,17 @@
 import decimal
-from typing import NewType
+from collections.abc import Sequence
+from typing import NewType, Any
 
-from caqtus.shot_compilation.timing import start_tick, stop_tick, number_ticks, Time, ps
+import numpy as np
+
+from caqtus.shot_compilation.timing import (
+    start_tick,
+    stop_tick,
+    number_ticks,
+    get_step_ticks,
+    Time,
+    ps,
+)
 
 __all__ = [
     "TimeStep",
@@ -9,6 +19,7 @@ __all__ = [
     "stop_time_step",
     "number_time_steps",
     "number_time_steps_between",
+    "step_start_time_steps",
     "to_time_step",
     "ns",
 ]
@@ -71,3 +82,19 @@ def number_time_steps_between(
     """
 
     return number_ticks(start_time, stop_time, Time(time_step * ns))
+
+
+def step_start_time_steps(
+    step_bounds: Sequence[Time], time_step: TimeStep
+) -> np.ndarray[Any, np.dtype[np.int64]]:
+    """Returns the index of the first time step at or after each step bound.
+
+    The number of time steps between the bounds i and j is ``steps[j] - steps[i]``,
+    which is the same as :func:`number_time_steps_between` for these bounds.
+
+    Args:
+        step_bounds: The start times in seconds of each step.
+        time_step: The time step in nanoseconds.
+    """
+
+    return get_step_ticks(step_bounds, Time(time_step * ns))
@@ -29,7 +29,11 @@ from caqtus.utils._trio_instrumentation import LogBlockingTaskInstrument
 from caqtus.utils.result import is_failure_type, Success
 from .._logger import logger
 from ..device_manager_extension import DeviceManagerExtensionProtocol
-from ..sequence_execution import ShotRetryConfig, run_sequence
+from ..sequence_execution import (
+    ShotCompilationConfig,
+    ShotRetryConfig,
+    run_sequence,
+)
 
 
 class ExperimentManager(abc.ABC):
@@ -197,10 +201,14 @@ class LocalExperimentManager(ExperimentManager):
         session_maker: ExperimentSessionMaker,
         device_manager_extension: DeviceManagerExtensionProtocol,
         shot_retry_config: Optional[ShotRetryConfig] = None,
+        shot_compilation_config: Optional[ShotCompilationConfig] = None,
     ):
         self._procedure_running = threading.Lock()
         self._session_maker = session_maker
         self._shot_retry_config = shot_retry_config or ShotRetryConfig()
+        self._shot_compilation_config = (
+            shot_compilation_config or ShotCompilationConfig()
+        )
         self._thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
         self._active_procedure: Optional[BoundProcedure] = None
         self._device_manager_extension = device_manager_extension
@@ -233,6 +241,7 @@ class LocalExperimentManager(ExperimentManager):
             lock=self._procedure_running,
             thread_pool=self._thread_pool,
             shot_retry_config=self._shot_retry_config,
+            shot_compilation_config=self._shot_compilation_config,
             acquisition_timeout=acquisition_timeout,
             device_manager_extension=self._device_manager_extension,
         )
@@ -262,6 +271,7 @@ class BoundProcedure(Procedure):
         shot_retry_config: ShotRetryConfig,
         device_manager_extension: DeviceManagerExtensionProtocol,
         acquisition_timeout: Optional[float] = None,
+        shot_compilation_config: Optional[ShotCompilationConfig] = None,
     ):
         self._parent = experiment_manager
         self._name = name
@@ -272,6 +282,7 @@ class BoundProcedure(Procedure):
         self._sequences: list[PureSequencePath] = []
         self._acquisition_timeout = acquisition_timeout if acquisition_timeout else -1
         self._shot_retry_config = shot_retry_config
+        self._shot_compilation_config = shot_compilation_config
         self._device_manager_extension = device_manager_extension
         self._cancel_scope: Optional[anyio.CancelScope] = None
         self._portal: Optional[anyio.from_thread.BlockingPortal] = None
@@ -362,6 +373,7 @@ class BoundProcedure(Procedure):
                         global_parameters=global_parameters,
                         device_configurations=device_configurations,
                         device_manager_extension=self._device_manager_extension,
+                        shot_compilation_config=self._shot_compilation_config,
                     )
 
         try:
@@ -10,7 +10,7 @@ from caqtus.session import ExperimentSessionMaker, PureSequencePath
 from caqtus.types.parameter import ParameterNamespace
 from .manager import ExperimentManager, Procedure, LocalExperimentManager
 from ..device_manager_extension import DeviceManagerExtensionProtocol
-from ..sequence_execution import ShotRetryConfig
+from ..sequence_execution import ShotCompilationConfig, ShotRetryConfig
 
 experiment_manager: Optional[LocalExperimentManager] = None
 
@@ -143,11 +143,13 @@ def _create_experiment_manager(
     session_maker: ExperimentSessionMaker,
     device_manager_extension: DeviceManagerExtensionProtocol,
     shot_retry_config: Optional[ShotRetryConfig] = None,
+    shot_compilation_config: Optional[ShotCompilationConfig] = None,
 ) -> None:
     global experiment_manager
     experiment_manager = LocalExperimentManager(
         session_maker=session_maker,
         shot_retry_config=shot_retry_config,
+        shot_compilation_config=shot_compilation_config,
         device_manager_extension=device_manager_extension,
     )
 
@@ -177,6 +179,7 @@ class RemoteExperimentManagerServer:
         session_maker: ExperimentSessionMaker,
         device_manager_extension: DeviceManagerExtensionProtocol,
         shot_retry_config: Optional[ShotRetryConfig] = None,
+        shot_compilation_config: Optional[ShotCompilationConfig] = None,
     ):
         self._session_maker = session_maker
         self._multiprocessing_manager = _MultiprocessingServerManager(
@@ -184,6 +187,7 @@ class RemoteExperimentManagerServer:
         )
         self._shot_retry_config = shot_retry_config
         self._shot_retry_config = shot_retry_config
+        self._shot_compilation_config = shot_compilation_config
         self._device_manager_extension = device_manager_extension
 
     def __enter__(self):
@@ -192,6 +196,7 @@ class RemoteExperimentManagerServer:
             self._session_maker,
             self._device_manager_extension,
             self._shot_retry_config,
+            self._shot_compilation_config,
         )
         self._multiprocessing_manager.enter_experiment_manager()  # type: ignore
         return self
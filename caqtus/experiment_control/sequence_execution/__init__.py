@@ -3,6 +3,7 @@
 from ._sequence_manager import (
     SequenceManager,
     ShotRetryConfig,
+    ShotCompilationConfig,
 )
 from ._sequence_manager import run_sequence
 from .shot_timing import ShotTimer
@@ -11,6 +12,7 @@ from ._logger import logger
 __all__ = [
     "SequenceManager",
     "ShotRetryConfig",
+    "ShotCompilationConfig",
     "ShotTimer",
     "run_sequence",
     "logger",
@@ -2,11 +2,11 @@ from __future__ import annotations
 
 import contextlib
 import copy
+import functools
 from collections.abc import AsyncGenerator, AsyncIterable, Mapping
 from typing import Optional
 
 import anyio
-import anyio.to_process
 
 from caqtus.device import DeviceConfiguration, DeviceName
 from caqtus.session import (
@@ -29,10 +29,20 @@ from ...types.iteration import StepsConfiguration
 from ...types.iteration._step_context import StepContext
 from ..device_manager_extension import DeviceManagerExtensionProtocol
 from ._logger import logger
-from ._shot_compiler import ShotCompilerFactory, create_shot_compiler
+from ._shot_compiler import (
+    ShotCompilerFactory,
+    ShotCompilerProtocol,
+    create_shot_compiler,
+)
 from ._shot_runner import ShotRunnerFactory, create_shot_runner
 from .sequence_runner import execute_steps
-from .shots_manager import ShotData, ShotManager, ShotRetryConfig, ShotScheduler
+from .shots_manager import (
+    ShotCompilationConfig,
+    ShotData,
+    ShotManager,
+    ShotRetryConfig,
+    ShotScheduler,
+)
 
 
 async def run_sequence(
@@ -43,7 +53,8 @@ async def run_sequence(
     device_configurations: Optional[Mapping[DeviceName, DeviceConfiguration]],
     device_manager_extension: DeviceManagerExtensionProtocol,
     shot_runner_factory: ShotRunnerFactory = create_shot_runner,
-    shot_compiler_factory: ShotCompilerFactory = create_shot_compiler,
+    shot_compiler_factory: Optional[ShotCompilerFactory] = None,
+    shot_compilation_config: Optional[ShotCompilationConfig] = None,
 ) -> None:
     """Manages the execution of a sequence.
 
@@ -80,8 +91,19 @@ async def run_sequence(
 
         shot_compiler_factory: A function that can be used to create an object to
             compile shots.
+            If None, the default shot compiler is created with the shot compilation
+            config.
+
+        shot_compilation_config: Specifies how many shots are compiled concurrently.
+            If None, the number of shots compiled concurrently is adjusted
+            automatically up to the number of CPUs of the machine.
     """
 
+    if shot_compiler_factory is None:
+        shot_compiler_factory = functools.partial(
+            create_shot_compiler, shot_compilation_config=shot_compilation_config
+        )
+
     sequence_manager = SequenceManager(
         sequence=sequence,
         session_maker=session_maker,
@@ -91,6 +113,7 @@ async def run_sequence(
         device_manager_extension=device_manager_extension,
         shot_runner_factory=shot_runner_factory,
         shot_compiler_factory=shot_compiler_factory,
+        shot_compilation_config=shot_compilation_config,
     )
 
     if not isinstance(sequence_manager.sequence_iteration, StepsConfiguration):
@@ -118,10 +141,14 @@ class SequenceManager:
         device_manager_extension: DeviceManagerExtensionProtocol,
         shot_runner_factory: ShotRunnerFactory,
         shot_compiler_factory: ShotCompilerFactory,
+        shot_compilation_config: Optional[ShotCompilationConfig] = None,
     ) -> None:
         self._session_maker = session_maker
         self._sequence_path = sequence
         self._shot_retry_config = shot_retry_config or ShotRetryConfig()
+        self._shot_compilation_config = (
+            shot_compilation_config or ShotCompilationConfig()
+        )
 
         with self._session_maker() as session:
             if device_configurations is None:
@@ -187,17 +214,14 @@ class SequenceManager:
                 self.sequence_parameters,
                 self.time_lanes,
             )
+            # The shot compiler starts its worker processes while the sequence is
+            # being prepared to avoid the overhead of starting them when the first
+            # shot is compiled.
             shot_compiler = self._shot_compiler_factory(
-                self.sequence_context,
-                self._device_manager_extension,
+                self.sequence_context, self._device_manager_extension
             )
-
-            # We start the subprocesses while preparing the sequence to avoid
-            # the overhead of starting when the sequence is launched.
-            async with anyio.create_task_group() as tg:
-                for _ in range(4):
-                    tg.start_soon(anyio.to_process.run_sync, nothing)
             async with (
+                _closing(shot_compiler),
                 self._shot_runner_factory(
                     self.sequence_context, shot_compiler, self._device_manager_extension
                 ) as shot_runner,
@@ -205,6 +229,7 @@ class SequenceManager:
                     shot_runner,
                     shot_compiler,
                     self._shot_retry_config,
+                    self._shot_compilation_config,
                 ) as (
                     scheduler_cm,
                     data_stream_cm,
@@ -266,5 +291,9 @@ class SequenceManager:
             unwrap(result)
 
 
-def nothing():
-    pass
+@contextlib.asynccontextmanager
+async def _closing(shot_compiler: ShotCompilerProtocol) -> AsyncGenerator[None, None]:
+    try:
+        yield
+    finally:
+        shot_compiler.close()
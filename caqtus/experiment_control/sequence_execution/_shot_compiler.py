@@ -1,11 +1,15 @@
 from __future__ import annotations
 
 import abc
+import concurrent.futures
+import contextlib
+import multiprocessing
+import os
 import pickle
-from collections.abc import Callable, Mapping
-from typing import Any, Protocol
+from collections.abc import AsyncIterator, Callable, Mapping
+from typing import TYPE_CHECKING, Any, Optional, Protocol
 
-import anyio.to_process
+import anyio.to_thread
 import attrs
 
 from caqtus.device import DeviceName
@@ -14,14 +18,26 @@ from caqtus.shot_compilation import (
     DeviceNotUsedException,
     SequenceContext,
 )
+from caqtus.shot_compilation._compilation_cache import DeviceCompilationCache
+from caqtus.shot_compilation._evaluation import warm_parse_cache
 from caqtus.shot_compilation.compilation_contexts import ShotContext
+from caqtus.shot_compilation.lane_compilation import clear_block_cache
 from caqtus.types._parameter_namespace import VariableNamespace
+from caqtus.types.expression import Expression, warm_expression_cache
 from caqtus.types.recoverable_exceptions import InvalidValueError
+from caqtus.utils._shared_memory_pickle import (
+    SharedMemoryPickle,
+    dump_to_shared_memory,
+    load_from_shared_memory,
+)
 from caqtus.utils._tblib import ensure_exception_pickling
 
 from ..device_manager_extension import DeviceManagerExtensionProtocol
 from ._shot_primitives import ShotParameters
 
+if TYPE_CHECKING:
+    from .shots_manager import ShotCompilationConfig
+
 
 class ShotCompilerProtocol(Protocol):
     @abc.abstractmethod
@@ -46,6 +62,14 @@ class ShotCompilerProtocol(Protocol):
     ) -> tuple[Mapping[DeviceName, Mapping[str, Any]], float]:
         raise NotImplementedError
 
+    def close(self) -> None:
+        """Releases the resources used to compile shots.
+
+        This method is called once no more shots will be compiled.
+        """
+
+        pass
+
 
 type ShotCompilerFactory = Callable[
     [SequenceContext, DeviceManagerExtensionProtocol], ShotCompilerProtocol
@@ -57,14 +81,18 @@ class ShotCompiler(ShotCompilerProtocol):
         self,
         sequence_context: SequenceContext,
         device_compilers: Mapping[DeviceName, DeviceCompiler],
+        max_workers: Optional[int] = None,
+        initial_workers: int = 4,
     ):
         self._sequence_context = sequence_context
         self.device_compilers = device_compilers
-        self.pickled_context = pickle.dumps(
+        self._worker_pool = CompileWorkerPool(
             CompilationContext(
                 sequence_context=self._sequence_context,
                 device_compilers=device_compilers,
-            )
+            ),
+            max_workers=max_workers,
+            initial_workers=initial_workers,
         )
 
     def compile_initialization_parameters(
@@ -80,23 +108,20 @@ class ShotCompiler(ShotCompilerProtocol):
     async def compile_shot(
         self, shot_parameters: ShotParameters
     ) -> tuple[Mapping[DeviceName, Mapping[str, Any]], float]:
-        # We add a deadline to shot compilation to not hang indefinitely in case of
-        # a bug.
-        with anyio.move_on_after(10):
-            # Here we send to the other process the pre-pickled compilation context and
-            # the shot parameters.
-            # It is important that we pickle the context only once and not for every
-            # shot as it can take a long time to pickle and block the event loop.
-            return await anyio.to_process.run_sync(
-                compile_shot_sync,
-                self.pickled_context,
-                shot_parameters.parameters,
-                cancellable=True,
-            )
+        # Starting a worker takes a few seconds, so the deadline only starts once a
+        # worker is ready to compile the shot.
+        async with self._worker_pool.reserve_worker():
+            # We add a deadline to shot compilation to not hang indefinitely in case of
+            # a bug.
+            with anyio.move_on_after(10):
+                return await self._worker_pool.compile_shot(shot_parameters.parameters)
         raise TimeoutError(
             "Shot compilation took too long to complete and has been terminated."
         )
 
+    def close(self) -> None:
+        self._worker_pool.close()
+
 
 @attrs.frozen
 class CompilationContext:
@@ -104,17 +129,187 @@ class CompilationContext:
     device_compilers: Mapping[DeviceName, DeviceCompiler] = attrs.field()
 
 
+class CompileWorkerPool:
+    """Processes dedicated to compiling the shots of a sequence.
+
+    The compilation context is pickled once and each worker process unpickles it once
+    when it starts.
+    Afterward, only the parameters of each shot are sent to the workers, and the
+    device compilers and the caches filled while compiling the previous shots are
+    kept in the workers for the following shots.
+    In particular, each worker reuses the device parameters it compiled for previous
+    shots when they only depend on values that didn't change.
+
+    The arrays of the compiled instructions are transferred back through shared
+    memory instead of being copied through the pipe from the worker process.
+
+    Some worker processes are started when the pool is created, so that they are
+    ready by the time the first shot must be compiled.
+    The other workers are started when more shots are compiled concurrently.
+    Use :meth:`reserve_worker` to wait for a worker to be started before compiling a
+    shot.
+
+    Args:
+        compilation_context: The context used by the workers to compile the shots.
+        max_workers: The maximum number of worker processes.
+            If None, the number of CPUs of the machine is used.
+        initial_workers: The number of worker processes started when the pool is
+            created.
+    """
+
+    def __init__(
+        self,
+        compilation_context: CompilationContext,
+        max_workers: Optional[int] = None,
+        initial_workers: int = 4,
+    ):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            # Forking the process that runs the event loop and the device servers
+            # connections is not safe, so the workers start from a fresh interpreter.
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_initialize_worker,
+            # It is important that we pickle the context only once and not for every
+            # shot as it can take a long time to pickle and block the event loop.
+            initargs=(pickle.dumps(compilation_context),),
+        )
+        self._max_workers = max_workers
+        self._limiter = anyio.CapacityLimiter(max_workers)
+        self._must_terminate = False
+        self._started_workers = 0
+        self._reserved_workers = 0
+        # Tasks submitted to start workers that might not be ready yet.
+        self._warm_ups: list[concurrent.futures.Future[None]] = []
+        for _ in range(min(initial_workers, max_workers)):
+            self._start_worker()
+
+    def _start_worker(self) -> None:
+        # Workers are only started when a task is submitted and no worker is idle.
+        self._warm_ups.append(self._executor.submit(_nothing))
+        self._started_workers += 1
+
+    @contextlib.asynccontextmanager
+    async def reserve_worker(self) -> AsyncIterator[None]:
+        """Waits until a worker is ready to compile a shot.
+
+        If all the started workers are already reserved and the pool is not full, a new
+        worker is started.
+        The context manager is entered once all the workers being started are ready,
+        so that the time to start them is not spent while compiling shots.
+        """
+
+        self._reserved_workers += 1
+        try:
+            if (
+                self._reserved_workers > self._started_workers
+                and self._started_workers < self._max_workers
+            ):
+                self._start_worker()
+            self._warm_ups = [future for future in self._warm_ups if not future.done()]
+            if pending := list(self._warm_ups):
+                await anyio.to_thread.run_sync(
+                    concurrent.futures.wait, pending, abandon_on_cancel=True
+                )
+            yield
+        finally:
+            self._reserved_workers -= 1
+
+    async def compile_shot(
+        self, shot_parameters: VariableNamespace
+    ) -> tuple[Mapping[DeviceName, Mapping[str, Any]], float]:
+        """Compiles a shot in one of the workers.
+
+        If the call is cancelled while the shot is being compiled, the worker keeps
+        compiling it and is only terminated when the pool is closed.
+        """
+
+        future = self._executor.submit(_compile_shot_in_worker, shot_parameters)
+        try:
+            result = await anyio.to_thread.run_sync(
+                future.result, abandon_on_cancel=True, limiter=self._limiter
+            )
+        except anyio.get_cancelled_exc_class():
+            if not future.cancel():
+                self._must_terminate = True
+                future.add_done_callback(_release_result)
+            raise
+        return load_from_shared_memory(result)
+
+    def close(self) -> None:
+        """Stops the worker processes.
+
+        This method doesn't wait for the workers to exit.
+        Workers that are still compiling a shot are terminated.
+        """
+
+        # noinspection PyProtectedMember
+        processes = list(
+            self._executor._processes.values()  # pyright: ignore[reportAttributeAccessIssue]
+        )
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._must_terminate:
+            # ProcessPoolExecutor.terminate_workers is only available from
+            # Python 3.14.
+            for process in processes:
+                process.terminate()
+
+
+# The compilation context of the sequence, set once when a worker process starts.
+_worker_context: Optional[CompilationContext] = None
+_worker_cache: Optional[DeviceCompilationCache] = None
+
+
+def _initialize_worker(pickled_compilation_context: bytes) -> None:
+    global _worker_context, _worker_cache
+
+    compilation_context = pickle.loads(pickled_compilation_context)
+    assert isinstance(compilation_context, CompilationContext)
+    _warm_parse_caches(compilation_context.sequence_context)
+    _worker_context = compilation_context
+    _worker_cache = DeviceCompilationCache()
+    # Forked workers inherit the blocks compiled by their parent, which are unlikely
+    # to be reused by this sequence and would only take memory.
+    clear_block_cache()
+
+
+def _warm_parse_caches(sequence_context: SequenceContext) -> None:
+    # Spawned workers start with empty caches, so all the expressions of the sequence
+    # are parsed once when the worker starts instead of when the first shot is
+    # compiled.
+    # They are parsed both for Expression.evaluate and for the evaluators of
+    # shot_compilation.
+    # noinspection PyProtectedMember
+    time_lanes = sequence_context._time_lanes
+    expressions = [
+        *time_lanes.step_durations,
+        *(
+            value
+            for lane in time_lanes.lanes.values()
+            for value in lane.block_values()
+            if isinstance(value, Expression)
+        ),
+    ]
+    warm_expression_cache(expressions)
+    warm_parse_cache(expressions)
+
+
+def _nothing() -> None:
+    pass
+
+
 @ensure_exception_pickling
 def compile_shot_sync(
-    pickled_compilation_context: bytes,
+    compilation_context: CompilationContext,
     shot_parameters: VariableNamespace,
+    compilation_cache: Optional[DeviceCompilationCache] = None,
 ) -> tuple[Mapping[DeviceName, Mapping[str, Any]], float]:
-    compilation_context = pickle.loads(pickled_compilation_context)
-    assert isinstance(compilation_context, CompilationContext)
     shot_context = ShotContext(
         sequence_context=compilation_context.sequence_context,  # pyright: ignore[reportCallIssue]
         variables=shot_parameters.dict(),  # pyright: ignore[reportCallIssue]
         device_compilers=compilation_context.device_compilers,  # pyright: ignore[reportCallIssue]
+        compilation_cache=compilation_cache,  # pyright: ignore[reportCallIssue]
     )
 
     results = {}
@@ -131,9 +326,25 @@ def compile_shot_sync(
     return results, float(shot_context.get_shot_duration())
 
 
+@ensure_exception_pickling
+def _compile_shot_in_worker(shot_parameters: VariableNamespace) -> SharedMemoryPickle:
+    assert _worker_context is not None, "The worker has not been initialized."
+    return dump_to_shared_memory(
+        compile_shot_sync(_worker_context, shot_parameters, _worker_cache)
+    )
+
+
+def _release_result(future: concurrent.futures.Future[SharedMemoryPickle]) -> None:
+    # The result of a shot that is no longer awaited must still be loaded to release
+    # its shared memory block.
+    if not future.cancelled() and future.exception() is None:
+        load_from_shared_memory(future.result())
+
+
 def create_shot_compiler(
     initial_sequence_context: SequenceContext,
     device_manager_extension: DeviceManagerExtensionProtocol,
+    shot_compilation_config: Optional[ShotCompilationConfig] = None,
 ) -> ShotCompiler:
     device_compilers = create_device_compilers(
         initial_sequence_context, device_manager_extension
@@ -145,6 +356,7 @@ def create_shot_compiler(
     shot_compiler = _create_shot_compiler(
         initial_sequence_context._with_devices(in_use_configurations),
         device_compilers=device_compilers,
+        shot_compilation_config=shot_compilation_config,
     )
     return shot_compiler
 
@@ -173,9 +385,23 @@ def create_device_compilers(
 def _create_shot_compiler(
     sequence_context: SequenceContext,
     device_compilers: Mapping[DeviceName, DeviceCompiler],
+    shot_compilation_config: Optional[ShotCompilationConfig] = None,
 ) -> ShotCompiler:
+    from .shots_manager import ShotCompilationConfig
+
+    if shot_compilation_config is None:
+        shot_compilation_config = ShotCompilationConfig()
+    # There is one worker process for each shot compiled concurrently, so the workers
+    # started initially are those needed when the sequence starts.
+    max_workers = shot_compilation_config.max_workers or os.cpu_count() or 1
+    if shot_compilation_config.adaptive:
+        initial_workers = shot_compilation_config.min_workers
+    else:
+        initial_workers = max_workers
     shot_compiler = ShotCompiler(
         sequence_context,
         device_compilers=device_compilers,
+        max_workers=max_workers,
+        initial_workers=initial_workers,
     )
     return shot_compiler
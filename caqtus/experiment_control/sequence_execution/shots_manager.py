@@ -4,15 +4,20 @@ import contextlib
 import datetime
 import functools
 import logging
+import os
 import warnings
 import weakref
 from collections.abc import AsyncIterable, Awaitable, Callable
-from typing import TypeVar
+from typing import Optional, TypeVar
 
 import anyio
 import attrs
 from anyio.abc import TaskStatus
-from anyio.streams.memory import MemoryObjectSendStream, MemoryObjectReceiveStream
+from anyio.streams.memory import (
+    MemoryObjectReceiveStream,
+    MemoryObjectSendStream,
+    MemoryObjectStreamStatistics,
+)
 
 from caqtus.device._controller import DeviceError
 from caqtus.experiment_control.sequence_execution._async_utils import (
@@ -65,6 +70,11 @@ class ShotExecutionSorter:
         except KeyError:
             pass
 
+    def statistics(self) -> MemoryObjectStreamStatistics:
+        """Returns the statistics of the underlying execution stream."""
+
+        return self._shot_execution_stream.statistics()
+
 
 class ShotManager:
     """Manages the execution of shots.
@@ -80,6 +90,7 @@ class ShotManager:
         shot_runner: The object that will actually execute the shots on the experiment.
         shot_compiler: The object that compiles shot parameters into device parameters.
         shot_retry_config: Specifies how to retry a shot if an error occurs.
+        shot_compilation_config: Specifies how many shots are compiled concurrently.
     """
 
     def __init__(
@@ -87,10 +98,14 @@ class ShotManager:
         shot_runner: ShotRunnerProtocol,
         shot_compiler: ShotCompilerProtocol,
         shot_retry_config: ShotRetryConfig,
+        shot_compilation_config: Optional[ShotCompilationConfig] = None,
     ):
         self._shot_runner = shot_runner
         self._shot_compiler = shot_compiler
         self._shot_retry_config = shot_retry_config
+        self._compilation_concurrency = CompilationConcurrency(
+            shot_compilation_config or ShotCompilationConfig()
+        )
 
         self._exit_stack = contextlib.AsyncExitStack()
 
@@ -209,7 +224,10 @@ class ShotManager:
         ):
             shot_execution_queue = ShotExecutionSorter(device_parameters_send_stream)
             async with shot_params_receive_stream:
-                for _ in range(4):
+                # A task is started for the maximum number of shots that can be
+                # compiled concurrently, and the tasks that can actually compile at a
+                # given time are limited by the current concurrency.
+                for _ in range(self._compilation_concurrency.max_workers):
                     await tg.start(
                         self._compile_shots,
                         shot_compiler,
@@ -226,17 +244,26 @@ class ShotManager:
         *,
         task_status: TaskStatus[None] = anyio.TASK_STATUS_IGNORED,
     ) -> None:
+        concurrency = self._compilation_concurrency
         # Suppress BrokenResourceError because the stream if the stream is closed due
         # to an error on the other side, we don't want to clutter the traceback.
         with contextlib.suppress(anyio.BrokenResourceError):
             async with shot_params_receive_stream:
                 task_status.started()
-                async for shot_params in shot_params_receive_stream:
-                    result = await self._compile_shot(shot_params, shot_compiler)
-                    logger.debug(
-                        "Pushing shot %d to execution queue.", shot_params.index
-                    )
-                    await shot_execution_queue.push(result)
+                while True:
+                    # The shot is pushed while holding the limiter, so that compiled
+                    # shots waiting to be executed count against the concurrency.
+                    async with concurrency.limiter:
+                        try:
+                            shot_params = await shot_params_receive_stream.receive()
+                        except anyio.EndOfStream:
+                            return
+                        result = await self._compile_shot(shot_params, shot_compiler)
+                        concurrency.update(shot_execution_queue.statistics())
+                        logger.debug(
+                            "Pushing shot %d to execution queue.", shot_params.index
+                        )
+                        await shot_execution_queue.push(result)
 
     async def _run_shot_with_retry(
         self, device_parameters: DeviceParameters, shot_runner: ShotRunnerProtocol
@@ -340,7 +367,7 @@ async def _run_shot_with_retry(
 
 
 def retry_condition(
-    retriable_exceptions: tuple[type[Exception], ...]
+    retriable_exceptions: tuple[type[Exception], ...],
 ) -> Callable[[Exception], bool]:
     def _retry_condition(e: Exception) -> bool:
         return isinstance(e, DeviceError) and isinstance(
@@ -374,6 +401,86 @@ class ShotRetryConfig:
     number_of_attempts: int = attrs.field(default=1, eq=False)
 
 
+@attrs.define
+class ShotCompilationConfig:
+    """Specifies how many shots are compiled concurrently.
+
+    Each shot is compiled in a separate process, so compiling several shots at the same
+    time uses more cores of the machine.
+
+    Attributes:
+        min_workers: The number of shots compiled concurrently when a sequence starts,
+            and the lowest number the concurrency can be reduced to.
+        max_workers: The highest number of shots compiled concurrently.
+            If None, the number of CPUs of the machine is used.
+        adaptive: If True, the number of shots compiled concurrently starts at
+            `min_workers`, is increased while the shots are executed faster than they
+            are compiled and is decreased when compiled shots are waiting for the
+            previous shots to be executed.
+            If False, `max_workers` shots are always compiled concurrently.
+    """
+
+    min_workers: int = attrs.field(
+        default=4,
+        validator=attrs.validators.ge(1),
+        on_setattr=attrs.setters.validate,
+    )
+    max_workers: Optional[int] = attrs.field(
+        default=None,
+        validator=attrs.validators.optional(attrs.validators.ge(1)),
+        on_setattr=attrs.setters.validate,
+    )
+    adaptive: bool = attrs.field(default=True)
+
+
+class CompilationConcurrency:
+    """Limits the number of shots compiled concurrently.
+
+    The current number of shots that can be compiled concurrently is the total number
+    of tokens of :attr:`limiter`.
+    """
+
+    def __init__(self, config: ShotCompilationConfig):
+        max_workers = (
+            config.max_workers
+            if config.max_workers is not None
+            else (os.cpu_count() or 1)
+        )
+        self.min_workers = min(config.min_workers, max_workers)
+        self.max_workers = max_workers
+        self.adaptive = config.adaptive
+        self.limiter = anyio.CapacityLimiter(
+            self.min_workers if self.adaptive else self.max_workers
+        )
+
+    @property
+    def workers(self) -> int:
+        """The current number of shots that can be compiled concurrently."""
+
+        return int(self.limiter.total_tokens)
+
+    def update(self, execution_queue: MemoryObjectStreamStatistics) -> None:
+        """Adjusts the concurrency after a shot has been compiled.
+
+        Args:
+            execution_queue: The statistics of the stream to which the compiled shots
+                are sent to be executed, at the time the shot has been compiled.
+        """
+
+        if not self.adaptive:
+            return
+        workers = self.workers
+        if execution_queue.tasks_waiting_receive > 0:
+            # The shot runner is idle waiting for the next shot.
+            workers = min(workers + 1, self.max_workers)
+        elif execution_queue.tasks_waiting_send > 0:
+            # A compiled shot is already waiting for the shot runner to be free.
+            workers = max(workers - 1, self.min_workers)
+        if workers != self.workers:
+            logger.debug("Compiling up to %d shots concurrently.", workers)
+            self.limiter.total_tokens = workers
+
+
 class ShotScheduler:
     def __init__(
         self,
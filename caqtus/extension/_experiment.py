@@ -34,7 +34,10 @@ from ..experiment_control.manager import (
     LocalExperimentManagerConfiguration,
     RemoteExperimentManagerConfiguration,
 )
-from ..experiment_control.sequence_execution import ShotRetryConfig
+from ..experiment_control.sequence_execution import (
+    ShotCompilationConfig,
+    ShotRetryConfig,
+)
 from ..session import ExperimentSession, StorageManager
 from ..session.sql._serializer import SerializerProtocol
 
@@ -68,6 +71,7 @@ class Experiment:
             LocalExperimentManagerConfiguration()
         )
         self._shot_retry_config: Optional[ShotRetryConfig] = None
+        self._shot_compilation_config: Optional[ShotCompilationConfig] = None
 
     def setup_default_extensions(self) -> None:
         """Register some commonly used extensions to this experiment.
@@ -128,6 +132,23 @@ class Experiment:
 
         self._shot_retry_config = shot_retry_config
 
+    def configure_shot_compilation(
+        self, shot_compilation_config: Optional[ShotCompilationConfig]
+    ) -> None:
+        """Configure how many shots are compiled concurrently when running sequences.
+
+        By default, the number of shots compiled concurrently is adjusted
+        automatically, up to the number of CPUs of the machine.
+
+        It is necessary to call this method before launching the experiment manager.
+
+        Warning:
+            Calling this method multiple times will overwrite the previous
+            configuration.
+        """
+
+        self._shot_compilation_config = shot_compilation_config
+
     def configure_experiment_manager(
         self, location: ExperimentManagerConnection
     ) -> None:
@@ -301,6 +322,7 @@ class Experiment:
                 session_maker=self.get_storage_manager(),
                 device_manager_extension=self._extension.device_manager_extension,
                 shot_retry_config=self._shot_retry_config,
+                shot_compilation_config=self._shot_compilation_config,
             )
         return self._experiment_manager
 
@@ -363,6 +385,7 @@ class Experiment:
             address=("localhost", self._experiment_manager_location.port),
             authkey=bytes(self._experiment_manager_location.authkey, "utf-8"),
             shot_retry_config=self._shot_retry_config,
+            shot_compilation_config=self._shot_compilation_config,
             device_manager_extension=self._extension.device_manager_extension,
         )
 
@@ -0,0 +1,198 @@
+"""Reuse of device parameters compiled for previous shots.
+
+Most device compilers only depend on a few parameters of a sequence, so their result
+is often the same for consecutive shots.
+While a device compiler compiles a shot, the shot context records what it reads: the
+values of the parameters, the step times and the lanes.
+The next shots for which all these values are the same reuse the result instead of
+compiling the device again.
+"""
+
+from __future__ import annotations
+
+import collections
+from collections.abc import Iterator, Mapping
+from typing import Any, Optional
+
+import attrs
+
+from caqtus.device import DeviceName
+from caqtus.types.units import Quantity
+from .timing import Time
+
+_MISSING = object()
+
+
+@attrs.define
+class Dependencies:
+    """What a device compiler read from the shot context.
+
+    Attributes:
+        parameters: The values of the parameters read, indexed by the key used to read
+            them, or a sentinel value for the parameters that were not defined.
+        all_parameters: The values of all the parameters of the shot, if the compiler
+            iterated over the parameters.
+            None otherwise.
+        step_bounds: The step times of the shot if the compiler read them, None
+            otherwise.
+        lanes: The names of the lanes marked as used.
+        reusable: False if the result depends on something that is not recorded, like
+            the parameters of a device whose compiler can't be reused.
+    """
+
+    parameters: dict[Any, Any] = attrs.field(factory=dict)
+    all_parameters: Optional[dict[Any, Any]] = None
+    step_bounds: Optional[tuple[Time, ...]] = None
+    lanes: set[str] = attrs.field(factory=set)
+    reusable: bool = True
+
+    def merge(self, other: Dependencies) -> None:
+        self.reusable &= other.reusable
+        self.parameters.update(other.parameters)
+        if other.all_parameters is not None:
+            self.all_parameters = other.all_parameters
+        if other.step_bounds is not None:
+            self.step_bounds = other.step_bounds
+        self.lanes.update(other.lanes)
+
+    def is_satisfied_by(
+        self, parameters: Mapping[Any, Any], step_bounds: tuple[Time, ...]
+    ) -> bool:
+        """Indicates if a shot has the same values for all the dependencies."""
+
+        if self.step_bounds is not None and self.step_bounds != step_bounds:
+            return False
+        if self.all_parameters is not None:
+            if not _same_parameters(self.all_parameters, parameters):
+                return False
+        for key, value in self.parameters.items():
+            if not same_value(value, _get(parameters, key)):
+                return False
+        return True
+
+
+class RecordingParameters(Mapping[Any, Any]):
+    """Gives access to the parameters of a shot and records which ones are read."""
+
+    def __init__(self, parameters: Mapping[Any, Any], recorders: list[Dependencies]):
+        self._parameters = parameters
+        self._recorders = recorders
+
+    def __getitem__(self, key: Any) -> Any:
+        value = _get(self._parameters, key)
+        self._record(key, value)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        value = _get(self._parameters, key)
+        self._record(key, value)
+        return value is not _MISSING
+
+    def __iter__(self) -> Iterator[Any]:
+        self._record_all()
+        return iter(self._parameters)
+
+    def __len__(self) -> int:
+        self._record_all()
+        return len(self._parameters)
+
+    def __getattr__(self, name: str) -> Any:
+        # Gives access to the methods of the underlying mapping, which can be used in
+        # any way, so the result depends on all the parameters.
+        self._record_all()
+        return getattr(self._parameters, name)
+
+    def _record(self, key: Any, value: Any) -> None:
+        for recorder in self._recorders:
+            recorder.parameters[key] = value
+
+    def _record_all(self) -> None:
+        for recorder in self._recorders:
+            recorder.all_parameters = dict(self._parameters)
+
+
+@attrs.frozen
+class _CachedCompilation:
+    dependencies: Dependencies
+    result: Mapping[str, Any]
+
+
+class DeviceCompilationCache:
+    """Keeps the device parameters compiled for the previous shots of a sequence.
+
+    Args:
+        max_entries_per_device: The number of results kept for each device.
+            The most recent results are kept.
+    """
+
+    def __init__(self, max_entries_per_device: int = 16):
+        self._max_entries_per_device = max_entries_per_device
+        self._entries: dict[DeviceName, collections.deque[_CachedCompilation]] = (
+            collections.defaultdict(
+                lambda: collections.deque(maxlen=self._max_entries_per_device)
+            )
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(
+        self,
+        device_name: DeviceName,
+        parameters: Mapping[Any, Any],
+        step_bounds: tuple[Time, ...],
+    ) -> Optional[tuple[Mapping[str, Any], Dependencies]]:
+        """Returns a previous result compiled with the same dependencies, if any."""
+
+        for entry in reversed(self._entries[device_name]):
+            if entry.dependencies.is_satisfied_by(parameters, step_bounds):
+                self.hits += 1
+                return entry.result, entry.dependencies
+        self.misses += 1
+        return None
+
+    def add(
+        self,
+        device_name: DeviceName,
+        dependencies: Dependencies,
+        result: Mapping[str, Any],
+    ) -> None:
+        if not dependencies.reusable:
+            return
+        self._entries[device_name].append(_CachedCompilation(dependencies, result))
+
+
+def _get(parameters: Mapping[Any, Any], key: Any) -> Any:
+    try:
+        return parameters[key]
+    except KeyError:
+        return _MISSING
+
+
+def _same_parameters(left: Mapping[Any, Any], right: Mapping[Any, Any]) -> bool:
+    if left.keys() != right.keys():
+        return False
+    return all(same_value(value, right[key]) for key, value in left.items())
+
+
+def same_value(left: Any, right: Any) -> bool:
+    """Indicates if two parameter values are identical.
+
+    Values must have the same type to be identical, and quantities must have the same
+    units, even if they are equal after conversion.
+    """
+
+    if left is right:
+        return True
+    if type(left) is not type(right):
+        return False
+    if isinstance(left, Quantity):
+        return left.units == right.units and same_value(left.magnitude, right.magnitude)
+    if isinstance(left, Mapping):
+        return _same_parameters(left, right)
+    try:
+        return bool(left == right)
+    except (TypeError, ValueError):
+        # Arrays can't be compared with a single boolean.
+        return False
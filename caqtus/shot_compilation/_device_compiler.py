@@ -24,6 +24,13 @@ class DeviceCompiler(Protocol):
     The for each shot, the method :meth:`compile_shot_parameters` is called to pass to
     the device controller for this shot.
 
+    If the compiler class defines the attribute ``reuse_shot_parameters = True``, the
+    parameters compiled for a shot are reused for the following shots that have the
+    same values for all the parameters, step times and lanes that the compiler read
+    from the shot context.
+    This must only be done if the result of the compiler doesn't depend on anything
+    else, like the index of the shot or the current time.
+
     If it is necessary to generate a trigger for the device under consideration, the
     device compiler should inherit from
     :class:`caqtus.device.sequencer.compilation.TriggerableDeviceCompiler`.
@@ -1,9 +1,37 @@
+from ._batch import (
+    evaluate_expression_batch,
+    to_parameter_table,
+    ParameterTable,
+    BatchResult,
+)
+from ._constant import Constant
+from ._constant_folding import fold_constants, fold_expressions, get_folded_constant
 from ._evaluate_scalar_expression import evaluate_scalar_expression
 from ._exceptions import UndefinedParameterError
+from ._parse import (
+    parse_expression,
+    get_parse_cache_info,
+    clear_parse_cache,
+    use_folded_expressions,
+    warm_parse_cache,
+)
 from ._time_dependent_expression import evaluate_time_dependent_digital_expression
 
 __all__ = [
     "evaluate_scalar_expression",
     "UndefinedParameterError",
     "evaluate_time_dependent_digital_expression",
+    "parse_expression",
+    "get_parse_cache_info",
+    "clear_parse_cache",
+    "warm_parse_cache",
+    "evaluate_expression_batch",
+    "to_parameter_table",
+    "ParameterTable",
+    "BatchResult",
+    "Constant",
+    "fold_constants",
+    "fold_expressions",
+    "get_folded_constant",
+    "use_folded_expressions",
 ]
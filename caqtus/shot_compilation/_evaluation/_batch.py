@@ -0,0 +1,222 @@
+"""Evaluation of expressions for many shots at once.
+
+Instead of evaluating an expression once per shot, the values of the parameters for
+all shots are given as arrays, and each operation of the expression is applied to
+whole arrays.
+Units are handled once per operation and not once per shot.
+"""
+
+from collections.abc import Mapping, Sequence
+from typing import Any, assert_never
+
+import numpy as np
+
+import caqtus.formatter as fmt
+import caqtus_parsing.nodes as nodes
+from caqtus.types.expression import Expression
+from caqtus.types.parameter import Parameters
+from caqtus.types.recoverable_exceptions import (
+    EvaluationError,
+    InvalidTypeError,
+    InvalidValueError,
+)
+from caqtus.types.units import Quantity, DimensionalityError, dimensionless
+from caqtus.types.variable_name import DottedVariableName
+from caqtus_parsing import InvalidSyntaxError
+from ._constant import Constant
+from ._constants import CONSTANTS
+from ._evaluate_scalar_expression import evaluate_quantity, UndefinedFunctionError
+from ._exceptions import UndefinedParameterError, InvalidOperationError
+from ._functions import ARRAY_FUNCTIONS, InvalidArgumentCountError
+from ._parse import parse_expression
+
+type ParameterTable = Mapping[DottedVariableName, Any]
+"""The values of parameters for several shots.
+
+Each value is either a 1D array with one element per shot, a quantity with such an
+array as magnitude, or a scalar shared by all shots.
+"""
+
+type BatchResult = np.ndarray | Quantity[np.ndarray]
+
+
+def to_parameter_table(shots: Sequence[Parameters]) -> dict[DottedVariableName, Any]:
+    """Converts the parameters of several shots to a table of arrays.
+
+    The values of a parameter with units are converted to the units of the first shot,
+    so that the table contains one magnitude array and one unit per parameter.
+
+    Args:
+        shots: The parameters of each shot.
+            All shots must define the same parameters.
+
+    Raises:
+        InvalidValueError: If the shots don't define the same parameters.
+        InvalidTypeError: If the values of a parameter don't have compatible types or
+            units across shots.
+    """
+
+    if not shots:
+        return {}
+    names = set(shots[0])
+    if any(set(shot) != names for shot in shots):
+        raise InvalidValueError("All shots must define the same parameters")
+    return {name: _stack_values(name, [shot[name] for shot in shots]) for name in names}
+
+
+def _stack_values(name: DottedVariableName, values: list[Any]) -> Any:
+    first = values[0]
+    if not isinstance(first, Quantity):
+        if any(isinstance(value, Quantity) for value in values):
+            raise InvalidTypeError(
+                f"Parameter {name} has values with and without units"
+            )
+        return np.array(values)
+    unit = first.units
+    magnitudes = np.empty(len(values), dtype=np.float64)
+    for index, value in enumerate(values):
+        if not isinstance(value, Quantity):
+            raise InvalidTypeError(
+                f"Parameter {name} has values with and without units"
+            )
+        # Values usually share the same units, in which case no conversion is needed.
+        if value.units != unit:
+            try:
+                value = value.to_unit(unit)
+            except DimensionalityError as error:
+                raise InvalidTypeError(
+                    f"Parameter {name} has values with incompatible units"
+                ) from error
+        magnitudes[index] = value.magnitude
+    return Quantity(magnitudes, unit)
+
+
+def evaluate_expression_batch(
+    expression: Expression, parameters: ParameterTable, shots: int
+) -> BatchResult:
+    """Evaluates an expression for several shots at once.
+
+    This computes the same values as :func:`evaluate_scalar_expression` called with the
+    parameters of each shot, but applies each operation to all shots at once.
+
+    Args:
+        expression: The expression to evaluate.
+        parameters: The values of the parameters for all shots, for example obtained
+            with :func:`to_parameter_table`.
+        shots: The number of shots.
+
+    Returns:
+        An array with one value per shot, or a quantity with such an array as
+        magnitude.
+        The array can be a read-only view, for example when the expression doesn't
+        depend on the parameters.
+
+    Raises:
+        EvaluationError: if an error occurred during evaluation, with the reason for the
+            error as the exception cause.
+    """
+
+    try:
+        ast = parse_expression(expression)
+        result = _evaluate(ast, parameters)
+    except (EvaluationError, InvalidSyntaxError, DimensionalityError) as error:
+        # DimensionalityError is raised by operations on quantities with incompatible
+        # units.
+        raise EvaluationError(
+            f"Could not evaluate {fmt.expression(expression)}."
+        ) from error
+    return _broadcast(result, shots)
+
+
+def _broadcast(value: Any, shots: int) -> BatchResult:
+    if isinstance(value, Quantity):
+        return Quantity(
+            np.broadcast_to(np.asarray(value.magnitude), (shots,)), value.units
+        )
+    return np.broadcast_to(np.asarray(value), (shots,))
+
+
+def _evaluate(expression: nodes.Expression, parameters: ParameterTable) -> Any:
+    match expression:
+        case int() | float():
+            return expression
+        case nodes.Variable(name=name):
+            if name in parameters:
+                return parameters[name]  # type: ignore[reportArgumentType]
+            elif name in CONSTANTS:
+                return CONSTANTS[name]
+            else:
+                raise UndefinedParameterError(f"Parameter {name} is not defined.")
+        case (
+            nodes.Add()
+            | nodes.Subtract()
+            | nodes.Multiply()
+            | nodes.Divide()
+            | nodes.Power() as binary_operator
+        ):
+            return _evaluate_binary_operator(binary_operator, parameters)
+        case nodes.Plus() as plus:
+            return _evaluate(plus.operand, parameters)
+        case nodes.Minus() as minus:
+            return -_evaluate(minus.operand, parameters)
+        case nodes.Quantity():
+            return evaluate_quantity(expression)
+        case nodes.Call():
+            return _evaluate_function_call(expression, parameters)
+        case Constant(value=value):
+            return value
+        case _:  # pragma: no cover
+            assert_never(expression)
+
+
+def _evaluate_binary_operator(
+    binary_operator: nodes.BinaryOperator, parameters: ParameterTable
+) -> Any:
+    left = _evaluate(binary_operator.left, parameters)
+    right = _evaluate(binary_operator.right, parameters)
+    match binary_operator:
+        case nodes.Add():
+            return left + right
+        case nodes.Subtract():
+            return left - right
+        case nodes.Multiply():
+            return left * right
+        case nodes.Divide():
+            return left / right
+        case nodes.Power(exponent):
+            if isinstance(right, Quantity) or not np.isrealobj(right):
+                raise InvalidOperationError(
+                    f"The exponent {exponent} must be a real number, not {right}."
+                )
+            return left**right
+        case _:  # pragma: no cover
+            assert_never(binary_operator)
+
+
+def _evaluate_function_call(call: nodes.Call, parameters: ParameterTable) -> Any:
+    try:
+        # We can use str as key instead of VariableName because they have the
+        # same hash.
+        function = ARRAY_FUNCTIONS[call.function]  # type: ignore[reportArgumentType]
+    except KeyError:
+        raise UndefinedFunctionError(
+            f"Function {call.function} is not defined."
+        ) from None
+    if len(call.args) != 1:
+        raise InvalidArgumentCountError(
+            f"{call.function}() can only be called with one argument, got "
+            f"{len(call.args)}."
+        )
+    argument = _evaluate(call.args[0], parameters)
+    return function(_to_float_array(call.function, argument))
+
+
+def _to_float_array(function: str, value: Any) -> np.ndarray:
+    if isinstance(value, Quantity):
+        try:
+            value = value.to_unit(dimensionless).magnitude
+        except DimensionalityError:
+            raise InvalidTypeError(
+                f"{function}() expected a number, got {value!r}."
+            ) from None
+    return np.asarray(value, dtype=np.float64)
@@ -0,0 +1,19 @@
+import attrs
+
+from ._scalar import Scalar
+
+
+@attrs.frozen
+class Constant:
+    """A node of a syntax tree that holds an already evaluated value.
+
+    Constant nodes don't come from parsing an expression, they are produced by
+    :func:`fold_constants` in place of the parts of an expression that don't change
+    from shot to shot.
+    The evaluators return the value of a constant node as is.
+
+    Attributes:
+        value: The value of the node.
+    """
+
+    value: Scalar
@@ -0,0 +1,155 @@
+"""Evaluation of the parts of expressions that are the same for all shots.
+
+The parameters of a sequence are split between constants, that have the same value
+for every shot, and variables, that can change from shot to shot.
+The parts of an expression that only depend on constants can be evaluated once before
+the shots are compiled and replaced in the syntax tree by their value, so that only
+the remaining parts are evaluated for each shot.
+"""
+
+from collections.abc import Iterable
+from typing import assert_never
+
+import attrs
+
+import caqtus_parsing.nodes as nodes
+from caqtus.types.expression import Expression
+from caqtus.types.parameter import ParameterSchema
+from caqtus_parsing import InvalidSyntaxError
+from ._constant import Constant
+from ._constants import CONSTANTS
+from ._evaluate_scalar_expression import evaluate_expression
+from ._functions import SCALAR_FUNCTIONS
+from ._parse import parse_expression, get_folded_expression
+from ._scalar import Scalar
+
+# The time variable changes inside a shot, so it is never folded.
+_TIME_VARIABLE = "t"
+
+
+def fold_constants(
+    expression: nodes.Expression, schema: ParameterSchema
+) -> nodes.Expression:
+    """Evaluates the parts of a syntax tree that only depend on constants.
+
+    Args:
+        expression: The syntax tree to fold.
+        schema: The schema of the parameters of the sequence.
+            The parameters in its constant schema are replaced by their values.
+
+    Returns:
+        A syntax tree that evaluates to the same values as the original one, in which
+        the sub-trees that only depend on constant parameters and literals have been
+        replaced by their value.
+        Sub-trees that fail to evaluate are left untouched, so that the error is
+        raised when the expression is evaluated for a shot.
+    """
+
+    match expression:
+        case int() | float() | Constant():
+            return expression
+        case nodes.Variable(name=name):
+            if name == _TIME_VARIABLE:
+                return expression
+            elif name in schema.constant_schema:
+                return _to_node(schema.constant_schema[name])  # pyright: ignore
+            elif name in CONSTANTS and name not in schema.variable_schema:
+                return _to_node(CONSTANTS[name])
+            else:
+                return expression
+        case nodes.Quantity():
+            return _try_evaluate(expression)
+        case (
+            nodes.Add()
+            | nodes.Subtract()
+            | nodes.Multiply()
+            | nodes.Divide()
+            | nodes.Power() as binary_operator
+        ):
+            left = fold_constants(binary_operator.left, schema)
+            right = fold_constants(binary_operator.right, schema)
+            folded = attrs.evolve(binary_operator, left=left, right=right)
+            if _is_folded(left) and _is_folded(right):
+                return _try_evaluate(folded)
+            return folded
+        case nodes.Plus() | nodes.Minus() as unary_operator:
+            operand = fold_constants(unary_operator.operand, schema)
+            folded = attrs.evolve(unary_operator, operand=operand)
+            if _is_folded(operand):
+                return _try_evaluate(folded)
+            return folded
+        case nodes.Call():
+            args = tuple(fold_constants(arg, schema) for arg in expression.args)
+            folded = attrs.evolve(expression, args=args)
+            # Functions that are not scalar functions, like square_wave, produce
+            # time-dependent values and can't be folded.
+            if expression.function in SCALAR_FUNCTIONS and all(
+                _is_folded(arg) for arg in args
+            ):
+                return _try_evaluate(folded)
+            return folded
+        case _:  # pragma: no cover
+            assert_never(expression)
+
+
+def fold_expressions(
+    expressions: Iterable[Expression], schema: ParameterSchema
+) -> dict[str, nodes.Expression]:
+    """Folds the constant parts of several expressions.
+
+    Returns:
+        A mapping from the bodies of the expressions to their folded syntax trees.
+        Only the expressions that could be simplified are present in the mapping, and
+        expressions that are not syntactically valid are ignored.
+        The mapping can be passed to :func:`use_folded_expressions`.
+    """
+
+    folded_expressions = {}
+    for expression in expressions:
+        try:
+            ast = parse_expression(expression)
+        except InvalidSyntaxError:
+            continue
+        folded = fold_constants(ast, schema)
+        if folded != ast:
+            folded_expressions[str(expression)] = folded
+    return folded_expressions
+
+
+def get_folded_constant(expression: Expression) -> Scalar | None:
+    """Returns the value of an expression if it was entirely folded.
+
+    This only returns a value if folded syntax trees are in use, see
+    :func:`use_folded_expressions`, and if the folded tree of the expression is a
+    single value.
+    """
+
+    match get_folded_expression(expression):
+        case int() | float() as value:
+            return value
+        case Constant(value=value):
+            return value
+        case _:
+            return None
+
+
+def _is_folded(expression: nodes.Expression) -> bool:
+    return isinstance(expression, (int, float, Constant))
+
+
+def _to_node(value: Scalar) -> nodes.Expression:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return Constant(value)  # pyright: ignore[reportReturnType]
+
+
+def _try_evaluate(expression: nodes.Expression) -> nodes.Expression:
+    # All the leaves of the expression are values at this point, so it doesn't
+    # need parameters.
+    # Any error is left to be raised when the expression is evaluated for a shot,
+    # where it can be reported with the context of the shot.
+    try:
+        value = evaluate_expression(expression, {})
+    except Exception:  # noqa: BLE001
+        return expression
+    return _to_node(value)
@@ -11,7 +11,9 @@ from caqtus.types.expression import Expression
 from caqtus.types.parameter import Parameters
 from caqtus.types.recoverable_exceptions import EvaluationError, InvalidTypeError
 from caqtus.types.units import Quantity, is_scalar_quantity, Unit, DimensionalityError
-from caqtus_parsing import parse, InvalidSyntaxError
+from caqtus.types.units.unit_namespace import units
+from caqtus_parsing import InvalidSyntaxError
+from ._constant import Constant
 from ._constants import CONSTANTS
 from ._exceptions import (
     UndefinedParameterError,
@@ -19,8 +21,8 @@ from ._exceptions import (
     UndefinedUnitError,
 )
 from ._functions import SCALAR_FUNCTIONS
+from ._parse import parse_expression
 from ._scalar import Scalar
-from ._units import units
 
 
 def evaluate_scalar_expression(
@@ -41,7 +43,7 @@ def evaluate_scalar_expression(
     """
 
     try:
-        ast = parse(str(expression))
+        ast = parse_expression(expression)
         return evaluate_expression(ast, parameters)
     except (EvaluationError, InvalidSyntaxError) as error:
         raise EvaluationError(
@@ -93,6 +95,8 @@ def evaluate_expression(expression: nodes.Expression, parameters: Parameters) ->
             return evaluate_quantity(expression)
         case nodes.Call():
             return evaluate_function_call(expression, parameters)
+        case Constant(value=value):
+            return value
         case _:  # pragma: no cover
             assert_never(expression)
 
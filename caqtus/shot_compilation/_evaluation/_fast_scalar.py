@@ -0,0 +1,231 @@
+"""Evaluation of scalar expressions in base units without pint quantities.
+
+During compilation, the value of an expression is usually only needed in base units.
+Instead of building a pint quantity for each intermediate result and converting the
+result at the end, the values are converted to base units when they enter the
+evaluation and the operations are applied to plain floats, with the dimensions
+tracked as a tuple of exponents.
+A pint quantity is only built for the final result.
+
+When an expression uses something that can't be handled this way, like decibels or
+adding radians to numbers, or when the evaluation fails, the expression is evaluated
+again with pint, which gives the reference result or raises the appropriate error.
+"""
+
+from __future__ import annotations
+
+import functools
+from typing import Any, assert_never
+
+import attrs
+
+import caqtus_parsing.nodes as nodes
+from caqtus.types.parameter import Parameters
+from caqtus.types.units import DimensionalityError, Quantity, Unit, dimensionless
+from caqtus.types.units._conversion import (
+    Dimensions,
+    combine_dimensions,
+    get_unit_conversion,
+    get_base_unit,
+    is_dimensionless,
+    normalize_dimensions,
+)
+from ._constant import Constant
+from ._constants import CONSTANTS
+from ._evaluate_scalar_expression import evaluate_expression, evaluate_units
+from ._functions import SCALAR_FUNCTIONS
+from ._scalar import Scalar
+
+type FastScalar = int | bool | float | FastQuantity
+
+
+class _UnsupportedError(Exception):
+    """Raised when a value can't be evaluated without pint."""
+
+
+@attrs.frozen
+class FastQuantity:
+    """A scalar quantity expressed in base units.
+
+    Attributes:
+        magnitude: The value of the quantity in base units.
+        dimensions: The exponents of the base units of the quantity.
+            They are never empty, dimensionless values are plain floats.
+    """
+
+    magnitude: float
+    dimensions: Dimensions
+
+    @classmethod
+    def from_quantity(cls, quantity: Quantity) -> FastScalar:
+        conversion = get_unit_conversion(quantity.units)
+        if conversion is None:
+            raise _UnsupportedError(quantity.units)
+        return _create(quantity.magnitude * conversion.factor, conversion.dimensions)
+
+    def to_quantity(self) -> Quantity[float]:
+        return Quantity(self.magnitude, get_base_unit(self.dimensions))
+
+    def __float__(self) -> float:
+        if is_dimensionless(self.dimensions):
+            return self.magnitude
+        raise DimensionalityError(
+            get_base_unit(self.dimensions), "dimensionless"  # pyright: ignore
+        )
+
+    def __add__(self, other: FastScalar) -> FastScalar:
+        if isinstance(other, FastQuantity) and other.dimensions == self.dimensions:
+            return FastQuantity(self.magnitude + other.magnitude, self.dimensions)
+        raise _UnsupportedError(self, other)
+
+    def __radd__(self, other: FastScalar) -> FastScalar:
+        raise _UnsupportedError(other, self)
+
+    def __sub__(self, other: FastScalar) -> FastScalar:
+        if isinstance(other, FastQuantity) and other.dimensions == self.dimensions:
+            return FastQuantity(self.magnitude - other.magnitude, self.dimensions)
+        raise _UnsupportedError(self, other)
+
+    def __rsub__(self, other: FastScalar) -> FastScalar:
+        raise _UnsupportedError(other, self)
+
+    def __mul__(self, other: FastScalar) -> FastScalar:
+        if isinstance(other, FastQuantity):
+            return _create(
+                self.magnitude * other.magnitude,
+                combine_dimensions(self.dimensions, other.dimensions, 1),
+            )
+        return FastQuantity(self.magnitude * other, self.dimensions)
+
+    def __rmul__(self, other: float) -> FastScalar:
+        # Only called when the left operand is a number, products of quantities are
+        # handled by __mul__.
+        return FastQuantity(other * self.magnitude, self.dimensions)
+
+    def __truediv__(self, other: FastScalar) -> FastScalar:
+        if isinstance(other, FastQuantity):
+            return _create(
+                self.magnitude / other.magnitude,
+                combine_dimensions(self.dimensions, other.dimensions, -1),
+            )
+        return FastQuantity(self.magnitude / other, self.dimensions)
+
+    def __rtruediv__(self, other: float) -> FastScalar:
+        return FastQuantity(
+            other / self.magnitude, combine_dimensions((), self.dimensions, -1)
+        )
+
+    def __pow__(self, exponent: FastScalar) -> FastScalar:
+        if isinstance(exponent, FastQuantity):
+            raise _UnsupportedError(self, exponent)
+        return _create(
+            self.magnitude**exponent,
+            normalize_dimensions(
+                tuple((name, power * exponent) for name, power in self.dimensions)
+            ),
+        )
+
+    def __neg__(self) -> FastQuantity:
+        return FastQuantity(-self.magnitude, self.dimensions)
+
+    def __pos__(self) -> FastQuantity:
+        return self
+
+
+def _create(magnitude: float, dimensions: Dimensions) -> FastScalar:
+    if not dimensions:
+        return magnitude
+    return FastQuantity(magnitude, dimensions)
+
+
+def evaluate_in_base_units(
+    expression: nodes.Expression, parameters: Parameters
+) -> Scalar:
+    """Evaluates an expression and converts the result to base units.
+
+    This gives the same result as :func:`evaluate_expression` followed by a conversion
+    of the result to base units, but avoids pint for the intermediate results when
+    possible.
+
+    Returns:
+        A number, or a quantity expressed in base units if the result has dimensions.
+        Results without dimensions are always returned as numbers.
+    """
+
+    try:
+        value = _evaluate(expression, parameters)
+    except Exception:  # noqa: BLE001
+        # pint gives the reference result for unsupported operations and raises the
+        # appropriate error if the expression is invalid.
+        value = evaluate_expression(expression, parameters)
+        if isinstance(value, Quantity):
+            in_base_units = value.to_base_units()
+            if in_base_units.units == dimensionless:
+                return in_base_units.magnitude
+            return in_base_units
+        return value
+    if isinstance(value, FastQuantity):
+        return value.to_quantity()
+    return value
+
+
+def _evaluate(expression: nodes.Expression, parameters: Parameters) -> FastScalar:
+    match expression:
+        case int() | float():
+            return expression
+        case nodes.Variable(name=name):
+            if name in parameters:
+                value = parameters[name]  # type: ignore[reportArgumentType]
+            elif name in CONSTANTS:
+                value = CONSTANTS[name]
+            else:
+                raise _UnsupportedError(name)
+            return _from_value(value)
+        case nodes.Add(left, right):
+            return _evaluate(left, parameters) + _evaluate(right, parameters)
+        case nodes.Subtract(left, right):
+            return _evaluate(left, parameters) - _evaluate(right, parameters)
+        case nodes.Multiply(left, right):
+            return _evaluate(left, parameters) * _evaluate(right, parameters)
+        case nodes.Divide(left, right):
+            return _evaluate(left, parameters) / _evaluate(right, parameters)
+        case nodes.Power(left, right):
+            exponent = _evaluate(right, parameters)
+            if not isinstance(exponent, (int, float)):
+                raise _UnsupportedError(exponent)
+            return _evaluate(left, parameters) ** exponent
+        case nodes.Plus(operand):
+            return _evaluate(operand, parameters)
+        case nodes.Minus(operand):
+            return -_evaluate(operand, parameters)
+        case nodes.Quantity():
+            return _evaluate_quantity(expression)
+        case nodes.Call(function, args):
+            # The scalar functions only accept dimensionless values, which they
+            # convert with float().
+            return _from_value(
+                SCALAR_FUNCTIONS[function](  # pyright: ignore[reportArgumentType]
+                    *(_evaluate(arg, parameters) for arg in args)  # pyright: ignore
+                )
+            )
+        case Constant(value=value):
+            return _from_value(value)
+        case _:  # pragma: no cover
+            assert_never(expression)
+
+
+def _from_value(value: Any) -> FastScalar:
+    if isinstance(value, Quantity):
+        return FastQuantity.from_quantity(value)
+    if isinstance(value, (int, float)):
+        return value
+    raise _UnsupportedError(value)
+
+
+@functools.lru_cache
+def _evaluate_quantity(quantity: nodes.Quantity) -> FastScalar:
+    unit = evaluate_units(quantity.multiplicative_units)
+    if quantity.divisional_units:
+        unit = unit / evaluate_units(quantity.divisional_units)
+        assert isinstance(unit, Unit)
+    return FastQuantity.from_quantity(Quantity(quantity.magnitude, unit))
@@ -74,3 +74,17 @@ SCALAR_FUNCTIONS = {
     VariableName("log"): float_to_scalar_function(numpy.log),
     VariableName("sqrt"): float_to_scalar_function(numpy.sqrt),
 }
+
+# Same functions as SCALAR_FUNCTIONS, but applied element-wise to arrays.
+ARRAY_FUNCTIONS: Mapping[VariableName, Callable[[numpy.ndarray], numpy.ndarray]] = {
+    VariableName("abs"): numpy.abs,
+    VariableName("arccos"): numpy.arccos,
+    VariableName("arcsin"): numpy.arcsin,
+    VariableName("arctan"): numpy.arctan,
+    VariableName("cos"): numpy.cos,
+    VariableName("sin"): numpy.sin,
+    VariableName("tan"): numpy.tan,
+    VariableName("exp"): numpy.exp,
+    VariableName("log"): numpy.log,
+    VariableName("sqrt"): numpy.sqrt,
+}
@@ -0,0 +1,99 @@
+import contextlib
+import contextvars
+import functools
+import types
+from collections.abc import Iterable, Iterator, Mapping
+
+import caqtus_parsing.nodes as nodes
+from caqtus.types.expression import Expression
+from caqtus_parsing import parse, InvalidSyntaxError
+
+PARSE_CACHE_SIZE = 4096
+"""The maximum number of parsed expressions kept in memory by each process."""
+
+
+def parse_expression(expression: Expression) -> nodes.Expression:
+    """Returns the syntax tree of an expression.
+
+    The syntax trees are cached by expression body, so that the same expressions
+    evaluated for every shot are only parsed once per process.
+    The cache is process-wide, which means that it is also kept between shots by the
+    worker processes that compile them.
+
+    If folded syntax trees are in use, see :func:`use_folded_expressions`, the folded
+    tree of the expression is returned instead.
+
+    Raises:
+        InvalidSyntaxError: If the expression is not syntactically valid.
+    """
+
+    body = str(expression)
+    if (folded := _folded_expressions.get().get(body)) is not None:
+        return folded
+    return _parse_body(body)
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_body(body: str) -> nodes.Expression:
+    # The syntax trees are immutable, so they can be shared between evaluations.
+    # Invalid expressions raise an exception and are not cached.
+    return parse(body)
+
+
+def warm_parse_cache(expressions: Iterable[Expression | str]) -> None:
+    """Parses expressions in advance so that :func:`parse_expression` doesn't need to.
+
+    This is the equivalent of :func:`caqtus.types.expression.warm_expression_cache`
+    for the syntax trees used by the evaluators of this package.
+
+    Expressions with invalid syntax are ignored, the error is raised when they are
+    parsed again.
+    """
+
+    for expression in expressions:
+        try:
+            _parse_body(str(expression))
+        except InvalidSyntaxError:
+            pass
+
+
+def get_parse_cache_info() -> functools._CacheInfo:
+    """Returns the number of hits and misses of the parse cache in this process."""
+
+    return _parse_body.cache_info()
+
+
+def clear_parse_cache() -> None:
+    """Removes all syntax trees from the parse cache and resets its counters."""
+
+    _parse_body.cache_clear()
+
+
+_folded_expressions: contextvars.ContextVar[Mapping[str, nodes.Expression]] = (
+    contextvars.ContextVar("folded_expressions", default=types.MappingProxyType({}))
+)
+
+
+@contextlib.contextmanager
+def use_folded_expressions(
+    folded_expressions: Mapping[str, nodes.Expression],
+) -> Iterator[None]:
+    """Makes :func:`parse_expression` return folded syntax trees.
+
+    Args:
+        folded_expressions: A mapping from expression bodies to their syntax trees in
+            which the parts that don't depend on the shot have already been evaluated.
+            The expressions that are not in the mapping are parsed as usual.
+    """
+
+    token = _folded_expressions.set(folded_expressions)
+    try:
+        yield
+    finally:
+        _folded_expressions.reset(token)
+
+
+def get_folded_expression(expression: Expression) -> nodes.Expression | None:
+    """Returns the folded syntax tree of an expression if there is one in use."""
+
+    return _folded_expressions.get().get(str(expression))
@@ -0,0 +1,310 @@
+"""Detection of time-dependent expressions that are affine in time.
+
+An expression like ``a * (t - t0) / T + b`` is an affine function of ``t`` once the
+values of the parameters are known, so it can be represented by a single ramp instead
+of one sample per tick.
+This is not always visible from the operations of the expression, for example when
+two time-dependent terms are multiplied and the quadratic terms cancel out.
+
+The syntax tree is converted to a sympy expression in which the time and the
+parameters are symbols and all values are expressed in base units.
+If the expanded expression is a polynomial of degree at most one in the time, its
+coefficients are compiled to functions of the parameters.
+This analysis only depends on the units of the parameters, so it is cached and is done
+once per sequence in practice, while the coefficients are evaluated for each shot.
+"""
+
+from __future__ import annotations
+
+import functools
+import math
+from collections.abc import Callable
+from typing import Any, Optional, assert_never
+
+import attrs
+import sympy
+
+import caqtus_parsing.nodes as nodes
+from caqtus.types.parameter import Parameters
+from caqtus.types.units import BaseUnit, Quantity, Unit, is_scalar_quantity
+from caqtus.types.units._conversion import (
+    Dimensions,
+    combine_dimensions,
+    get_base_unit,
+    get_unit_conversion,
+    is_dimensionless,
+    normalize_dimensions,
+)
+from .._constant import Constant
+from .._constants import CONSTANTS
+from .._evaluate_scalar_expression import evaluate_quantity
+
+_TIME_VARIABLE = "t"
+_TIME = sympy.Symbol(_TIME_VARIABLE, real=True)
+
+# Same functions as SCALAR_FUNCTIONS.
+_SYMPY_FUNCTIONS: dict[str, Callable[[sympy.Expr], sympy.Expr]] = {
+    "abs": sympy.Abs,
+    "arccos": sympy.acos,
+    "arcsin": sympy.asin,
+    "arctan": sympy.atan,
+    "cos": sympy.cos,
+    "sin": sympy.sin,
+    "tan": sympy.tan,
+    "exp": sympy.exp,
+    "log": sympy.log,
+    "sqrt": sympy.sqrt,
+}
+
+# For each parameter used by an expression, the units of its value, or None if it is a
+# number.
+type _Signature = tuple[tuple[str, Optional[Unit]], ...]
+
+
+@attrs.frozen
+class AffineFunction:
+    """A function of time of the form ``slope * t + intercept``.
+
+    Attributes:
+        slope: The variation of the function per second, in base units.
+        intercept: The value of the function at t = 0, in base units.
+        units: The base units of the values of the function.
+    """
+
+    slope: float
+    intercept: float
+    units: BaseUnit
+
+
+class _NotAffineError(Exception):
+    pass
+
+
+@attrs.frozen
+class _AffineAnalysis:
+    slope: Callable[..., Any]
+    intercept: Callable[..., Any]
+    units: BaseUnit
+
+
+def evaluate_affine(
+    expression: nodes.Expression, parameters: Parameters
+) -> Optional[AffineFunction]:
+    """Returns the affine function of time equal to an expression, if there is one.
+
+    Returns:
+        The function of time, or None if the expression is not affine in time for all
+        values of its parameters.
+        None is also returned if the expression can't be evaluated, for example
+        because it uses a parameter that is not defined, in which case the expression
+        must be evaluated sample by sample, which raises the appropriate error.
+    """
+
+    signature = _get_signature(expression, parameters)
+    if signature is None:
+        return None
+    analysis = _analyze(expression, signature)
+    if analysis is None:
+        return None
+    # We can use str as key instead of DottedVariableName because they have the same
+    # hash.
+    values = [
+        float(_magnitude(parameters[name]))  # type: ignore[reportArgumentType]
+        for name, _ in signature
+    ]
+    try:
+        slope = float(analysis.slope(*values))
+        intercept = float(analysis.intercept(*values))
+    except (ArithmeticError, ValueError, TypeError):
+        return None
+    if not (math.isfinite(slope) and math.isfinite(intercept)):
+        return None
+    return AffineFunction(slope=slope, intercept=intercept, units=analysis.units)
+
+
+def _magnitude(value: Any) -> Any:
+    if isinstance(value, Quantity):
+        return value.magnitude
+    return value
+
+
+def _get_signature(
+    expression: nodes.Expression, parameters: Parameters
+) -> Optional[_Signature]:
+    signature = []
+    for name in _get_variable_names(expression):
+        if name not in parameters:
+            # The name must be a constant, which is checked during the analysis.
+            continue
+        value = parameters[name]  # pyright: ignore[reportArgumentType]
+        if isinstance(value, Quantity) and is_scalar_quantity(value):
+            signature.append((name, value.units))
+        elif isinstance(value, (bool, int, float)):
+            signature.append((name, None))
+        else:
+            return None
+    return tuple(signature)
+
+
+@functools.lru_cache(maxsize=1024)
+def _get_variable_names(expression: nodes.Expression) -> tuple[str, ...]:
+    names = set()
+    _collect_variable_names(expression, names)
+    names.discard(_TIME_VARIABLE)
+    return tuple(sorted(names))
+
+
+def _collect_variable_names(expression: nodes.Expression, names: set[str]) -> None:
+    match expression:
+        case int() | float() | nodes.Quantity() | Constant():
+            pass
+        case nodes.Variable(name=name):
+            names.add(name)
+        case (
+            nodes.Add()
+            | nodes.Subtract()
+            | nodes.Multiply()
+            | nodes.Divide()
+            | nodes.Power() as binary_operator
+        ):
+            _collect_variable_names(binary_operator.left, names)
+            _collect_variable_names(binary_operator.right, names)
+        case nodes.Plus() | nodes.Minus() as unary_operator:
+            _collect_variable_names(unary_operator.operand, names)
+        case nodes.Call(args=args):
+            for arg in args:
+                _collect_variable_names(arg, names)
+        case _:  # pragma: no cover
+            assert_never(expression)
+
+
+@functools.lru_cache(maxsize=1024)
+def _analyze(
+    expression: nodes.Expression, signature: _Signature
+) -> Optional[_AffineAnalysis]:
+    symbols = {
+        name: sympy.Symbol(f"p{index}", real=True)
+        for index, (name, _) in enumerate(signature)
+    }
+    try:
+        converted, dimensions = _to_sympy(expression, dict(signature), symbols)
+    except _NotAffineError:
+        return None
+    expanded = sympy.expand(converted)
+    if not expanded.is_polynomial(_TIME):
+        return None
+    # sympy annotates the generator as an int, but it accepts symbols.
+    if sympy.degree(expanded, _TIME) > 1:  # pyright: ignore[reportArgumentType]
+        return None
+    arguments = list(symbols.values())
+    return _AffineAnalysis(
+        slope=sympy.lambdify(arguments, expanded.coeff(_TIME, 1), modules="math"),
+        intercept=sympy.lambdify(arguments, expanded.coeff(_TIME, 0), modules="math"),
+        units=get_base_unit(dimensions),
+    )
+
+
+def _to_sympy(
+    expression: nodes.Expression,
+    units: dict[str, Optional[Unit]],
+    symbols: dict[str, sympy.Symbol],
+) -> tuple[sympy.Expr, Dimensions]:
+    match expression:
+        case int() | float():
+            return _from_value(expression)
+        case nodes.Variable(name=name):
+            if name == _TIME_VARIABLE:
+                return _TIME, (("second", 1),)
+            elif name in symbols:
+                return _parameter(symbols[name], units[name])
+            elif name in CONSTANTS:
+                return _from_value(CONSTANTS[name])
+            else:
+                raise _NotAffineError(name)
+        case nodes.Add() | nodes.Subtract() as binary_operator:
+            left, left_dimensions = _to_sympy(binary_operator.left, units, symbols)
+            right, right_dimensions = _to_sympy(binary_operator.right, units, symbols)
+            if left_dimensions != right_dimensions:
+                raise _NotAffineError(binary_operator)
+            if isinstance(binary_operator, nodes.Add):
+                return left + right, left_dimensions
+            return left - right, left_dimensions
+        case nodes.Multiply(left, right):
+            left, left_dimensions = _to_sympy(left, units, symbols)
+            right, right_dimensions = _to_sympy(right, units, symbols)
+            return left * right, combine_dimensions(
+                left_dimensions, right_dimensions, 1
+            )
+        case nodes.Divide(left, right):
+            left, left_dimensions = _to_sympy(left, units, symbols)
+            right, right_dimensions = _to_sympy(right, units, symbols)
+            # Dividing by a function of time is never affine, and letting sympy
+            # simplify it would hide divisions by zero.
+            if _TIME in right.free_symbols or right.is_zero:
+                raise _NotAffineError(expression)
+            return left / right, combine_dimensions(
+                left_dimensions, right_dimensions, -1
+            )
+        case nodes.Power(left, right):
+            base, base_dimensions = _to_sympy(left, units, symbols)
+            exponent, exponent_dimensions = _to_sympy(right, units, symbols)
+            if exponent_dimensions or _TIME in exponent.free_symbols:
+                raise _NotAffineError(expression)
+            if not base_dimensions:
+                return base**exponent, ()
+            if not isinstance(exponent, sympy.Number):
+                raise _NotAffineError(expression)
+            return base**exponent, normalize_dimensions(
+                tuple(
+                    (name, power * float(exponent)) for name, power in base_dimensions
+                )
+            )
+        case nodes.Plus(operand):
+            return _to_sympy(operand, units, symbols)
+        case nodes.Minus(operand):
+            value, dimensions = _to_sympy(operand, units, symbols)
+            return -value, dimensions
+        case nodes.Quantity():
+            return _from_value(evaluate_quantity(expression))
+        case nodes.Call(function, args):
+            if function not in _SYMPY_FUNCTIONS or len(args) != 1:
+                raise _NotAffineError(expression)
+            argument, dimensions = _to_sympy(args[0], units, symbols)
+            # Functions of time are not affine, except in degenerate cases that
+            # depend on the domain of the function, like exp(log(t)).
+            if _TIME in argument.free_symbols or not is_dimensionless(dimensions):
+                raise _NotAffineError(expression)
+            return _SYMPY_FUNCTIONS[function](argument), ()
+        case Constant(value=value):
+            return _from_value(value)
+        case _:  # pragma: no cover
+            assert_never(expression)
+
+
+def _parameter(
+    symbol: sympy.Symbol, unit: Optional[Unit]
+) -> tuple[sympy.Expr, Dimensions]:
+    if unit is None:
+        return symbol, ()
+    conversion = get_unit_conversion(unit)
+    if conversion is None:
+        raise _NotAffineError(unit)
+    if conversion.factor == 1:
+        return symbol, conversion.dimensions
+    return symbol * sympy.Float(conversion.factor), conversion.dimensions
+
+
+def _from_value(value: Any) -> tuple[sympy.Expr, Dimensions]:
+    if isinstance(value, Quantity):
+        conversion = get_unit_conversion(value.units)
+        if conversion is None or not isinstance(value.magnitude, (int, float)):
+            raise _NotAffineError(value)
+        return (
+            sympy.Float(float(value.magnitude) * conversion.factor),
+            conversion.dimensions,
+        )
+    if isinstance(value, (bool, int)):
+        return sympy.Integer(int(value)), ()
+    if isinstance(value, float):
+        return sympy.Float(value), ()
+    raise _NotAffineError(value)
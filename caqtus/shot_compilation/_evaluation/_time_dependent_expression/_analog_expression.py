@@ -1,4 +1,5 @@
 import functools
+from collections.abc import Callable
 from typing import assert_type, assert_never
 
 import attrs
@@ -14,9 +15,11 @@ from caqtus.shot_compilation.timed_instructions import (
     Ramp,
     merge_instructions,
     concatenate,
+    defer,
 )
 from caqtus.shot_compilation.timing import Time, number_ticks, start_tick, stop_tick
 from caqtus.types.parameter import Parameters
+from caqtus.types.recoverable_exceptions import InvalidValueError
 from caqtus.types.units import (
     BaseUnit,
     dimensionless,
@@ -25,8 +28,13 @@ from caqtus.types.units import (
     Unit,
     InvalidDimensionalityError,
 )
+from ._affine_expression import AffineFunction, evaluate_affine
 from ._is_time_dependent import is_time_dependent
-from .._evaluate_scalar_expression import evaluate_expression
+from .._constant import Constant
+from .._evaluate_scalar_expression import UndefinedFunctionError
+from .._exceptions import InvalidOperationError
+from .._functions import ARRAY_FUNCTIONS, InvalidArgumentCountError
+from .._fast_scalar import evaluate_in_base_units
 
 
 @attrs.define
@@ -39,7 +47,7 @@ def evaluate_analog_ast(
     ast: nodes.Expression, parameters: Parameters, t1: Time, t2: Time, timestep: Time
 ) -> AnalogInstruction:
     if not is_time_dependent(ast):
-        value = evaluate_expression(ast, parameters)
+        value = evaluate_in_base_units(ast, parameters)
         length = number_ticks(t1, t2, timestep)
         if isinstance(value, (bool, int, float)):
             return AnalogInstruction(
@@ -48,14 +56,19 @@ def evaluate_analog_ast(
             )
         else:
             assert_type(value, Quantity[float])
-            in_base_units = value.to_base_units()
             return AnalogInstruction(
-                magnitudes=Pattern([in_base_units.magnitude]) * length,
-                units=in_base_units.units,
+                magnitudes=Pattern([value.magnitude]) * length,
+                # The value is expressed in base units.
+                units=BaseUnit(value.units),
             )
+    elif (
+        not isinstance(ast, nodes.Variable)
+        and (affine := evaluate_affine(ast, parameters)) is not None
+    ):
+        return evaluate_affine_function(affine, t1, t2, timestep)
     else:
         match ast:
-            case int() | float() | nodes.Quantity():
+            case int() | float() | nodes.Quantity() | Constant():
                 raise AssertionError("Unreachable")
             case nodes.Variable(name=name):
                 if name != "t":
@@ -70,9 +83,7 @@ def evaluate_analog_ast(
                     units=SECOND,
                 )
             case nodes.Call():
-                raise NotImplementedError(
-                    "Time dependent function calls are not yet supported."
-                )
+                return evaluate_call(ast, parameters, t1, t2, timestep)
             case nodes.Plus() | nodes.Minus() as unary_operator:
                 return evaluate_unary_operator(
                     unary_operator, parameters, t1, t2, timestep
@@ -113,14 +124,31 @@ def evaluate_analog_ast(
                     units=left.units,
                 )
             case nodes.Power():
-                raise NotImplementedError(
-                    "Power operator is not yet supported for time dependent "
-                    "expressions."
-                )
+                return evaluate_power(ast, parameters, t1, t2, timestep)
             case _:
                 assert_never(ast)
 
 
+def evaluate_affine_function(
+    function: AffineFunction, t1: Time, t2: Time, timestep: Time
+) -> AnalogInstruction:
+    tick_start = start_tick(t1, timestep)
+    tick_stop = stop_tick(t2, timestep)
+    length = tick_stop - tick_start
+    if function.slope == 0:
+        # Constant over the block.
+        return AnalogInstruction(
+            magnitudes=Pattern([function.intercept]) * length, units=function.units
+        )
+    value_start = function.intercept + function.slope * float(
+        tick_start * timestep - t1
+    )
+    value_stop = function.intercept + function.slope * float(tick_stop * timestep - t1)
+    return AnalogInstruction(
+        magnitudes=create_ramp(value_start, value_stop, length), units=function.units
+    )
+
+
 def evaluate_unary_operator(
     unary_operator: nodes.UnaryOperator,
     parameters: Parameters,
@@ -141,36 +169,133 @@ def evaluate_unary_operator(
             assert_never(unary_operator)
 
 
-@functools.singledispatch
-def negate(instruction) -> TimedInstruction[np.float64]:
-    raise NotImplementedError(f"Negation of {type(instruction)} is not supported.")
+def evaluate_call(
+    call: nodes.Call, parameters: Parameters, t1: Time, t2: Time, timestep: Time
+) -> AnalogInstruction:
+    try:
+        # We can use str as key instead of VariableName because they have the
+        # same hash.
+        function = ARRAY_FUNCTIONS[call.function]  # type: ignore[reportArgumentType]
+    except KeyError:
+        raise UndefinedFunctionError(
+            f"Function {call.function} is not defined."
+        ) from None
+    if len(call.args) != 1:
+        raise InvalidArgumentCountError(
+            f"{call.function}() can only be called with one argument, got "
+            f"{len(call.args)}."
+        )
+    argument = evaluate_analog_ast(call.args[0], parameters, t1, t2, timestep)
+    if not argument.units.dimensionless:
+        raise InvalidDimensionalityError(
+            f"{call.function}() expected a dimensionless argument, got "
+            f"{call.args[0]} with units {argument.units}."
+        )
+    return AnalogInstruction(
+        magnitudes=apply(argument.magnitudes, function, f"{call.function}()"),
+        units=dimensionless,
+    )
+
 
+def evaluate_power(
+    power: nodes.Power, parameters: Parameters, t1: Time, t2: Time, timestep: Time
+) -> AnalogInstruction:
+    base = evaluate_analog_ast(power.left, parameters, t1, t2, timestep)
+    if not is_time_dependent(power.right):
+        exponent = evaluate_in_base_units(power.right, parameters)
+        if isinstance(exponent, Quantity):
+            raise InvalidOperationError(
+                f"The exponent {power.right} must be a real number, not {exponent}."
+            )
+        exponent = float(exponent)
+        if exponent == 1:
+            return base
+        units = base.units**exponent
+        assert isinstance(units, Unit)
+        return AnalogInstruction(
+            magnitudes=apply(
+                base.magnitudes,
+                lambda values: np.power(values, exponent),
+                "Exponentiation",
+            ),
+            units=units.to_base(),
+        )
+    exponent_instruction = evaluate_analog_ast(
+        power.right, parameters, t1, t2, timestep
+    )
+    if not exponent_instruction.units.dimensionless:
+        raise InvalidOperationError(
+            f"The exponent {power.right} must be dimensionless, got units "
+            f"{exponent_instruction.units}."
+        )
+    if not base.units.dimensionless:
+        raise InvalidDimensionalityError(
+            f"{power.left} must be dimensionless to be raised to the time dependent "
+            f"exponent {power.right}, got units {base.units}."
+        )
+    if (value := _constant_value(base.magnitudes)) is not None:
+        magnitudes = apply(
+            exponent_instruction.magnitudes,
+            lambda values: np.power(value, values),
+            "Exponentiation",
+        )
+    else:
+        merged = merge_instructions(
+            base=base.magnitudes, exponent=exponent_instruction.magnitudes
+        )
+        magnitudes = apply(
+            merged,
+            lambda values: np.power(values["base"], values["exponent"]),
+            "Exponentiation",
+        )
+    return AnalogInstruction(magnitudes=magnitudes, units=dimensionless)
+
+
+def apply(
+    instruction: TimedInstruction,
+    function: Callable[[np.ndarray], np.ndarray],
+    description: str,
+) -> TimedInstruction[np.float64]:
+    """Applies an element-wise function to the values of an instruction.
 
-@negate.register(Pattern)
-def negate_pattern(pattern: Pattern[np.float64]) -> Pattern[np.float64]:
-    return Pattern.create_without_copy(-pattern.array)
+    The function is applied to the inner block of repetitions only, so constant and
+    repeated values stay compact, and only the patterns and ramps are evaluated
+    sample by sample.
+    """
 
+    with np.errstate(all="ignore"):
+        try:
+            return instruction.apply(
+                lambda values: np.asarray(function(values), dtype=np.float64)
+            )
+        except ValueError:
+            raise InvalidValueError(
+                f"{description} evaluates to non-finite values."
+            ) from None
 
-@negate.register(Concatenated)
-def negate_concatenated(
-    concatenated: Concatenated[np.float64],
-) -> Concatenated[np.float64]:
-    return Concatenated(*(negate(instr) for instr in concatenated.instructions))
 
+def negate(instruction: TimedInstruction[np.float64]) -> TimedInstruction[np.float64]:
+    return defer(instruction).negate().evaluate()
 
-@negate.register(Repeated)
-def negate_repeated(repeated: Repeated[np.float64]) -> Repeated[np.float64]:
-    return Repeated(repeated.repetitions, negate(repeated.instruction))
 
+def _constant_value(instruction: TimedInstruction[np.float64]) -> float | None:
+    """Returns the value of an instruction if it is obviously constant."""
 
-@negate.register(Ramp)
-def negate_ramp(ramp: Ramp[np.float64]) -> TimedInstruction[np.float64]:
-    return create_ramp(-ramp.start, -ramp.stop, len(ramp))
+    if isinstance(instruction, Repeated) and len(instruction.instruction) == 1:
+        return float(instruction.instruction[0])
+    if isinstance(instruction, Pattern) and len(instruction) == 1:
+        return float(instruction[0])
+    return None
 
 
 def multiply(
     a: TimedInstruction[np.float64], b: TimedInstruction[np.float64]
 ) -> TimedInstruction[np.float64]:
+    # Multiplying by a constant doesn't require to merge the instructions.
+    if (value := _constant_value(b)) is not None:
+        return defer(a).multiply(value).evaluate()
+    if (value := _constant_value(a)) is not None:
+        return defer(b).multiply(value).evaluate()
     merged = merge_instructions(left=a, right=b)
     return _multiply(merged)
 
@@ -269,6 +394,11 @@ def _divide_ramp(ramp: Ramp[np.void]) -> TimedInstruction[np.float64]:
 def add(
     a: TimedInstruction[np.float64], b: TimedInstruction[np.float64]
 ) -> TimedInstruction[np.float64]:
+    # Adding a constant doesn't require to merge the instructions.
+    if (value := _constant_value(b)) is not None:
+        return defer(a).add(value).evaluate()
+    if (value := _constant_value(a)) is not None:
+        return defer(b).add(value).evaluate()
     merged = merge_instructions(left=a, right=b)
     return _add(merged)
 
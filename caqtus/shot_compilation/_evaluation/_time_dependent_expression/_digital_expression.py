@@ -9,13 +9,15 @@ from caqtus.types.expression import Expression
 from caqtus.types.parameter import Parameters
 from caqtus.types.recoverable_exceptions import EvaluationError, InvalidValueError
 from caqtus.types.units import dimensionless, InvalidDimensionalityError
-from caqtus_parsing import parse, InvalidSyntaxError
+from caqtus_parsing import InvalidSyntaxError
 from ._analog_expression import evaluate_analog_ast
 from ._is_time_dependent import is_time_dependent
+from .._constant import Constant
 from .._evaluate_scalar_expression import (
     evaluate_bool_expression,
     evaluate_float_expression,
 )
+from .._parse import parse_expression
 from ...timed_instructions import (
     TimedInstruction,
     Pattern,
@@ -50,7 +52,7 @@ def evaluate_time_dependent_digital_expression(
     """
 
     try:
-        ast = parse(str(expression))
+        ast = parse_expression(expression)
         return evaluate_digital_expression(ast, parameters, t1, t2, timestep)
     except (EvaluationError, InvalidSyntaxError) as error:
         raise EvaluationError(
@@ -71,7 +73,7 @@ def evaluate_digital_expression(
         return Pattern([value]) * length
 
     match expression:
-        case int() | float() | nodes.Quantity():
+        case int() | float() | nodes.Quantity() | Constant():
             raise AssertionError(
                 "This should never happen, because at this point, the expression "
                 "is known to be time-dependent."
@@ -2,12 +2,13 @@ import functools
 from typing import assert_never
 
 import caqtus_parsing.nodes as nodes
+from .._constant import Constant
 
 
 @functools.lru_cache
 def is_time_dependent(expression: nodes.Expression) -> bool:
     match expression:
-        case int() | float() | nodes.Quantity():
+        case int() | float() | nodes.Quantity() | Constant():
             return False
         case nodes.Variable(name=name):
             return name == "t"
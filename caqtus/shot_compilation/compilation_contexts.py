@@ -1,45 +1,162 @@
+import itertools
+import logging
 from collections.abc import Iterable, Mapping, Sequence
-from typing import TYPE_CHECKING, Any, Self, TypeVar, assert_never
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    NamedTuple,
+    Optional,
+    Self,
+    TypeVar,
+    assert_never,
+    cast,
+)
 
 import attrs
+import numpy as np
 from typing_extensions import deprecated
 
+import caqtus_parsing.nodes as nodes
 from caqtus.device import DeviceConfiguration, DeviceName
-from caqtus.types.timelane import TimeLane, TimeLanes
+from caqtus.types.timelane import AnalogTimeLane, DigitalTimeLane, TimeLane, TimeLanes
 from caqtus.types.variable_name import DottedVariableName
 
 from ..formatter import fmt
+from ..types._parameter_namespace import VariableNamespace
 from ..types.expression import Expression
-from ..types.iteration import IterationConfiguration
+from ..types.iteration import IterationConfiguration, StepsConfiguration
+from ..types.iteration._step_context import StepContext
 from ..types.parameter import (
     NotQuantityError,
     ParameterNamespace,
     Parameters,
     ParameterSchema,
 )
-from ..types.recoverable_exceptions import EvaluationError, InvalidValueError
+from ..types.recoverable_exceptions import (
+    EvaluationError,
+    InvalidTypeError,
+    InvalidValueError,
+    RecoverableException,
+)
 from ..types.units import (
     SECOND,
+    dimensionless,
     DimensionalityError,
     InvalidDimensionalityError,
+    is_quantity,
     is_scalar_quantity,
 )
+from ..types.units.base import magnitude_in_unit
 from ..utils.result import Failure, Success
+from ._compilation_cache import (
+    DeviceCompilationCache,
+    Dependencies,
+    RecordingParameters,
+)
+from ._evaluation import (
+    fold_expressions,
+    to_parameter_table,
+    use_folded_expressions,
+)
+from .lane_compilation import (
+    DimensionedSeries,
+    compile_analog_lane,
+    compile_digital_lane,
+)
 from .timing import Time, get_step_bounds, to_time
 
 if TYPE_CHECKING:
     from caqtus.shot_compilation import DeviceCompiler
 
+logger = logging.getLogger(__name__)
+
 LaneType = TypeVar("LaneType", bound=TimeLane)
 
+MAX_PRECOMPUTED_SHOTS = 100_000
+"""The maximum number of shots for which step durations are evaluated in advance.
+
+For longer sequences, the durations that depend on the variables are evaluated when
+each shot is compiled.
+"""
+
 
 @attrs.frozen
 class SequenceContext:
-    """Contains information about a sequence being compiled."""
+    """Contains information about a sequence being compiled.
+
+    When the context is created, the parts of the step durations and lane expressions
+    that only depend on the constants of the sequence are evaluated once, so that they
+    are not evaluated again for every shot.
+    The results are stored in the context and shipped with it to the processes that
+    compile the shots.
+    """
 
     _device_configurations: Mapping[DeviceName, DeviceConfiguration]
     _parameter_schema: ParameterSchema
     _time_lanes: TimeLanes
+    # The durations in seconds of the steps that depend on the variables, evaluated in
+    # advance for all the shots of the sequence and indexed by the values of the
+    # variables of each shot.
+    # A duration is None if it must be evaluated for each shot.
+    _shot_step_durations: Mapping[tuple[Any, ...], tuple[float | None, ...]] = (
+        attrs.field(factory=dict, eq=False, repr=False)
+    )
+
+    # The durations of the steps that don't depend on the variables of the sequence,
+    # or None for the steps that must be evaluated for each shot.
+    _constant_step_durations: tuple[Time | None, ...] = attrs.field(
+        init=False, eq=False, repr=False
+    )
+    # Maps the body of the lane expressions to their syntax trees with the constant
+    # parts already evaluated.
+    _folded_expressions: Mapping[str, nodes.Expression] = attrs.field(
+        init=False, eq=False, repr=False
+    )
+
+    @_constant_step_durations.default  # pyright: ignore[reportAttributeAccessIssue]
+    def _evaluate_constant_step_durations(self) -> tuple[Time | None, ...]:
+        variable_names = {
+            str(name).split(".")[0] for name in self._parameter_schema.variable_schema
+        }
+        namespace = VariableNamespace()
+        namespace.update(dict(self._parameter_schema.constant_schema))
+        # Like for a shot, the constants are passed as a nested dict so that dotted
+        # names can be accessed as attributes, and its str keys have the same hash as
+        # DottedVariableName.
+        constants = cast(Mapping[DottedVariableName, Any], namespace.dict())
+        durations = []
+        for step, (name, duration) in enumerate(
+            zip(
+                self._time_lanes.step_names,
+                self._time_lanes.step_durations,
+                strict=True,
+            )
+        ):
+            if any(
+                str(variable) in variable_names
+                for variable in duration.upstream_variables
+            ):
+                durations.append(None)
+                continue
+            try:
+                durations.append(
+                    evaluate_step_duration(step, name, duration, constants)
+                )
+            except RecoverableException:
+                # The error will be raised with the context of the shot when the
+                # duration is evaluated again for each shot.
+                durations.append(None)
+        return tuple(durations)
+
+    @_folded_expressions.default  # pyright: ignore[reportAttributeAccessIssue]
+    def _fold_lane_expressions(self) -> Mapping[str, nodes.Expression]:
+        expressions = (
+            value
+            for lane in self._time_lanes.lanes.values()
+            for value in lane.block_values()
+            if isinstance(value, Expression)
+        )
+        return fold_expressions(expressions, self._parameter_schema)
 
     def get_device_configuration(self, device_name: DeviceName) -> DeviceConfiguration:
         """Returns the configuration for the given device.
@@ -101,10 +218,15 @@ class SequenceContext:
         constants: ParameterNamespace,
         time_lanes: TimeLanes,
     ) -> Self:
+        initial_parameters = constants.evaluate()
+        parameter_schema = iterations.get_parameter_schema(initial_parameters)
         return cls(
             device_configurations,
-            iterations.get_parameter_schema(constants.evaluate()),
+            parameter_schema,
             time_lanes,
+            _evaluate_shot_step_durations(
+                iterations, initial_parameters, parameter_schema, time_lanes
+            ),
         )
 
     def _with_devices(
@@ -112,14 +234,172 @@ class SequenceContext:
     ) -> Self:
         return attrs.evolve(self, device_configurations=device_configurations)
 
+    def _evaluate_step_durations(
+        self, parameters: Mapping[DottedVariableName, Any]
+    ) -> tuple[Time, ...]:
+        shot_durations = self._get_shot_step_durations(parameters)
+        return tuple(
+            (
+                constant_duration
+                if constant_duration is not None
+                else (
+                    to_time(shot_duration)
+                    if shot_duration is not None
+                    else evaluate_step_duration(step, name, duration, parameters)
+                )
+            )
+            for step, (name, duration, constant_duration, shot_duration) in enumerate(
+                zip(
+                    self._time_lanes.step_names,
+                    self._time_lanes.step_durations,
+                    self._constant_step_durations,
+                    shot_durations,
+                    strict=True,
+                )
+            )
+        )
+
+    def _get_shot_step_durations(
+        self, parameters: Mapping[DottedVariableName, Any]
+    ) -> tuple[float | None, ...]:
+        if self._shot_step_durations:
+            try:
+                key = _get_shot_key(self._parameter_schema, parameters)
+                return self._shot_step_durations[key]
+            except (KeyError, TypeError):
+                # The shot was not known when the sequence was prepared.
+                pass
+        return (None,) * len(self._constant_step_durations)
+
+
+def _evaluate_shot_step_durations(
+    iterations: IterationConfiguration,
+    initial_parameters: Mapping[DottedVariableName, Any],
+    parameter_schema: ParameterSchema,
+    time_lanes: TimeLanes,
+) -> dict[tuple[Any, ...], tuple[float | None, ...]]:
+    # The durations that depend on the variables are evaluated for all the shots of
+    # the sequence at once, instead of once for each shot when it is compiled.
+    if not isinstance(iterations, StepsConfiguration):
+        return {}
+    variable_names = {
+        str(name).split(".")[0] for name in parameter_schema.variable_schema
+    }
+    varying_steps = {
+        step
+        for step, duration in enumerate(time_lanes.step_durations)
+        if any(
+            str(variable) in variable_names for variable in duration.upstream_variables
+        )
+    }
+    # Walking the shots evaluates the loops of the sequence, so it is only done when
+    # it is needed and for sequences that are not too long.
+    if not varying_steps:
+        return {}
+    expected_shots = iterations.expected_number_shots()
+    if isinstance(expected_shots, int) and expected_shots > MAX_PRECOMPUTED_SHOTS:
+        return {}
+    try:
+        # The contexts are not modified after they are yielded, so their variables
+        # are read without copying them.
+        # noinspection PyProtectedMember
+        shots = list(
+            itertools.islice(
+                (
+                    context._variables.to_flat_dict()
+                    for context in iterations.walk(StepContext(initial_parameters))
+                ),
+                MAX_PRECOMPUTED_SHOTS + 1,
+            )
+        )
+        if not shots or len(shots) > MAX_PRECOMPUTED_SHOTS:
+            return {}
+        table = to_parameter_table(shots)
+    except RecoverableException:
+        # The error will be raised when the shots are scheduled.
+        return {}
+
+    step_durations: list[np.ndarray | None] = []
+    for step, (name, duration) in enumerate(
+        zip(time_lanes.step_names, time_lanes.step_durations, strict=True)
+    ):
+        if step not in varying_steps:
+            step_durations.append(None)
+            continue
+        try:
+            step_durations.append(
+                evaluate_step_duration_batch(step, name, duration, table, len(shots))
+            )
+        except RecoverableException:
+            # The error will be raised with the context of the shot when the
+            # duration is evaluated again for each shot.
+            # This is also the case for expressions that can't be applied to arrays,
+            # like conditional expressions or calls to max.
+            step_durations.append(None)
+    if all(durations is None for durations in step_durations):
+        return {}
+
+    result = {}
+    for index, shot in enumerate(shots):
+        try:
+            key = _get_shot_key(parameter_schema, shot)
+        except (KeyError, TypeError):
+            continue
+        result[key] = tuple(
+            None if durations is None else float(durations[index])
+            for durations in step_durations
+        )
+    return result
+
+
+def _get_shot_key(
+    parameter_schema: ParameterSchema, parameters: Mapping[Any, Any]
+) -> tuple[Any, ...]:
+    key = tuple(
+        _to_key(parameters[str(name)]) for name in parameter_schema.variable_schema
+    )
+    # Raises TypeError if a value can't be used as a key.
+    hash(key)
+    return key
+
+
+def _to_key(value: Any) -> Any:
+    # Hashing a quantity converts it to base units, which is slow, so quantities are
+    # identified by their magnitude and units instead.
+    if is_quantity(value):
+        return value.magnitude, value.units
+    return value
+
+
+class LaneCacheInfo(NamedTuple):
+    """Statistics about the lanes compiled for a shot.
+
+    Attributes:
+        hits: The number of times a lane was requested after it was compiled.
+        misses: The number of times a lane had to be compiled.
+        currsize: The number of compiled lanes, one for each lane and time step.
+    """
+
+    hits: int
+    misses: int
+    currsize: int
+
 
 @attrs.define
 class ShotContext:
-    """Contains information about a shot being compiled."""
+    """Contains information about a shot being compiled.
+
+    If a compilation cache is given, the parameters, step times and lanes read by the
+    device compilers that define the class attribute ``reuse_shot_parameters = True``
+    are recorded, and the device parameters compiled for a previous shot with the same
+    values are reused instead of compiling the device again.
+    The other device compilers are called for every shot.
+    """
 
     _sequence_context: SequenceContext = attrs.field()
     _variables: Mapping[DottedVariableName, Any] = attrs.field()
     _device_compilers: Mapping[DeviceName, "DeviceCompiler"] = attrs.field()
+    _compilation_cache: Optional[DeviceCompilationCache] = attrs.field(default=None)
 
     _step_durations: tuple[Time, ...] = attrs.field(init=False)
     _step_bounds: tuple[Time, ...] = attrs.field(init=False)
@@ -127,6 +407,20 @@ class ShotContext:
     _computed_shot_parameters: dict[DeviceName, Mapping[str, Any]] = attrs.field(
         init=False
     )
+    # The dependencies of the device compilations that are in progress, innermost
+    # last.
+    _recorders: list[Dependencies] = attrs.field(init=False, factory=list)
+    # The dependencies of the devices compiled for this shot, if they are known.
+    _device_dependencies: dict[DeviceName, Optional[Dependencies]] = attrs.field(
+        init=False, factory=dict
+    )
+    # The lanes compiled for this shot with their dependencies, indexed by lane name
+    # and time step.
+    _compiled_lanes: dict[
+        tuple[str, Time], tuple[DimensionedSeries, Optional[Dependencies]]
+    ] = attrs.field(init=False, factory=dict)
+    _lane_cache_hits: int = attrs.field(init=False, default=0)
+    _lane_cache_misses: int = attrs.field(init=False, default=0)
 
     @property
     def _time_lanes(self) -> TimeLanes:
@@ -134,12 +428,9 @@ class ShotContext:
         return self._sequence_context._time_lanes
 
     def __attrs_post_init__(self):
-        self._step_durations = tuple(
-            evaluate_step_durations(
-                self._time_lanes.step_names,
-                self._time_lanes.step_durations,
-                self._variables,
-            )
+        # noinspection PyProtectedMember
+        self._step_durations = self._sequence_context._evaluate_step_durations(
+            self._variables
         )
         self._step_bounds = tuple(get_step_bounds(self._step_durations))
         self._was_lane_used = {name: False for name in self._time_lanes.lanes}
@@ -169,6 +460,79 @@ class ShotContext:
         """
 
         self._was_lane_used[name] = True
+        for recorder in self._recorders:
+            recorder.lanes.add(name)
+
+    def compile_lane(self, name: str, time_step: Time) -> DimensionedSeries:
+        """Returns the values of a lane sampled with the given time step.
+
+        A lane is compiled once per shot for each time step, and the result is shared
+        between all the channels and devices that use the lane.
+        Digital lanes are compiled with :func:`compile_digital_lane` and their values
+        are dimensionless, and analog lanes are compiled with
+        :func:`compile_analog_lane`.
+
+        Raises:
+            KeyError: If no lane with the given name is present for the shot.
+            InvalidTypeError: If the lane is neither a digital nor an analog lane.
+        """
+
+        lane = self.get_lane(name)
+        key = (name, time_step)
+        if key in self._compiled_lanes:
+            self._lane_cache_hits += 1
+            result, dependencies = self._compiled_lanes[key]
+            # The lane was possibly compiled for another device, in which case its
+            # dependencies were only recorded for that device.
+            if dependencies is not None:
+                for recorder in self._recorders:
+                    recorder.merge(dependencies)
+            return result
+        self._lane_cache_misses += 1
+        if self._compilation_cache is None:
+            result = self._compile_lane(name, lane, time_step)
+            dependencies = None
+        else:
+            dependencies = Dependencies(lanes={name})
+            self._recorders.append(dependencies)
+            try:
+                result = self._compile_lane(name, lane, time_step)
+            finally:
+                self._recorders.pop()
+            for recorder in self._recorders:
+                recorder.merge(dependencies)
+        self._compiled_lanes[key] = (result, dependencies)
+        return result
+
+    def _compile_lane(
+        self, name: str, lane: TimeLane, time_step: Time
+    ) -> DimensionedSeries:
+        if isinstance(lane, DigitalTimeLane):
+            values = compile_digital_lane(
+                lane, self.get_step_start_times(), time_step, self.get_parameters()
+            )
+            return DimensionedSeries(values, units=dimensionless)
+        elif isinstance(lane, AnalogTimeLane):
+            return compile_analog_lane(
+                lane, self.get_parameters(), self.get_step_start_times(), time_step
+            )
+        else:
+            raise InvalidTypeError(
+                fmt(
+                    "Don't know how to compile lane '{}' with {:type}",
+                    name,
+                    type(lane),
+                )
+            )
+
+    def get_lane_cache_info(self) -> LaneCacheInfo:
+        """Returns statistics about the lanes compiled for the shot."""
+
+        return LaneCacheInfo(
+            hits=self._lane_cache_hits,
+            misses=self._lane_cache_misses,
+            currsize=len(self._compiled_lanes),
+        )
 
     def get_lanes_with_type(self, lane_type: type[LaneType]) -> Mapping[str, LaneType]:
         """Returns the lanes used during the shot with the given type."""
@@ -184,6 +548,7 @@ class ShotContext:
     def get_step_durations(self) -> Sequence[Time]:
         """Returns the durations of each step in seconds."""
 
+        self._record_step_bounds()
         return self._step_durations
 
     def get_step_start_times(self) -> Sequence[Time]:
@@ -199,6 +564,7 @@ class ShotContext:
             The last element is the total duration of the shot.
         """
 
+        self._record_step_bounds()
         return self._step_bounds
 
     @deprecated("Use get_step_start_times instead")
@@ -208,11 +574,14 @@ class ShotContext:
     def get_shot_duration(self) -> Time:
         """Returns the total duration of the shot in seconds."""
 
+        self._record_step_bounds()
         return self._step_bounds[-1]
 
     def get_parameters(self) -> Parameters:
         """Returns the parameters that define the shot."""
 
+        if self._recorders:
+            return RecordingParameters(self._variables, self._recorders)
         return self._variables
 
     @deprecated("Use get_parameters instead", stacklevel=2)
@@ -241,20 +610,64 @@ class ShotContext:
         """Returns the parameters computed for the given device."""
 
         if device_name in self._computed_shot_parameters:
+            self._record_device(device_name)
             return self._computed_shot_parameters[device_name]
+        compiler = self._device_compilers[device_name]
+        cache = self._compilation_cache
+        if cache is None or not getattr(compiler, "reuse_shot_parameters", False):
+            shot_parameters = self._compile_device(device_name, compiler)
+            dependencies = None
+        elif cached := cache.lookup(device_name, self._variables, self._step_bounds):
+            logger.debug(
+                "Reusing the parameters compiled for device %r in a previous shot",
+                device_name,
+            )
+            shot_parameters, dependencies = cached
+            for lane in dependencies.lanes:
+                self.mark_lane_used(lane)
         else:
-            compiler = self._device_compilers[device_name]
+            dependencies = Dependencies()
+            self._recorders.append(dependencies)
             try:
-                shot_parameters = compiler.compile_shot_parameters(self)
-            except Exception as e:
-                raise DeviceCompilationError(
-                    fmt(
-                        "Couldn't compile parameters for {:device}",
-                        device_name,
-                    )
-                ) from e
-            self._computed_shot_parameters[device_name] = shot_parameters
-            return shot_parameters
+                shot_parameters = self._compile_device(device_name, compiler)
+            finally:
+                self._recorders.pop()
+            cache.add(device_name, dependencies, shot_parameters)
+        self._computed_shot_parameters[device_name] = shot_parameters
+        self._device_dependencies[device_name] = dependencies
+        self._record_device(device_name)
+        return shot_parameters
+
+    def _compile_device(
+        self, device_name: DeviceName, compiler: "DeviceCompiler"
+    ) -> Mapping[str, Any]:
+        try:
+            # noinspection PyProtectedMember
+            with use_folded_expressions(self._sequence_context._folded_expressions):
+                return compiler.compile_shot_parameters(self)
+        except Exception as e:
+            raise DeviceCompilationError(
+                fmt(
+                    "Couldn't compile parameters for {:device}",
+                    device_name,
+                )
+            ) from e
+
+    def _record_step_bounds(self) -> None:
+        for recorder in self._recorders:
+            recorder.step_bounds = self._step_bounds
+
+    def _record_device(self, device_name: DeviceName) -> None:
+        # A device compiler that uses the parameters of another device depends on
+        # everything the other device depends on.
+        if not self._recorders:
+            return
+        dependencies = self._device_dependencies[device_name]
+        for recorder in self._recorders:
+            if dependencies is None:
+                recorder.reusable = False
+            else:
+                recorder.merge(dependencies)
 
     def _unused_lanes(self) -> set[str]:
         return {name for name, used in self._was_lane_used.items() if not used}
@@ -271,49 +684,168 @@ def evaluate_step_durations(
     step_durations: Iterable[Expression],
     variables: Mapping[DottedVariableName, Any],
 ) -> list[Time]:
-    result = []
+    return [
+        evaluate_step_duration(step, name, duration, variables)
+        for step, (name, duration) in enumerate(
+            zip(step_names, step_durations, strict=True)
+        )
+    ]
 
-    for step, (name, duration) in enumerate(
-        zip(step_names, step_durations, strict=True)
-    ):
-        try:
-            evaluated = duration.evaluate(variables)
-        except EvaluationError as e:
-            raise EvaluationError(
-                fmt(
-                    "Couldn't evaluate {:expression} for duration of {:step}",
-                    duration,
-                    (step, name),
-                )
-            ) from e
 
-        if not is_scalar_quantity(evaluated):
-            raise NotQuantityError(
-                fmt(
-                    "{:expression} for duration of {:step} does not evaluate "
-                    "to a scalar quantity",
-                    duration,
-                    (step, name),
-                )
+def evaluate_step_duration(
+    step: int,
+    name: str,
+    duration: Expression,
+    variables: Mapping[DottedVariableName, Any],
+) -> Time:
+    try:
+        evaluated = duration.evaluate(variables)
+    except EvaluationError as e:
+        raise EvaluationError(
+            fmt(
+                "Couldn't evaluate {:expression} for duration of {:step}",
+                duration,
+                (step, name),
+            )
+        ) from e
+
+    if not is_scalar_quantity(evaluated):
+        raise NotQuantityError(
+            fmt(
+                "{:expression} for duration of {:step} does not evaluate "
+                "to a scalar quantity",
+                duration,
+                (step, name),
             )
+        )
 
-        try:
-            seconds = evaluated.to_unit(SECOND).magnitude
-        except DimensionalityError as error:
-            raise InvalidDimensionalityError(
-                fmt(
-                    "Couldn't convert {:expression} for duration of {:step} to seconds",
-                    duration,
-                    (step, name),
-                )
-            ) from error
-        if seconds < 0:
-            raise InvalidValueError(
-                fmt(
-                    "{:expression} for duration of {:step} is negative",
-                    duration,
-                    (step, name),
-                )
+    try:
+        seconds = magnitude_in_unit(evaluated, SECOND)
+    except DimensionalityError as error:
+        raise InvalidDimensionalityError(
+            fmt(
+                "Couldn't convert {:expression} for duration of {:step} to seconds",
+                duration,
+                (step, name),
             )
-        result.append(to_time(seconds))
-    return result
+        ) from error
+    if seconds < 0:
+        raise InvalidValueError(
+            fmt(
+                "{:expression} for duration of {:step} is negative",
+                duration,
+                (step, name),
+            )
+        )
+    return to_time(seconds)
+
+
+def evaluate_step_durations_batch(
+    step_names: Iterable[str],
+    step_durations: Iterable[Expression],
+    parameters: Mapping[DottedVariableName, Any],
+    shots: int,
+) -> np.ndarray:
+    """Evaluates the durations of the steps for several shots at once.
+
+    This computes the same values as :func:`evaluate_step_durations` for each shot, but
+    each duration expression is evaluated once on arrays of parameter values.
+
+    Args:
+        step_names: The names of the steps.
+        step_durations: The expressions for the durations of the steps.
+        parameters: The values of the parameters for all shots, with one array of
+            values per parameter, as obtained from
+            :func:`caqtus.shot_compilation._evaluation.to_parameter_table`.
+        shots: The number of shots.
+
+    Returns:
+        A float array of shape (number of steps, shots) with the duration in seconds
+        of each step for each shot.
+        Use :func:`to_time` to convert a duration to the type used in compilation.
+    """
+
+    durations = [
+        evaluate_step_duration_batch(step, name, duration, parameters, shots)
+        for step, (name, duration) in enumerate(
+            zip(step_names, step_durations, strict=True)
+        )
+    ]
+    return np.array(durations, dtype=np.float64).reshape(-1, shots)
+
+
+def evaluate_step_duration_batch(
+    step: int,
+    name: str,
+    duration: Expression,
+    parameters: Mapping[DottedVariableName, Any],
+    shots: int,
+) -> np.ndarray:
+    """Evaluates the duration of a step for several shots at once.
+
+    Returns:
+        A float array with the duration in seconds of the step for each shot.
+    """
+
+    # The duration is evaluated like for a single shot, with arrays instead of
+    # scalars as values of the parameters.
+    # Like for a shot, the variables are passed as a nested dict with str keys, which
+    # have the same hash as DottedVariableName.
+    namespace = VariableNamespace()
+    namespace.update(dict(parameters))
+    try:
+        evaluated = duration.evaluate(
+            namespace.dict()  # pyright: ignore[reportArgumentType]
+        )
+    except EvaluationError as e:
+        raise EvaluationError(
+            fmt(
+                "Couldn't evaluate {:expression} for duration of {:step}",
+                duration,
+                (step, name),
+            )
+        ) from e
+
+    if not is_quantity(evaluated):
+        raise NotQuantityError(
+            fmt(
+                "{:expression} for duration of {:step} does not evaluate "
+                "to a quantity",
+                duration,
+                (step, name),
+            )
+        )
+
+    try:
+        seconds = np.asarray(evaluated.to_unit(SECOND).magnitude, dtype=np.float64)
+    except DimensionalityError as error:
+        raise InvalidDimensionalityError(
+            fmt(
+                "Couldn't convert {:expression} for duration of {:step} to seconds",
+                duration,
+                (step, name),
+            )
+        ) from error
+    if seconds.ndim == 0 and not duration.upstream_variables:
+        seconds = np.broadcast_to(seconds, (shots,))
+    elif seconds.shape != (shots,):
+        # This happens when the expression is not applied element-wise to the
+        # parameters, for example when it takes the maximum of an array.
+        raise InvalidValueError(
+            fmt(
+                "{:expression} for duration of {:step} does not evaluate to one "
+                "value per shot",
+                duration,
+                (step, name),
+            )
+        )
+    if np.any(negative := seconds < 0):
+        raise InvalidValueError(
+            fmt(
+                "{:expression} for duration of {:step} is negative for {:shot}",
+                duration,
+                (step, name),
+                int(np.argmax(negative)),
+            )
+        )
+    return seconds
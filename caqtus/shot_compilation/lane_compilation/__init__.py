@@ -1,6 +1,14 @@
 """Contains functions to compile lanes into raw values."""
 
+from ._block_cache import BlockCacheInfo, clear_block_cache, get_block_cache_info
 from ._compile_analog_lane import compile_analog_lane, DimensionedSeries
 from ._compile_digital_lane import compile_digital_lane
 
-__all__ = ["compile_digital_lane", "compile_analog_lane", "DimensionedSeries"]
+__all__ = [
+    "compile_digital_lane",
+    "compile_analog_lane",
+    "DimensionedSeries",
+    "BlockCacheInfo",
+    "get_block_cache_info",
+    "clear_block_cache",
+]
@@ -0,0 +1,201 @@
+"""Reuse of the blocks of lanes compiled for previous shots.
+
+In a scan, only a few parameters change between consecutive shots, and they only
+affect a few blocks of a few lanes.
+The result of compiling a block is kept in a process-wide cache, indexed by the
+expression of the block, its start and stop times and the time step.
+A block is compiled again only if one of these or the value of a variable used by its
+expression changed, otherwise the result compiled for a previous shot is reused.
+
+The cache is kept between shots by the worker processes that compile them.
+It is bounded by the number of bytes of the arrays held by the compiled blocks, as a
+single time-dependent block can take tens of megabytes, and each worker has its own
+cache.
+"""
+
+from __future__ import annotations
+
+import collections
+import threading
+from collections.abc import Callable, Hashable, Mapping
+from typing import Any, NamedTuple
+
+from caqtus.types.expression import Expression
+from caqtus.types.expression._expression import DEFAULT_BUILTINS
+from .._compilation_cache import same_value
+from .._evaluation._parse import get_folded_expression
+from ..timing import Time
+
+BLOCK_CACHE_SIZE = 1024
+"""The maximum number of compiled blocks kept by each process."""
+
+BLOCK_CACHE_MAX_BYTES = 64 * 2**20
+"""The maximum number of bytes of compiled blocks kept by each process.
+
+Blocks that are larger than this are compiled for every shot instead of being kept.
+"""
+
+_MISSING = object()
+
+
+class BlockCacheInfo(NamedTuple):
+    """Statistics about the compiled blocks cache of a process."""
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+    maxbytes: int
+    currbytes: int
+
+
+class _Entry(NamedTuple):
+    values: tuple[Any, ...]
+    result: Any
+    nbytes: int
+
+
+class _BlockCache:
+    def __init__(self, maxsize: int, maxbytes: int):
+        self._maxsize = maxsize
+        self._maxbytes = maxbytes
+        self._nbytes = 0
+        self._entries: collections.OrderedDict[Hashable, _Entry] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get_or_compile[
+        R
+    ](
+        self, key: Hashable, values: tuple[Any, ...], compile_block: Callable[[], R]
+    ) -> R:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and _same_values(entry.values, values):
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry.result
+            self._misses += 1
+        # Errors are not cached, they are raised again if the block is compiled with
+        # the same values.
+        result = compile_block()
+        nbytes = _get_nbytes(result)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous.nbytes
+            if nbytes > self._maxbytes:
+                return result
+            self._entries[key] = _Entry(values, result, nbytes)
+            self._nbytes += nbytes
+            while (
+                len(self._entries) > self._maxsize or self._nbytes > self._maxbytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+        return result
+
+    def info(self) -> BlockCacheInfo:
+        with self._lock:
+            return BlockCacheInfo(
+                self._hits,
+                self._misses,
+                self._maxsize,
+                len(self._entries),
+                self._maxbytes,
+                self._nbytes,
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self._hits = 0
+            self._misses = 0
+
+
+_block_cache = _BlockCache(BLOCK_CACHE_SIZE, BLOCK_CACHE_MAX_BYTES)
+
+
+def reuse_compiled_block[
+    R
+](
+    kind: str,
+    expression: Expression,
+    variables: Mapping[Any, Any],
+    start_time: Time,
+    stop_time: Time,
+    time_step: Time,
+    compile_block: Callable[[], R],
+) -> R:
+    """Returns the result of compiling a block, reusing a previous result if possible.
+
+    Args:
+        kind: Identifies the function that compiles the block, so that blocks compiled
+            differently don't share their results.
+        expression: The expression of the block.
+        variables: The values of the variables of the shot.
+            Only the variables used by the expression are looked up.
+        start_time: The time at which the block starts.
+        stop_time: The time at which the block ends.
+        time_step: The time step used to discretize the block.
+        compile_block: Called to compile the block if there is no result to reuse.
+            It must only depend on the other arguments.
+    """
+
+    if expression.builtins is not DEFAULT_BUILTINS:
+        return compile_block()
+    # The expressions are evaluated with their folded syntax tree if there is one in
+    # use, which depends on the constants of the sequence.
+    key = (
+        kind,
+        expression.body,
+        get_folded_expression(expression),
+        start_time,
+        stop_time,
+        time_step,
+    )
+    names = sorted(str(name) for name in expression.upstream_variables)
+    values = tuple(_get(variables, name) for name in names)
+    return _block_cache.get_or_compile(key, values, compile_block)
+
+
+def reuse_compiled_value[R](key: Hashable, compile_value: Callable[[], R]) -> R:
+    """Returns a value that only depends on a hashable key, computing it if needed."""
+
+    return _block_cache.get_or_compile(key, (), compile_value)
+
+
+def get_block_cache_info() -> BlockCacheInfo:
+    """Returns the number of hits and misses of the compiled blocks in this process."""
+
+    return _block_cache.info()
+
+
+def clear_block_cache() -> None:
+    """Removes all compiled blocks from the cache and resets its counters."""
+
+    _block_cache.clear()
+
+
+def _get(variables: Mapping[Any, Any], name: str) -> Any:
+    try:
+        return variables[name]
+    except KeyError:
+        return _MISSING
+
+
+def _get_nbytes(result: Any) -> int:
+    # Instructions and arrays report the size of their values, the other results,
+    # like constant blocks, only hold a few numbers.
+    return int(getattr(result, "nbytes", 0))
+
+
+def _same_values(left: tuple[Any, ...], right: tuple[Any, ...]) -> bool:
+    return all(
+        same_value(left_value, right_value)
+        for left_value, right_value in zip(left, right, strict=True)
+    )
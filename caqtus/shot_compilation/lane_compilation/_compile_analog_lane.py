@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import collections
+import functools
 from collections.abc import Sequence, Mapping
 from typing import assert_never, Optional, Any, assert_type
 
@@ -22,15 +23,24 @@ from caqtus.types.units import (
     Unit,
     is_scalar_quantity,
 )
-from caqtus.types.units.base import is_in_base_units, BaseUnit
+from caqtus.types.units._conversion import get_base_unit
+from caqtus.types.units.base import (
+    is_in_base_units,
+    BaseUnit,
+    magnitude_in_base_units,
+)
 from caqtus.types.variable_name import VariableName, DottedVariableName
+from .._evaluation import get_folded_constant
 from ..timed_instructions import (
     TimedInstruction,
     Pattern,
     concatenate,
     create_ramp,
+    create_piecewise_linear,
 )
-from ..timing import Time, number_ticks, start_tick, stop_tick
+from ..timing import Time, get_step_ticks, number_ticks, start_tick, stop_tick
+from ._block_cache import reuse_compiled_block, reuse_compiled_value
+from ._numpy_expression import CompiledTimeExpression, compile_time_expression
 
 TIME_VARIABLE = VariableName("t")
 
@@ -69,6 +79,9 @@ def compile_analog_lane(
     This function discretizes the lane time and evaluates the expressions and ramps
     in the lane for each tick.
 
+    The result of each block is reused from a previous shot if the variables used by
+    its expression and its start and stop times are the same.
+
     Args:
         lane: The lane to compile.
         variables: The values of the variables to use when evaluating the expressions
@@ -94,18 +107,30 @@ def compile_analog_lane(
     # the blocks that contain ramps.
     # This is necessary because ramps need to know the value of the surrounding blocks
     # to be computed.
+    ticks = get_step_ticks(step_start_times, time_step)
     expression_results: dict[Block, ConstantBlockResult | TimeDependentBlockResult] = {}
     for block_index, block_value in enumerate(lane.block_values()):
         block_start_step, block_stop_step = lane.get_block_bounds(Block(block_index))
         block_start_time = step_start_times[block_start_step]
         block_stop_time = step_start_times[block_stop_step]
         if isinstance(block_value, Expression):
-            expr_result = _compile_expression_block(
+            length = int(ticks[block_stop_step] - ticks[block_start_step])
+            expr_result = reuse_compiled_block(
+                "analog",
                 block_value,
                 variables,
                 block_start_time,
                 block_stop_time,
                 time_step,
+                functools.partial(
+                    _compile_expression_block,
+                    block_value,
+                    variables,
+                    block_start_time,
+                    block_stop_time,
+                    time_step,
+                    length,
+                ),
             )
             expression_results[Block(block_index)] = expr_result
         elif isinstance(block_value, Ramp):
@@ -153,11 +178,11 @@ def compile_analog_lane(
     assert len(block_results) == lane.number_blocks
     # Need to ensure that the instructions are sorted by block index before
     # concatenating
-    instructions = (
-        block_results[Block(block)].to_instruction()
-        for block in range(lane.number_blocks)
+    total_instruction = concatenate(
+        *_to_instructions(
+            [block_results[Block(block)] for block in range(lane.number_blocks)]
+        )
     )
-    total_instruction = concatenate(*instructions)
 
     units = {result.unit for result in block_results.values()}
     assert len(units) == 1
@@ -166,8 +191,38 @@ def compile_analog_lane(
     return DimensionedSeries(total_instruction, unit)
 
 
+def _to_instructions(
+    results: Sequence[ConstantBlockResult | TimeDependentBlockResult | RampBlockResult],
+) -> list[TimedInstruction[np.float64]]:
+    # Consecutive constant and ramp blocks are linear by parts, so they are grouped
+    # into a single piecewise linear instruction instead of one instruction per block.
+    instructions = []
+    run: list[ConstantBlockResult | RampBlockResult] = []
+    for result in [*results, None]:
+        if isinstance(result, (ConstantBlockResult, RampBlockResult)):
+            run.append(result)
+            continue
+        non_empty = [block for block in run if block.length > 0]
+        if len(non_empty) > 1 and any(
+            isinstance(block, RampBlockResult) for block in non_empty
+        ):
+            instructions.append(
+                create_piecewise_linear(
+                    [block.get_initial_value() for block in non_empty],
+                    [block.get_final_value() for block in non_empty],
+                    [block.length for block in non_empty],
+                )
+            )
+        else:
+            instructions.extend(block.to_instruction() for block in run)
+        run = []
+        if result is not None:
+            instructions.append(result.to_instruction())
+    return instructions
+
+
 def get_unique_units(
-    units: Mapping[Block, Optional[Unit]]
+    units: Mapping[Block, Optional[Unit]],
 ) -> dict[Optional[Unit], list[Block]]:
     unique_units = collections.defaultdict(list)
 
@@ -183,9 +238,9 @@ def _compile_expression_block(
     start_time: Time,
     stop_time: Time,
     time_step: Time,
+    length: int,
 ) -> ConstantBlockResult | TimeDependentBlockResult:
     if is_constant(expression):
-        length = number_ticks(start_time, stop_time, time_step)
         return evaluate_constant_expression(expression, variables, length)
     else:
         return evaluate_time_dependent_expression(
@@ -198,7 +253,16 @@ def evaluate_constant_expression(
     variables: Mapping[DottedVariableName, Any],
     length: int,
 ) -> ConstantBlockResult:
-    value = evaluate(expression, variables)
+    # Expressions that only depend on the constants of the sequence have already been
+    # evaluated when the sequence context was created.
+    folded = get_folded_constant(expression)
+    if folded is None:
+        value = evaluate(expression, variables)
+    elif is_scalar_quantity(folded):
+        magnitude, unit = magnitude_in_base_units(folded)
+        value = Quantity(magnitude, unit)
+    else:
+        value = folded
 
     if is_scalar_quantity(value):
         return ConstantBlockResult(
@@ -224,6 +288,12 @@ def evaluate_time_dependent_expression(
 ) -> TimeDependentBlockResult:
     assert not is_constant(expression)
 
+    compiled = compile_time_expression(expression, variables)
+    if compiled is not None:
+        return _evaluate_compiled_expression(
+            compiled, variables, start_time, stop_time, time_step
+        )
+
     time_values = get_time_array(start_time, stop_time, time_step) - float(start_time)
     # The first time is not necessarily 0, it is the time of the first tick of the
     # block.
@@ -238,8 +308,16 @@ def evaluate_time_dependent_expression(
     )
 
     t = time_values * ureg.s
-    variables = dict(variables) | {TIME_VARIABLE: t}
-    evaluated = expression.evaluate(variables)
+    # Only the parameters used by the expression are accessed.
+    # We can use VariableName as key instead of DottedVariableName because they have
+    # the same hash.
+    used_variables: dict[Any, Any] = {
+        name: variables[name]  # pyright: ignore[reportArgumentType]
+        for name in expression.upstream_variables
+        if name in variables
+    }
+    used_variables[TIME_VARIABLE] = t
+    evaluated = expression.evaluate(used_variables)
 
     if isinstance(evaluated, Quantity):
         in_base_units = evaluated.to_base_units()
@@ -270,6 +348,38 @@ def evaluate_time_dependent_expression(
     )
 
 
+def _evaluate_compiled_expression(
+    compiled: CompiledTimeExpression,
+    variables: Mapping[DottedVariableName, Any],
+    start_time: Time,
+    stop_time: Time,
+    time_step: Time,
+) -> TimeDependentBlockResult:
+    # Same times as in evaluate_time_dependent_expression, but the array is filled in
+    # place instead of being built with np.insert.
+    length = number_ticks(start_time, stop_time, time_step)
+    time_values = np.empty(length + 2, dtype=np.float64)
+    time_values[0] = 0.0
+    time_values[-1] = float(stop_time - start_time)
+    ticks = time_values[1:-1]
+    ticks[:] = np.arange(
+        start_tick(start_time, time_step),
+        stop_tick(stop_time, time_step),
+        dtype=np.float64,
+    )
+    ticks *= float(time_step)
+    ticks -= float(start_time)
+
+    magnitudes = np.empty(length + 2, dtype=np.float64)
+    compiled.evaluate_into(time_values, variables, magnitudes)
+    return TimeDependentBlockResult(
+        values=magnitudes[1:-1],
+        unit=get_base_unit(compiled.dimensions),
+        initial_value=float(magnitudes[0]),
+        final_value=float(magnitudes[-1]),
+    )
+
+
 def _compile_ramp_cell(
     lane: AnalogTimeLane,
     ramp_block: Block,
@@ -307,13 +417,25 @@ def _compile_ramp_cell(
     ramp_start_time = step_bounds[ramp_start_step]
     ramp_end_time = step_bounds[ramp_end_step]
 
-    return RampBlockResult.through_two_points(
-        ramp_start_time,
-        ramp_start_value,
-        ramp_end_time,
-        ramp_end_value,
-        time_step,
-        previous_block_result.unit,
+    unit = previous_block_result.unit
+    return reuse_compiled_value(
+        (
+            "ramp",
+            ramp_start_time,
+            ramp_start_value,
+            ramp_end_time,
+            ramp_end_value,
+            time_step,
+            unit,
+        ),
+        lambda: RampBlockResult.through_two_points(
+            ramp_start_time,
+            ramp_start_value,
+            ramp_end_time,
+            ramp_end_value,
+            time_step,
+            unit,
+        ),
     )
 
 
@@ -377,6 +499,18 @@ class TimeDependentBlockResult:
         return self.final_value
 
     def to_instruction(self) -> TimedInstruction[np.float64]:
+        return self._instruction
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes of the values, including the copy in the instruction."""
+
+        return 2 * self.values.nbytes
+
+    @functools.cached_property
+    def _instruction(self) -> TimedInstruction[np.float64]:
+        # Block results are reused between shots, so the values are only copied and
+        # checked once.
         return Pattern(self.values, dtype=np.dtype(np.float64))
 
 
@@ -428,5 +562,11 @@ class RampBlockResult:
             unit,
         )
 
+    def get_initial_value(self) -> float:
+        return self.initial_value
+
+    def get_final_value(self) -> float:
+        return self.final_value
+
     def to_instruction(self) -> TimedInstruction[np.float64]:
         return create_ramp(self.initial_value, self.final_value, self.length)
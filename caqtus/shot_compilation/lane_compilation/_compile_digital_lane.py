@@ -1,3 +1,4 @@
+import functools
 from collections.abc import Sequence
 from typing import assert_never
 
@@ -12,7 +13,8 @@ from caqtus.types.expression import Expression
 from caqtus.types.parameter import Parameters
 from caqtus.types.timelane import DigitalTimeLane
 from .._evaluation import evaluate_time_dependent_digital_expression
-from ..timing import Time, number_ticks
+from ..timing import Time, get_step_ticks
+from ._block_cache import reuse_compiled_block
 
 
 def compile_digital_lane(
@@ -23,6 +25,10 @@ def compile_digital_lane(
 ) -> TimedInstruction[np.bool]:
     """Compile a digital lane into a sequence of instructions.
 
+    The instructions of the blocks with an expression are reused from a previous shot
+    if the variables used by the expression and the start and stop times of the block
+    are the same.
+
     Args:
         lane: The digital lane to compile.
         step_start_times: The start times of each step.
@@ -38,22 +44,32 @@ def compile_digital_lane(
             f"start times ({len(step_start_times) - 1})"
         )
 
+    ticks = get_step_ticks(step_start_times, time_step)
     instructions = []
     for cell_value, (start, stop) in zip(
         lane.block_values(), lane.block_bounds(), strict=True
     ):
         if isinstance(cell_value, bool):
-            length = number_ticks(
-                step_start_times[start], step_start_times[stop], time_step
-            )
+            length = int(ticks[stop] - ticks[start])
             instructions.append(Pattern([cell_value]) * length)
         elif isinstance(cell_value, Expression):
-            instr = evaluate_time_dependent_digital_expression(
+            start_time = step_start_times[start]
+            stop_time = step_start_times[stop]
+            instr = reuse_compiled_block(
+                "digital",
                 cell_value,
                 parameters,
-                step_start_times[start],
-                step_start_times[stop],
+                start_time,
+                stop_time,
                 time_step,
+                functools.partial(
+                    evaluate_time_dependent_digital_expression,
+                    cell_value,
+                    parameters,
+                    start_time,
+                    stop_time,
+                    time_step,
+                ),
             )
             instructions.append(instr)
         else:
@@ -0,0 +1,337 @@
+"""Evaluation of time-dependent expressions on raw float arrays.
+
+Evaluating a time-dependent expression with pint wraps every intermediate array in a
+quantity and converts units at each operation.
+Instead, the syntax tree of the expression is compiled into a tree of closures that
+only apply numpy functions to float arrays in base units.
+The units are resolved during compilation from the units of the parameters used by
+the expression, so the compiled expression is cached and reused as long as the
+parameters keep the same units, which is usually the case for all the shots of a
+sequence.
+
+Only a subset of expressions can be compiled.
+For the other expressions, :func:`compile_time_expression` returns None and the
+expression must be evaluated with :meth:`Expression.evaluate`.
+"""
+
+from __future__ import annotations
+
+import ast
+import functools
+import operator
+from collections.abc import Callable, Mapping
+from typing import Any, Optional
+
+import attrs
+import numpy as np
+
+from caqtus.types.expression import Expression
+from caqtus.types.expression._expression import DEFAULT_BUILTINS
+from caqtus.types.units import Quantity, Unit, is_scalar_quantity
+from caqtus.types.units._conversion import (
+    Dimensions,
+    combine_dimensions,
+    get_unit_conversion,
+    is_dimensionless,
+    normalize_dimensions,
+)
+
+_TIME = "t"
+
+type _Function = Callable[[np.ndarray, Mapping[str, Any]], Any]
+
+# Functions that accept dimensionless arguments.
+_DIMENSIONLESS_FUNCTIONS: Mapping[str, np.ufunc] = {
+    name: DEFAULT_BUILTINS[name]
+    for name in [
+        "cos",
+        "cosh",
+        "exp",
+        "log",
+        "log10",
+        "log2",
+        "sin",
+        "sinh",
+        "tan",
+        "tanh",
+    ]
+}
+
+_CONSTANT_OPERATORS: Mapping[np.ufunc, Callable[[float, float], Any]] = {
+    np.add: operator.add,
+    np.subtract: operator.sub,
+    np.multiply: operator.mul,
+    np.true_divide: operator.truediv,
+    np.power: operator.pow,
+}
+
+
+class _NotCompilableError(Exception):
+    pass
+
+
+@attrs.frozen
+class _Node:
+    function: _Function
+    dimensions: Dimensions
+    # The value of the node if it doesn't depend on the time or on parameters.
+    constant: Optional[float] = None
+    # Element-wise operations keep their ufunc and operands to be able to write the
+    # result in a given buffer.
+    ufunc: Optional[np.ufunc] = None
+    operands: tuple[_Node, ...] = ()
+
+
+@attrs.frozen
+class CompiledTimeExpression:
+    """A time-dependent expression compiled to numpy operations.
+
+    Attributes:
+        dimensions: The dimensions of the values of the expression.
+    """
+
+    _root: _Node
+    dimensions: Dimensions
+
+    def evaluate_into(
+        self, time: np.ndarray, parameters: Mapping[Any, Any], out: np.ndarray
+    ) -> None:
+        """Evaluates the expression and writes the result into a buffer.
+
+        Args:
+            time: The values of the time variable in seconds.
+            parameters: The values of the parameters used by the expression.
+                They must have the same units as the parameters the expression was
+                compiled with.
+            out: The array in which to write the values of the expression in base
+                units.
+                It must have the same shape as the time array.
+        """
+
+        root = self._root
+        if root.ufunc is not None:
+            root.ufunc(
+                *(operand.function(time, parameters) for operand in root.operands),
+                out=out,
+            )
+        else:
+            out[...] = root.function(time, parameters)
+
+
+def compile_time_expression(
+    expression: Expression, parameters: Mapping[Any, Any]
+) -> Optional[CompiledTimeExpression]:
+    """Compiles a time-dependent expression for the units of the given parameters.
+
+    Returns:
+        The compiled expression, or None if the expression can't be compiled.
+        This can be because the expression uses unsupported operations or units, or
+        because it fails to evaluate, in which case :meth:`Expression.evaluate` raises
+        the appropriate error.
+    """
+
+    if expression.builtins is not DEFAULT_BUILTINS:
+        return None
+    body = expression.body
+    names = _get_names(body)
+    if names is None:
+        return None
+    parameter_names, builtin_names = names
+    # Parameters take precedence over builtins when the expression is evaluated.
+    if any(name in parameters for name in builtin_names):
+        return None
+    signature = []
+    for name in parameter_names:
+        try:
+            value = parameters[name]
+        except KeyError:
+            return None
+        if isinstance(value, Quantity) and is_scalar_quantity(value):
+            signature.append((name, value.units))
+        elif isinstance(value, (bool, int, float)):
+            signature.append((name, None))
+        else:
+            return None
+    return _compile(body, tuple(signature))
+
+
+@functools.lru_cache(maxsize=1024)
+def _get_names(body: str) -> Optional[tuple[tuple[str, ...], tuple[str, ...]]]:
+    # noinspection PyProtectedMember
+    tree = Expression(body)._ast  # pyright: ignore[reportPrivateUsage]
+    parameter_names = set()
+    builtin_names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute):
+            name = _dotted_name(node)
+            if name is None:
+                return None
+            parameter_names.add(name)
+        elif isinstance(node, ast.Name) and node.id != _TIME:
+            if node.id in DEFAULT_BUILTINS:
+                builtin_names.add(node.id)
+            elif not _is_attribute_root(tree, node):
+                parameter_names.add(node.id)
+    return tuple(sorted(parameter_names)), tuple(sorted(builtin_names))
+
+
+def _is_attribute_root(tree: ast.AST, name: ast.Name) -> bool:
+    return any(
+        isinstance(node, ast.Attribute) and node.value is name
+        for node in ast.walk(tree)
+    )
+
+
+def _dotted_name(node: ast.Attribute) -> Optional[str]:
+    match node.value:
+        case ast.Name(id=root):
+            return f"{root}.{node.attr}"
+        case ast.Attribute() as parent:
+            if (parent_name := _dotted_name(parent)) is None:
+                return None
+            return f"{parent_name}.{node.attr}"
+        case _:
+            return None
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(
+    body: str, signature: tuple[tuple[str, Optional[Unit]], ...]
+) -> Optional[CompiledTimeExpression]:
+    # noinspection PyProtectedMember
+    tree = Expression(body)._ast  # pyright: ignore[reportPrivateUsage]
+    try:
+        root = _compile_node(tree.body, dict(signature))
+    except (_NotCompilableError, ArithmeticError):
+        return None
+    return CompiledTimeExpression(root, root.dimensions)
+
+
+def _compile_node(node: ast.AST, units: Mapping[str, Optional[Unit]]) -> _Node:
+    match node:
+        case ast.Constant(value=bool() | int() | float() as value):
+            return _constant(float(value), ())
+        case ast.Name(id=name) if name == _TIME:
+            return _Node(function=lambda t, p: t, dimensions=(("second", 1),))
+        case ast.Name(id=name) if name in units:
+            return _parameter(name, units[name])
+        case ast.Attribute():
+            name = _dotted_name(node)
+            if name is None or name not in units:
+                raise _NotCompilableError(node)
+            return _parameter(name, units[name])
+        case ast.Name(id=name) if name in DEFAULT_BUILTINS:
+            return _builtin(DEFAULT_BUILTINS[name])
+        case ast.BinOp(left=left, op=op, right=right):
+            return _binary_operation(
+                op, _compile_node(left, units), _compile_node(right, units)
+            )
+        case ast.UnaryOp(op=ast.USub(), operand=operand):
+            compiled = _compile_node(operand, units)
+            if compiled.constant is not None:
+                return _constant(-compiled.constant, compiled.dimensions)
+            return _element_wise(np.negative, compiled.dimensions, compiled)
+        case ast.UnaryOp(op=ast.UAdd(), operand=operand):
+            return _compile_node(operand, units)
+        case ast.Call(func=ast.Name(id=function), args=[argument], keywords=[]):
+            if function in units:
+                raise _NotCompilableError(node)
+            return _call(function, _compile_node(argument, units))
+        case _:
+            raise _NotCompilableError(node)
+
+
+def _constant(value: float, dimensions: Dimensions) -> _Node:
+    return _Node(function=lambda t, p: value, dimensions=dimensions, constant=value)
+
+
+def _parameter(name: str, unit: Optional[Unit]) -> _Node:
+    if unit is None:
+        return _Node(function=lambda t, p: p[name], dimensions=())
+    conversion = get_unit_conversion(unit)
+    if conversion is None:
+        raise _NotCompilableError(unit)
+    factor = conversion.factor
+    if factor == 1.0:
+        function = lambda t, p: p[name].magnitude  # noqa: E731
+    else:
+        function = lambda t, p: p[name].magnitude * factor  # noqa: E731
+    return _Node(function=function, dimensions=conversion.dimensions)
+
+
+def _builtin(value: Any) -> _Node:
+    if isinstance(value, Unit):
+        conversion = get_unit_conversion(value)
+        if conversion is None:
+            raise _NotCompilableError(value)
+        return _constant(conversion.factor, conversion.dimensions)
+    if isinstance(value, (bool, int, float)):
+        return _constant(float(value), ())
+    # Functions are only supported when they are called.
+    raise _NotCompilableError(value)
+
+
+def _binary_operation(op: ast.operator, left: _Node, right: _Node) -> _Node:
+    match op:
+        case ast.Add() | ast.Sub():
+            if left.dimensions != right.dimensions:
+                raise _NotCompilableError(op)
+            dimensions = left.dimensions
+            ufunc = np.add if isinstance(op, ast.Add) else np.subtract
+        case ast.Mult():
+            dimensions = combine_dimensions(left.dimensions, right.dimensions, 1)
+            ufunc = np.multiply
+        case ast.Div():
+            dimensions = combine_dimensions(left.dimensions, right.dimensions, -1)
+            ufunc = np.true_divide
+        case ast.Pow():
+            if right.dimensions:
+                raise _NotCompilableError(op)
+            if left.dimensions:
+                if right.constant is None:
+                    raise _NotCompilableError(op)
+                exponent = right.constant
+                dimensions = normalize_dimensions(
+                    tuple((name, power * exponent) for name, power in left.dimensions)
+                )
+            else:
+                dimensions = ()
+            ufunc = np.power
+        case _:
+            raise _NotCompilableError(op)
+    if left.constant is not None and right.constant is not None:
+        # Python operators raise on division by zero like the evaluation with pint.
+        value = _CONSTANT_OPERATORS[ufunc](left.constant, right.constant)
+        if isinstance(value, complex):
+            # Negative numbers raised to fractional powers give complex numbers.
+            raise _NotCompilableError(op)
+        return _constant(float(value), dimensions)
+    return _element_wise(ufunc, dimensions, left, right)
+
+
+def _call(function: str, argument: _Node) -> _Node:
+    if function == "abs":
+        return _element_wise(np.absolute, argument.dimensions, argument)
+    if function == "sqrt":
+        dimensions = normalize_dimensions(
+            tuple((name, power / 2) for name, power in argument.dimensions)
+        )
+        return _element_wise(np.sqrt, dimensions, argument)
+    if function in _DIMENSIONLESS_FUNCTIONS:
+        if not is_dimensionless(argument.dimensions):
+            raise _NotCompilableError(function)
+        return _element_wise(_DIMENSIONLESS_FUNCTIONS[function], (), argument)
+    raise _NotCompilableError(function)
+
+
+def _element_wise(ufunc: np.ufunc, dimensions: Dimensions, *operands: _Node) -> _Node:
+    if len(operands) == 1:
+        (operand,) = operands
+        operand_function = operand.function
+        function = lambda t, p: ufunc(operand_function(t, p))  # noqa: E731
+    else:
+        left, right = (operand.function for operand in operands)
+        function = lambda t, p: ufunc(left(t, p), right(t, p))  # noqa: E731
+    return _Node(
+        function=function, dimensions=dimensions, ufunc=ufunc, operands=operands
+    )
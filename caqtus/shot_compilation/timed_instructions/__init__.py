@@ -8,9 +8,21 @@ from ._instructions import (
     concatenate,
     InstrType,
 )
+from ._intern import intern_instruction, InternTable, get_intern_table
+from ._lazy import defer, DeferredInstruction
+from ._packed import (
+    PackedDigitalInstruction,
+    pack_digital,
+    pack_instruction,
+    stack_digital,
+    word_dtype,
+    MAX_PACKED_CHANNELS,
+)
+from ._piecewise_linear import PiecewiseLinear, create_piecewise_linear
 from ._plot import plot_instruction
 from ._ramp import create_ramp, Ramp
-from ._stack import stack_instructions, merge_instructions
+from ._serialization import encode_instruction, decode_instruction, ENCODING_VERSION
+from ._stack import stack_instructions, merge_instructions, combine_instructions
 from ._to_graph import to_graph
 from ._to_time_array import convert_to_change_arrays
 from ._with_name import with_name
@@ -24,10 +36,27 @@ __all__ = [
     "with_name",
     "stack_instructions",
     "merge_instructions",
+    "combine_instructions",
     "concatenate",
     "create_ramp",
     "Ramp",
+    "create_piecewise_linear",
+    "PiecewiseLinear",
     "plot_instruction",
     "to_graph",
     "InstrType",
+    "intern_instruction",
+    "InternTable",
+    "get_intern_table",
+    "defer",
+    "DeferredInstruction",
+    "PackedDigitalInstruction",
+    "pack_digital",
+    "pack_instruction",
+    "stack_digital",
+    "word_dtype",
+    "MAX_PACKED_CHANNELS",
+    "encode_instruction",
+    "decode_instruction",
+    "ENCODING_VERSION",
 ]
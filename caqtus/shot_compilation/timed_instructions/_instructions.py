@@ -3,8 +3,9 @@ from __future__ import annotations
 import abc
 import bisect
 import collections
+import hashlib
 import itertools
-from collections.abc import Sequence
+from collections.abc import Sequence, Iterator
 from typing import (
     NewType,
     TypeVar,
@@ -22,6 +23,7 @@ from numpy.typing import DTypeLike
 Length = NewType("Length", int)
 Width = NewType("Width", int)
 Depth = NewType("Depth", int)
+NodeCount = NewType("NodeCount", int)
 
 _S = TypeVar("_S", covariant=True, bound=DTypeLike)
 
@@ -46,8 +48,17 @@ class TimedInstruction[T: np.generic](abc.ABC):
     Instructions can be concatenated in time using the `+` operator or the
     :func:`concatenate`.
     An instruction can be repeated using the `*` operator with an integer.
+
+    Instructions are hashable.
+    Their structural hash is computed once on first use and cached, so comparing two
+    instructions with different hashes is O(1).
+    Use :func:`intern_instruction` to obtain a canonical object shared by all equal
+    instructions, for which equality reduces to an identity check.
     """
 
+    # Cached structural hash, set to None by subclasses until it is computed.
+    _hash: Optional[int]
+
     @abc.abstractmethod
     def __len__(self) -> Length:
         """Returns the length of the instruction in clock cycles."""
@@ -126,16 +137,116 @@ class TimedInstruction[T: np.generic](abc.ABC):
 
         raise NotImplementedError
 
+    @property
+    @abc.abstractmethod
+    def node_count(self) -> NodeCount:
+        """Returns the number of nodes in the instruction tree.
+
+        Shared sub-instructions are counted once per occurrence.
+        """
+
+        raise NotImplementedError
+
+    @property
+    @abc.abstractmethod
+    def nbytes(self) -> int:
+        """Returns the number of bytes used to store the values of the instruction.
+
+        This is the memory footprint of the leaves of the instruction tree, not the
+        number of bytes of the flattened pattern.
+        """
+
+        raise NotImplementedError
+
     @abc.abstractmethod
     def to_pattern(self) -> Pattern[T]:
         """Returns a flattened pattern of the instruction."""
 
         raise NotImplementedError
 
+    def copy_to(self, out: Array1D[T], start: int = 0) -> None:
+        """Writes the values of the instruction into a buffer.
+
+        The values of `self[start:start + len(out)]` are written into `out`, without
+        building the flattened pattern of the instruction.
+
+        Args:
+            out: The 1D array in which to write the values.
+                Its dtype must be the same as the dtype of the instruction.
+            start: The index of the first value to write.
+
+        Raises:
+            ValueError: If the buffer has the wrong dtype or shape, or if it extends
+                past the end of the instruction.
+        """
+
+        if out.ndim != 1:
+            raise ValueError("Buffer must be one-dimensional")
+        if out.dtype != self.dtype:
+            raise ValueError(f"Buffer has dtype {out.dtype}, expected {self.dtype}")
+        if not 0 <= start <= start + len(out) <= len(self):
+            raise ValueError(
+                f"Can't write {len(out)} values starting at {start} for an "
+                f"instruction of length {len(self)}"
+            )
+        self._copy_to(out, start)
+
+    @abc.abstractmethod
+    def _copy_to(self, out: Array1D[T], start: int) -> None:
+        # Same as copy_to, but the arguments are assumed to be valid.
+        raise NotImplementedError
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[Array1D[T]]:
+        """Yields the values of the instruction by chunks of fixed size.
+
+        This allows to process the values of a long instruction with bounded memory
+        usage.
+
+        Args:
+            chunk_size: The number of values in each chunk.
+                The last chunk is shorter if the length of the instruction is not a
+                multiple of the chunk size.
+
+        Returns:
+            An iterator over newly allocated arrays with the dtype of the instruction.
+        """
+
+        if chunk_size <= 0:
+            raise ValueError("Chunk size must be strictly positive")
+        for start in range(0, len(self), chunk_size):
+            chunk = np.empty(min(chunk_size, len(self) - start), dtype=self.dtype)
+            self._copy_to(chunk, start)
+            yield chunk
+
     @abc.abstractmethod
     def __eq__(self, other):
         raise NotImplementedError
 
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = self._compute_hash()
+        return self._hash
+
+    def _has_different_hash(self, other: TimedInstruction) -> bool:
+        # Only the hashes that are already known are compared, because computing the
+        # hash of a large instruction costs more than comparing its values.
+        return (
+            self._hash is not None
+            and other._hash is not None
+            and self._hash != other._hash
+        )
+
+    @abc.abstractmethod
+    def _compute_hash(self) -> int:
+        """Computes the structural hash of the instruction.
+
+        The hash must only depend on the dtype and values of the instruction, and not
+        on the process in which it is computed, since it is transferred along with the
+        instruction when pickled.
+        """
+
+        raise NotImplementedError
+
     def __add__(self, other) -> TimedInstruction[T]:
         if isinstance(other, TimedInstruction):
             if len(self) == 0:
@@ -216,7 +327,7 @@ class Pattern[T: np.generic](TimedInstruction[T]):
     # All values inside the pattern MUST be finite (no NaN, no inf).
     # This is ensured by public methods, but not necessarily by all private methods.
 
-    __slots__ = ("_pattern", "_length")
+    __slots__ = ("_pattern", "_length", "_hash")
 
     def __init__(self, pattern: npt.ArrayLike, dtype: Optional[np.dtype[T]] = None):
         self._pattern = numpy.array(pattern, dtype=dtype)
@@ -224,6 +335,7 @@ class Pattern[T: np.generic](TimedInstruction[T]):
             raise ValueError("Pattern must contain only finite values")
         self._pattern.setflags(write=False)
         self._length = Length(len(self._pattern))
+        self._hash = None
 
     def __repr__(self):
         if np.issubdtype(self.dtype, np.void):
@@ -247,20 +359,39 @@ class Pattern[T: np.generic](TimedInstruction[T]):
         if isinstance(item, int):
             return self._pattern[item]
         elif isinstance(item, slice):
-            return Pattern.create_without_copy(self._pattern[item])
+            return Pattern.create_without_copy(self._pattern[item], check_finite=False)
         elif isinstance(item, str):
-            return Pattern.create_without_copy(self._pattern[item])
+            return Pattern.create_without_copy(self._pattern[item], check_finite=False)
         else:
             assert_never(item)
 
     @classmethod
-    def create_without_copy[S: np.generic](cls, array: Array1D[S]) -> Pattern[S]:
-        if not _has_only_finite_values(array):
+    def create_without_copy[
+        S: np.generic
+    ](cls, array: Array1D[S], check_finite: bool = True) -> Pattern[S]:
+        """Creates a pattern that uses the given array as its values.
+
+        The array is set as read-only, and must not be modified afterward.
+
+        Args:
+            array: The values of the pattern.
+            check_finite: Whether to check that the array only contains finite values.
+                This should only be set to False when the values are known to be
+                finite, for example when they are obtained from another pattern,
+                to avoid scanning the array again.
+
+        Raises:
+            ValueError: If check_finite is True and the array contains non-finite
+                values.
+        """
+
+        if check_finite and not _has_only_finite_values(array):
             raise ValueError("Pattern must contain only finite values")
         array.setflags(write=False)
         pattern = cls.__new__(cls)
         pattern._pattern = array
         pattern._length = Length(len(array))
+        pattern._hash = None
         return pattern  # type: ignore
 
     @property
@@ -268,7 +399,11 @@ class Pattern[T: np.generic](TimedInstruction[T]):
         return self._pattern.dtype
 
     def as_type[S: np.generic](self, dtype: numpy.dtype[S]) -> Pattern[S]:
-        return Pattern.create_without_copy(self._pattern.astype(dtype, copy=False))
+        # Values can only become non-finite if they are converted to a different type,
+        # for example when a float64 overflows in float32.
+        return Pattern.create_without_copy(
+            self._pattern.astype(dtype, copy=False), check_finite=dtype != self.dtype
+        )
 
     def __len__(self) -> Length:
         return self._length
@@ -277,15 +412,40 @@ class Pattern[T: np.generic](TimedInstruction[T]):
     def depth(self) -> Depth:
         return Depth(0)
 
+    @property
+    def node_count(self) -> NodeCount:
+        return NodeCount(1)
+
+    @property
+    def nbytes(self) -> int:
+        return self._pattern.nbytes
+
     def to_pattern(self) -> Pattern[T]:
         return self
 
+    def _copy_to(self, out: Array1D[T], start: int) -> None:
+        out[:] = self._pattern[start : start + len(out)]
+
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, Pattern):
-            return numpy.array_equal(self._pattern, other._pattern)
+            return (
+                self._length == other._length
+                and not self._has_different_hash(other)
+                and numpy.array_equal(self._pattern, other._pattern)
+            )
         else:
             return NotImplemented
 
+    # Defining __eq__ removes the inherited __hash__, so we restore it explicitly.
+    __hash__ = TimedInstruction.__hash__
+
+    def _compute_hash(self) -> int:
+        digest = _new_digest()
+        _update_digest(digest, self._pattern)
+        return _digest_to_int(digest)
+
     def apply[
         S: np.generic
     ](self, func: Callable[[Array1D[T]], Array1D[S]]) -> Pattern[S]:
@@ -294,12 +454,25 @@ class Pattern[T: np.generic](TimedInstruction[T]):
             raise ValueError("Function must return an array of the same length")
         if not _has_only_finite_values(result):
             raise ValueError("Function must return an array with only finite values")
-        return Pattern.create_without_copy(result)
+        return Pattern.create_without_copy(result, check_finite=False)
 
     @property
     def array(self) -> Array1D[T]:
         return self._pattern
 
+    def __reduce_ex__(self, protocol):
+        # The array is made contiguous so that it can be pickled out-of-band with
+        # protocol 5, for example when sending instructions to another process.
+        return _unpickle_pattern, (numpy.ascontiguousarray(self._pattern), self._hash)
+
+
+def _unpickle_pattern[
+    T: np.generic
+](array: Array1D[T], hash_: Optional[int]) -> Pattern[T]:
+    pattern = Pattern.create_without_copy(array, check_finite=False)
+    pattern._hash = hash_
+    return pattern
+
 
 def _has_only_finite_values[T: np.generic](array: Array1D[T]) -> bool:
     if np.issubdtype(array.dtype, np.floating):
@@ -308,6 +481,56 @@ def _has_only_finite_values[T: np.generic](array: Array1D[T]) -> bool:
         return True
 
 
+# Number of elements hashed at once, to avoid copying large arrays when hashing them.
+_HASH_CHUNK_SIZE = 2**16
+
+
+def _new_digest() -> hashlib.blake2b:
+    # We use a cryptographic digest instead of the builtin hash of bytes, because the
+    # latter is salted per process and the hash is pickled with the instruction.
+    return hashlib.blake2b(digest_size=8)
+
+
+def _update_digest(digest: hashlib.blake2b, array: np.ndarray) -> None:
+    """Feeds the values of an array to a digest.
+
+    Arrays that compare equal element-wise feed the same bytes, even if they have
+    different dtypes.
+    For this reason, numeric values are fed as float64 and -0.0 is fed as 0.0.
+    The values are converted by chunks, so that hashing a large array doesn't allocate
+    a full copy of it.
+    """
+
+    if array.dtype.names is not None:
+        for name in array.dtype.names:
+            digest.update(name.encode())
+            _update_digest(digest, array[name])
+        return
+
+    array = array.reshape(-1)
+    is_numeric = np.issubdtype(array.dtype, np.number) or array.dtype == np.bool_
+    for start in range(0, len(array), _HASH_CHUNK_SIZE):
+        chunk = array[start : start + _HASH_CHUNK_SIZE]
+        if chunk.dtype == np.float64:
+            # -0.0 + 0.0 == 0.0, so this replaces negative zeros by positive zeros.
+            chunk = chunk + 0.0
+        elif is_numeric:
+            chunk = chunk.astype(np.float64)
+            chunk += 0.0
+        digest.update(np.ascontiguousarray(chunk).tobytes())
+
+
+def _digest_to_int(digest: hashlib.blake2b) -> int:
+    return int.from_bytes(digest.digest(), "little", signed=True)
+
+
+# Integer tags used to distinguish node types when combining hashes of children.
+# They are plain integers because hashes of classes or strings are not stable across
+# processes.
+_CONCATENATED_HASH_TAG = 1
+_REPEATED_HASH_TAG = 2
+
+
 class Concatenated[T: np.generic](TimedInstruction[T]):
     """Represents an immutable concatenation of instructions.
 
@@ -315,7 +538,15 @@ class Concatenated[T: np.generic](TimedInstruction[T]):
     instructions. Do not use the class constructor directly.
     """
 
-    __slots__ = ("_instructions", "_instruction_bounds", "_length")
+    __slots__ = (
+        "_instructions",
+        "_instruction_bounds",
+        "_length",
+        "_depth",
+        "_node_count",
+        "_nbytes",
+        "_hash",
+    )
     __match_args__ = ("instructions",)
 
     @property
@@ -352,6 +583,14 @@ class Concatenated[T: np.generic](TimedInstruction[T]):
             itertools.accumulate(len(instruction) for instruction in self._instructions)
         )
         self._length = Length(self._instruction_bounds[-1])
+        self._depth = Depth(
+            max(instruction.depth for instruction in self._instructions) + 1
+        )
+        self._node_count = NodeCount(
+            sum(instruction.node_count for instruction in self._instructions) + 1
+        )
+        self._nbytes = sum(instruction.nbytes for instruction in self._instructions)
+        self._hash = None
 
     def __repr__(self):
         inner = ", ".join(repr(instruction) for instruction in self._instructions)
@@ -426,7 +665,15 @@ class Concatenated[T: np.generic](TimedInstruction[T]):
 
     @property
     def depth(self) -> Depth:
-        return Depth(max(instruction.depth for instruction in self._instructions) + 1)
+        return self._depth
+
+    @property
+    def node_count(self) -> NodeCount:
+        return self._node_count
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
 
     def to_pattern(self) -> Pattern[T]:
         # noinspection PyProtectedMember
@@ -434,14 +681,47 @@ class Concatenated[T: np.generic](TimedInstruction[T]):
             [instruction.to_pattern()._pattern for instruction in self._instructions],
             casting="safe",
         )
-        return Pattern.create_without_copy(new_array)
+        return Pattern.create_without_copy(new_array, check_finite=False)
+
+    def _copy_to(self, out: Array1D[T], start: int) -> None:
+        stop = start + len(out)
+        instruction_index = bisect.bisect_right(self._instruction_bounds, start) - 1
+        position = start
+        while position < stop:
+            instruction_start = self._instruction_bounds[instruction_index]
+            instruction_stop = min(
+                self._instruction_bounds[instruction_index + 1], stop
+            )
+            self._instructions[instruction_index]._copy_to(
+                out[position - start : instruction_stop - start],
+                position - instruction_start,
+            )
+            position = instruction_stop
+            instruction_index += 1
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, Concatenated):
-            return self._instructions == other._instructions
+            return (
+                self._instruction_bounds == other._instruction_bounds
+                and not self._has_different_hash(other)
+                and self._instructions == other._instructions
+            )
         else:
             return NotImplemented
 
+    # Defining __eq__ removes the inherited __hash__, so we restore it explicitly.
+    __hash__ = TimedInstruction.__hash__
+
+    def _compute_hash(self) -> int:
+        return hash(
+            (
+                _CONCATENATED_HASH_TAG,
+                *(hash(instruction) for instruction in self._instructions),
+            )
+        )
+
     def apply[
         S: np.generic
     ](self, func: Callable[[Array1D[T]], Array1D[S]]) -> Concatenated[S]:
@@ -461,7 +741,14 @@ class Repeated[T: np.generic](TimedInstruction[T]):
         repetitions: The number of times to repeat the instruction.
     """
 
-    __slots__ = ("_repetitions", "_instruction", "_length")
+    __slots__ = (
+        "_repetitions",
+        "_instruction",
+        "_length",
+        "_depth",
+        "_node_count",
+        "_hash",
+    )
 
     @property
     def repetitions(self) -> int:
@@ -486,6 +773,9 @@ class Repeated[T: np.generic](TimedInstruction[T]):
         self._repetitions = repetitions
         self._instruction = instruction
         self._length = Length(len(self._instruction) * self._repetitions)
+        self._depth = Depth(self._instruction.depth + 1)
+        self._node_count = NodeCount(self._instruction.node_count + 1)
+        self._hash = None
 
     def __repr__(self):
         return (
@@ -554,23 +844,58 @@ class Repeated[T: np.generic](TimedInstruction[T]):
 
     @property
     def depth(self) -> Depth:
-        return Depth(self._instruction.depth + 1)
+        return self._depth
+
+    @property
+    def node_count(self) -> NodeCount:
+        return self._node_count
+
+    @property
+    def nbytes(self) -> int:
+        return self._instruction.nbytes
 
     def to_pattern(self) -> Pattern[T]:
         inner_pattern = self._instruction.to_pattern()
         # noinspection PyProtectedMember
         new_array = numpy.tile(inner_pattern._pattern, self._repetitions)
-        return Pattern.create_without_copy(new_array)
+        return Pattern.create_without_copy(new_array, check_finite=False)
+
+    def _copy_to(self, out: Array1D[T], start: int) -> None:
+        block_length = len(self._instruction)
+        offset = start % block_length
+
+        # We write the first period explicitly, and then fill the rest of the buffer
+        # by copying the already written values, doubling their size at each step.
+        first_period = min(block_length, len(out))
+        head = min(block_length - offset, first_period)
+        self._instruction._copy_to(out[:head], offset)
+        if head < first_period:
+            self._instruction._copy_to(out[head:first_period], 0)
+
+        filled = first_period
+        while filled < len(out):
+            count = min(filled, len(out) - filled)
+            out[filled : filled + count] = out[:count]
+            filled += count
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, Repeated):
             return (
                 self._repetitions == other._repetitions
+                and not self._has_different_hash(other)
                 and self._instruction == other._instruction
             )
         else:
             return NotImplemented
 
+    # Defining __eq__ removes the inherited __hash__, so we restore it explicitly.
+    __hash__ = TimedInstruction.__hash__
+
+    def _compute_hash(self) -> int:
+        return hash((_REPEATED_HASH_TAG, self._repetitions, hash(self._instruction)))
+
     def apply[
         S: np.generic
     ](self, func: Callable[[Array1D[T]], Array1D[S]]) -> Repeated[S]:
@@ -652,8 +977,10 @@ def _concatenate[
         instruction.dtype == instructions[0].dtype for instruction in instructions
     )
 
+    from ._piecewise_linear import merge_linear_runs
+
     instruction_deque = collections.deque[TimedInstruction[T]](
-        _break_concatenations(instructions)
+        merge_linear_runs(_break_concatenations(instructions))
     )
 
     useful_instructions: list[TimedInstruction[T]] = []
@@ -671,11 +998,12 @@ def _concatenate[
                 useful_instructions.append(concatenated_patterns[0])
             else:
                 useful_instructions.append(
-                    Pattern(
+                    Pattern.create_without_copy(
                         numpy.concatenate(
                             [pattern.array for pattern in concatenated_patterns],
                             casting="safe",
-                        )
+                        ),
+                        check_finite=False,
                     )
                 )
         else:
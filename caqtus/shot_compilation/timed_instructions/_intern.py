@@ -0,0 +1,166 @@
+import functools
+import weakref
+
+import numpy as np
+
+from ._instructions import TimedInstruction, Pattern, Concatenated, Repeated
+from ._piecewise_linear import PiecewiseLinear
+from ._ramp import Ramp
+
+
+class InternTable:
+    """Keeps a canonical object for each distinct instruction structure.
+
+    The table only holds weak references to the canonical instructions, so an
+    instruction is removed from the table once it is not used anymore.
+    """
+
+    def __init__(self) -> None:
+        self._canonical = weakref.WeakValueDictionary[
+            tuple[np.dtype, int], TimedInstruction
+        ]()
+        self._hits = 0
+        self._misses = 0
+
+    def intern[
+        T: np.generic
+    ](self, instruction: TimedInstruction[T]) -> TimedInstruction[T]:
+        """Returns the canonical object equal to the given instruction.
+
+        Sub-instructions are interned recursively, so equal sub-instructions of
+        different trees end up being the same object.
+        """
+
+        return _intern(instruction, self)
+
+    def _get_canonical[
+        T: np.generic
+    ](self, instruction: TimedInstruction[T]) -> TimedInstruction[T]:
+        # Instructions with different dtypes can compare equal, but they are not
+        # interchangeable, so the dtype is part of the key.
+        key = (instruction.dtype, hash(instruction))
+        canonical = self._canonical.get(key)
+        if canonical is None:
+            self._canonical[key] = instruction
+            self._misses += 1
+            return instruction
+        # The children of both instructions are already canonical at this point, so
+        # the equality check below is shallow.
+        if canonical == instruction:
+            self._hits += 1
+            return canonical  # type: ignore[reportReturnType]
+        # Hash collision between two different instructions.
+        # This is extremely unlikely, and we just don't intern the new instruction.
+        self._misses += 1
+        return instruction
+
+    @property
+    def hits(self) -> int:
+        """The number of times an existing canonical instruction was returned."""
+
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """The number of times an instruction was not found in the table."""
+
+        return self._misses
+
+    def __len__(self) -> int:
+        return len(self._canonical)
+
+    def clear(self) -> None:
+        """Removes all instructions from the table and resets the counters."""
+
+        self._canonical.clear()
+        self._hits = 0
+        self._misses = 0
+
+
+_default_table = InternTable()
+
+
+def intern_instruction[
+    T: np.generic
+](instruction: TimedInstruction[T]) -> TimedInstruction[T]:
+    """Returns a canonical instruction equal to the given one.
+
+    All equal instructions interned in the same process are mapped to the same object,
+    and so are their equal sub-instructions.
+    This makes equality checks between interned instructions O(1) and reduces memory
+    usage when the same sub-instructions appear in several places, for example across
+    channels or across shots.
+
+    Instructions are immutable, so the returned object can be used anywhere in place of
+    the original instruction.
+
+    Leaves with values that take more than :data:`MAX_INTERNED_LEAF_BYTES` are kept
+    as they are, and so are the instructions that contain them, while their other
+    sub-instructions are still interned.
+    """
+
+    return _default_table.intern(instruction)
+
+
+def get_intern_table() -> InternTable:
+    """Returns the process-wide table used by :func:`intern_instruction`."""
+
+    return _default_table
+
+
+# Leaves larger than this are not interned, because hashing their values costs about as
+# much as compiling them, and dense leaves are rarely equal between channels or shots.
+MAX_INTERNED_LEAF_BYTES = 4096
+
+
+def _intern(instruction: TimedInstruction, table: InternTable) -> TimedInstruction:
+    return _intern_tree(instruction, table)[0]
+
+
+# The functions below return the interned instruction and whether it is canonical.
+# An instruction that contains a leaf that was not interned is not interned either,
+# since computing its hash would require hashing the leaf.
+@functools.singledispatch
+def _intern_tree(
+    instruction: TimedInstruction, table: InternTable
+) -> tuple[TimedInstruction, bool]:
+    raise NotImplementedError(f"Cannot intern {type(instruction)}")
+
+
+@_intern_tree.register(Pattern)
+@_intern_tree.register(Ramp)
+@_intern_tree.register(PiecewiseLinear)
+def _intern_leaf(
+    instruction: TimedInstruction, table: InternTable
+) -> tuple[TimedInstruction, bool]:
+    if instruction.nbytes > MAX_INTERNED_LEAF_BYTES:
+        return instruction, False
+    return table._get_canonical(instruction), True
+
+
+@_intern_tree.register
+def _intern_concatenated(
+    instruction: Concatenated, table: InternTable
+) -> tuple[TimedInstruction, bool]:
+    results = [_intern_tree(child, table) for child in instruction.instructions]
+    children = tuple(child for child, _ in results)
+    if any(
+        new is not old
+        for new, old in zip(children, instruction.instructions, strict=True)
+    ):
+        instruction = Concatenated(*children)
+    if not all(canonical for _, canonical in results):
+        return instruction, False
+    return table._get_canonical(instruction), True
+
+
+@_intern_tree.register
+def _intern_repeated(
+    instruction: Repeated, table: InternTable
+) -> tuple[TimedInstruction, bool]:
+    child, canonical = _intern_tree(instruction.instruction, table)
+    if child is not instruction.instruction:
+        instruction = Repeated(instruction.repetitions, child)
+    if not canonical:
+        return instruction, False
+    return table._get_canonical(instruction), True
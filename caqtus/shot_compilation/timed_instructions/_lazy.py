@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import abc
+from collections.abc import Callable, Sequence
+from typing import SupportsFloat
+
+import attrs
+import numpy as np
+
+from ._instructions import (
+    TimedInstruction,
+    Pattern,
+    Concatenated,
+    Repeated,
+    Array1D,
+    _has_only_finite_values,
+)
+from ._piecewise_linear import PiecewiseLinear
+from ._ramp import Ramp, create_ramp
+
+# Number of elements processed at once when evaluating a chain of operations on a leaf.
+# Intermediate results have this size, so that they stay in cache and don't need to be
+# allocated for the full leaf.
+_CHUNK_SIZE = 2**14
+
+
+def defer[T: np.generic](instruction: TimedInstruction[T]) -> DeferredInstruction[T]:
+    """Starts recording element-wise operations on an instruction.
+
+    The operations recorded on the returned object are not applied immediately.
+    They are fused together and applied in a single pass over each leaf of the
+    instruction when :meth:`DeferredInstruction.evaluate` is called.
+
+    Example:
+        .. code-block:: python
+
+            result = defer(instruction).multiply(2.0).add(1.0).as_type(dtype).evaluate()
+    """
+
+    return DeferredInstruction(instruction, ())
+
+
+@attrs.frozen
+class DeferredInstruction[T: np.generic]:
+    """An instruction with a chain of element-wise operations pending.
+
+    Use :func:`defer` to create an instance of this class.
+
+    Ramps and piecewise linear instructions are kept as such as long as the operations
+    are affine maps and conversions to floating point types.
+    Other operations are evaluated on their values.
+    """
+
+    instruction: TimedInstruction
+    operations: tuple[_Operation, ...]
+
+    def __len__(self) -> int:
+        return len(self.instruction)
+
+    def apply[
+        S: np.generic
+    ](self, func: Callable[[Array1D], Array1D[S]]) -> DeferredInstruction[S]:
+        """Records an element-wise function to apply to the values.
+
+        See :meth:`TimedInstruction.apply` for the requirements on the function.
+        The function will be called on chunks of the values, and not on the full
+        values at once.
+        """
+
+        return self._then(_Apply(func))
+
+    def as_type[S: np.generic](self, dtype: np.dtype[S]) -> DeferredInstruction[S]:
+        """Records a conversion of the values to the given dtype."""
+
+        return self._then(_AsType(np.dtype(dtype)))
+
+    def negate(self) -> DeferredInstruction[T]:
+        """Records the negation of the values."""
+
+        return self._then(_Affine(scale=-1.0, offset=0.0))
+
+    def add(self, value: SupportsFloat) -> DeferredInstruction[T]:
+        """Records the addition of a constant to the values."""
+
+        return self._then(_Affine(scale=1.0, offset=float(value)))
+
+    def multiply(self, value: SupportsFloat) -> DeferredInstruction[T]:
+        """Records the multiplication of the values by a constant."""
+
+        return self._then(_Affine(scale=float(value), offset=0.0))
+
+    def _then(self, operation: _Operation) -> DeferredInstruction:
+        operations = self.operations
+        if (
+            operations
+            and isinstance(operation, _Affine)
+            and isinstance(operations[-1], _Affine)
+        ):
+            # Consecutive affine maps are composed into a single one.
+            operations = operations[:-1] + (operations[-1].then(operation),)
+        else:
+            operations = operations + (operation,)
+        return DeferredInstruction(self.instruction, operations)
+
+    def evaluate(self) -> TimedInstruction:
+        """Applies the recorded operations and returns the resulting instruction.
+
+        The instruction tree keeps the same structure.
+        Each distinct leaf of the tree is evaluated only once, even if it is shared in
+        several places.
+
+        Raises:
+            ValueError: If the operations produce non-finite values, or if a function
+                doesn't return an array of the same length as its input.
+        """
+
+        if not self.operations:
+            return self.instruction
+        return _Evaluator(self.operations).evaluate(self.instruction)
+
+
+class _Operation(abc.ABC):
+    @abc.abstractmethod
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+@attrs.frozen
+class _Apply(_Operation):
+    func: Callable[[np.ndarray], np.ndarray]
+
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        result = self.func(values)
+        if len(result) != len(values):
+            raise ValueError("Function must return an array of the same length")
+        return result
+
+
+@attrs.frozen
+class _AsType(_Operation):
+    dtype: np.dtype
+
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        return values.astype(self.dtype, copy=False)
+
+
+@attrs.frozen
+class _Affine(_Operation):
+    """Maps x to scale * x + offset."""
+
+    scale: float
+    offset: float
+
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        result = values * self.scale if self.scale != 1.0 else values
+        return result + self.offset if self.offset != 0.0 else result
+
+    def then(self, other: _Affine) -> _Affine:
+        return _Affine(
+            scale=other.scale * self.scale,
+            offset=other.scale * self.offset + other.offset,
+        )
+
+
+class _Evaluator:
+    def __init__(self, operations: Sequence[_Operation]):
+        self._operations = operations
+        # Results indexed by the id of the leaves, so that shared leaves are evaluated
+        # once.
+        # We keep a reference to the leaves to prevent their ids from being reused.
+        self._cache: dict[int, tuple[TimedInstruction, TimedInstruction]] = {}
+
+    def evaluate(self, instruction: TimedInstruction) -> TimedInstruction:
+        if isinstance(instruction, Concatenated):
+            return Concatenated(
+                *(self.evaluate(child) for child in instruction.instructions)
+            )
+        elif isinstance(instruction, Repeated):
+            return Repeated(
+                instruction.repetitions, self.evaluate(instruction.instruction)
+            )
+        cached = self._cache.get(id(instruction))
+        if cached is not None:
+            return cached[1]
+        result = self._evaluate_leaf(instruction)
+        self._cache[id(instruction)] = (instruction, result)
+        return result
+
+    def _evaluate_leaf(self, leaf: TimedInstruction) -> TimedInstruction:
+        if isinstance(leaf, (Ramp, PiecewiseLinear)) and leaf.dtype == np.float64:
+            linear = self._evaluate_linear_symbolically(leaf)
+            if linear is not None:
+                return linear
+
+        result_dtype = self._chain(np.empty(0, dtype=leaf.dtype)).dtype
+        result = np.empty(len(leaf), dtype=result_dtype)
+        buffer = np.empty(min(_CHUNK_SIZE, len(leaf)), dtype=leaf.dtype)
+        for start in range(0, len(leaf), _CHUNK_SIZE):
+            stop = min(start + _CHUNK_SIZE, len(leaf))
+            if isinstance(leaf, Pattern):
+                chunk = leaf.array[start:stop]
+            else:
+                chunk = buffer[: stop - start]
+                leaf.copy_to(chunk, start)
+            result[start:stop] = self._chain(chunk)
+
+        # The values of the leaf are known to be finite, and the conversions that
+        # could overflow are checked in the chain, so we only need to check the result
+        # once at the end if there are other operations.
+        if not self._only_conversions():
+            if not _has_only_finite_values(result):
+                raise ValueError("Operations must produce only finite values")
+        return Pattern.create_without_copy(result, check_finite=False)
+
+    def _only_conversions(self) -> bool:
+        return all(isinstance(operation, _AsType) for operation in self._operations)
+
+    def _chain(self, values: np.ndarray) -> np.ndarray:
+        for operation in self._operations:
+            previous_dtype = values.dtype
+            values = operation(values)
+            # A conversion to a narrower type can overflow, and converting the result
+            # back to a wider type would keep the infinite values.
+            if isinstance(operation, _AsType) and not np.can_cast(
+                previous_dtype, values.dtype, casting="safe"
+            ):
+                if not _has_only_finite_values(values):
+                    raise ValueError("Operations must produce only finite values")
+        return values
+
+    def _evaluate_linear_symbolically(
+        self, leaf: Ramp[np.float64] | PiecewiseLinear[np.float64]
+    ) -> TimedInstruction | None:
+        if isinstance(leaf, Ramp):
+            starts = np.array([leaf.start])
+            stops = np.array([leaf.stop])
+        else:
+            starts = leaf.starts
+            stops = leaf.stops
+        # A conversion to a structured type can only be applied at the end of the
+        # chain, since the other operations only act on scalar values.
+        final_dtype = None
+        for operation in self._operations:
+            if final_dtype is not None:
+                return None
+            if isinstance(operation, _Affine):
+                # We use the same computation as for the values of patterns.
+                starts = operation(starts)
+                stops = operation(stops)
+            elif isinstance(operation, _AsType) and np.issubdtype(
+                operation.dtype, np.floating
+            ):
+                starts = starts.astype(operation.dtype)
+                stops = stops.astype(operation.dtype)
+            elif isinstance(operation, _AsType) and Ramp.is_valid_dtype(
+                operation.dtype
+            ):
+                final_dtype = operation.dtype
+            else:
+                return None
+        if final_dtype is None:
+            final_dtype = starts.dtype
+        if isinstance(leaf, Ramp):
+            result = create_ramp(starts[0], stops[0], len(leaf))
+        else:
+            if not (_has_only_finite_values(starts) and _has_only_finite_values(stops)):
+                raise ValueError("Operations must produce only finite values")
+            result = PiecewiseLinear._create(leaf.bounds, starts, stops)
+        if final_dtype != result.dtype:
+            result = result.as_type(final_dtype)
+        return result
@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+import functools
+from collections.abc import Collection, Mapping, Sequence
+
+import attrs
+import numpy as np
+
+from ._instructions import TimedInstruction
+from ._lazy import defer
+from ._stack import combine_instructions, stack_instructions, NODE_BYTES
+from ._with_name import with_name
+
+MAX_PACKED_CHANNELS = 64
+"""The maximum number of digital channels that can share a packed word."""
+
+MIN_PACKED_CHANNELS = 9
+"""The minimum number of channels that :func:`stack_digital` stacks as packed words.
+
+With fewer channels, a word takes as much memory as one byte per channel.
+"""
+
+_WORD_DTYPES = (
+    np.dtype(np.uint8),
+    np.dtype(np.uint16),
+    np.dtype(np.uint32),
+    np.dtype(np.uint64),
+)
+
+
+def word_dtype(number_channels: int) -> np.dtype[np.unsignedinteger]:
+    """Returns the dtype of the words used to pack a given number of channels.
+
+    This is the smallest unsigned integer type with at least one bit per channel, so
+    that packed words never take more memory than one byte per channel.
+
+    Raises:
+        ValueError: If there are more than :data:`MAX_PACKED_CHANNELS` channels.
+    """
+
+    for dtype in _WORD_DTYPES:
+        if number_channels <= 8 * dtype.itemsize:
+            return dtype
+    raise ValueError(
+        f"Can't pack more than {MAX_PACKED_CHANNELS} channels, got {number_channels}"
+    )
+
+
+def _validate_channels(instance, attribute, channels: tuple[str, ...]) -> None:
+    if not channels:
+        raise ValueError("There must be at least one channel")
+    if len(channels) > MAX_PACKED_CHANNELS:
+        raise ValueError(
+            f"Can't pack more than {MAX_PACKED_CHANNELS} channels, got "
+            f"{len(channels)}"
+        )
+    if len(set(channels)) != len(channels):
+        raise ValueError(f"Channel names must be unique, got {channels}")
+
+
+def _validate_words(
+    instance: PackedDigitalInstruction, attribute, words: TimedInstruction
+) -> None:
+    expected = word_dtype(len(instance.channels))
+    if words.dtype != expected:
+        raise TypeError(
+            f"Packed words for {len(instance.channels)} channels must have dtype "
+            f"{expected}, got {words.dtype}"
+        )
+
+
+@attrs.frozen
+class PackedDigitalInstruction:
+    """Digital channels sharing a single word per time step.
+
+    Each boolean channel takes one byte per time step when stored in a
+    :class:`Pattern` or in a field of a structured instruction.
+    Here, the value of up to 64 channels is stored in the bits of a single unsigned
+    integer, with the dtype given by :func:`word_dtype`.
+
+    Use :func:`pack_digital` or :func:`pack_instruction` to create an instance of this
+    class.
+
+    Attributes:
+        channels: The names of the channels.
+            The value of the channel at index i is stored in the i-th least significant
+            bit of the words.
+        words: The packed values of the channels.
+    """
+
+    channels: tuple[str, ...] = attrs.field(
+        converter=tuple, validator=_validate_channels
+    )
+    words: TimedInstruction[np.unsignedinteger] = attrs.field(validator=_validate_words)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __getitem__(self, channel: str) -> TimedInstruction[np.bool_]:
+        """Returns the values of a single channel."""
+
+        bit = self._bit(channel)
+        return (
+            defer(self.words).apply(functools.partial(_extract_bit, bit=bit)).evaluate()
+        )
+
+    def unpack(self) -> TimedInstruction[np.void]:
+        """Returns the channels as a structured instruction with a bool field each.
+
+        The result has the same values as the result of :func:`stack_instructions` on
+        the individual channels, and the structure of the packed words.
+        """
+
+        dtype = np.dtype([(channel, np.bool_) for channel in self.channels])
+        return (
+            defer(self.words)
+            .apply(functools.partial(_unpack_words, dtype=dtype))
+            .evaluate()
+        )
+
+    def stack(self, other: PackedDigitalInstruction) -> PackedDigitalInstruction:
+        """Returns the channels of both instructions packed together.
+
+        The channels of `other` are placed after the channels of this instruction.
+
+        Raises:
+            ValueError: If the instructions have different lengths, if they have
+                channels in common or if there are too many channels to fit in a word.
+        """
+
+        channels = self.channels + other.channels
+        if len(channels) > MAX_PACKED_CHANNELS:
+            raise ValueError(
+                f"Can't pack more than {MAX_PACKED_CHANNELS} channels, got "
+                f"{len(channels)}"
+            )
+        # The words of the other instruction are shifted in the same pass that merges
+        # them, so that no intermediate instruction is created.
+        merge = functools.partial(
+            _merge_words, bits=len(self.channels), dtype=word_dtype(len(channels))
+        )
+        return PackedDigitalInstruction(
+            channels=channels,
+            words=combine_instructions(self.words, other.words, merge),
+        )
+
+    def __and__(self, other: PackedDigitalInstruction) -> PackedDigitalInstruction:
+        return self._combine(other, np.bitwise_and)
+
+    def __or__(self, other: PackedDigitalInstruction) -> PackedDigitalInstruction:
+        return self._combine(other, np.bitwise_or)
+
+    def __xor__(self, other: PackedDigitalInstruction) -> PackedDigitalInstruction:
+        return self._combine(other, np.bitwise_xor)
+
+    def __invert__(self) -> PackedDigitalInstruction:
+        # The unused bits of the words must stay cleared.
+        mask = _channels_mask(len(self.channels))
+        words = (
+            defer(self.words).apply(functools.partial(np.bitwise_xor, mask)).evaluate()
+        )
+        return PackedDigitalInstruction(channels=self.channels, words=words)
+
+    def _combine(self, other: PackedDigitalInstruction, op) -> PackedDigitalInstruction:
+        # Channels are combined by position, so both operands must have the same
+        # layout.
+        if self.channels != other.channels:
+            raise ValueError(
+                f"Can't combine instructions with different channels: "
+                f"{self.channels} and {other.channels}"
+            )
+        return PackedDigitalInstruction(
+            channels=self.channels,
+            words=combine_instructions(self.words, other.words, op),
+        )
+
+    def _bit(self, channel: str) -> int:
+        try:
+            return self.channels.index(channel)
+        except ValueError:
+            raise KeyError(channel) from None
+
+
+def pack_digital(
+    **channels: TimedInstruction[np.bool_],
+) -> PackedDigitalInstruction:
+    """Packs several boolean instructions into words.
+
+    Args:
+        channels: The instructions to pack by name.
+            There must be at least one and at most 64 instructions.
+            They must all have the same length and a boolean dtype.
+
+    Raises:
+        ValueError: If the instructions have different lengths, if there are no
+            instructions or too many of them.
+        TypeError: If an instruction doesn't have a boolean dtype.
+    """
+
+    if len(channels) > MAX_PACKED_CHANNELS:
+        raise ValueError(
+            f"Can't pack more than {MAX_PACKED_CHANNELS} channels, got {len(channels)}"
+        )
+    _check_digital_channels(channels)
+
+    packed = [
+        PackedDigitalInstruction(
+            channels=(name,),
+            words=defer(instruction).as_type(word_dtype(1)).evaluate(),
+        )
+        for name, instruction in channels.items()
+    ]
+    return _stack_packed(packed)
+
+
+def stack_digital(
+    **channels: TimedInstruction[np.bool_],
+) -> TimedInstruction[np.void]:
+    """Stacks boolean instructions into a structured instruction with a field each.
+
+    This gives the same values as :func:`stack_instructions` on the channels named with
+    :func:`with_name`.
+    When there are enough channels and their values take more memory than the nodes
+    of their instructions, the channels are merged with bitwise operations on packed
+    words, which is cheaper than merging their fields, and the words are unpacked once
+    at the end.
+
+    Raises:
+        ValueError: If the instructions have different lengths or if there are no
+            instructions.
+        TypeError: If an instruction doesn't have a boolean dtype.
+    """
+
+    _check_digital_channels(channels)
+
+    names = list(channels)
+    stacked = []
+    for start in range(0, len(names), MAX_PACKED_CHANNELS):
+        stop = start + MAX_PACKED_CHANNELS
+        group = {name: channels[name] for name in names[start:stop]}
+        if _is_worth_packing(group.values()):
+            stacked.append(pack_digital(**group).unpack())
+        else:
+            stacked.extend(
+                with_name(instruction, name) for name, instruction in group.items()
+            )
+    return stack_instructions(*stacked)
+
+
+def _check_digital_channels(channels: Mapping[str, TimedInstruction]) -> None:
+    if not channels:
+        raise ValueError("No instructions to pack")
+    for name, instruction in channels.items():
+        if instruction.dtype != np.bool_:
+            raise TypeError(
+                f"Instruction for channel '{name}' must have dtype bool, got "
+                f"{instruction.dtype}"
+            )
+    length = len(next(iter(channels.values())))
+    for instruction in channels.values():
+        if len(instruction) != length:
+            raise ValueError("Instructions must have the same length")
+
+
+def _is_worth_packing(instructions: Collection[TimedInstruction[np.bool_]]) -> bool:
+    # Merging packed words goes through the nodes of the instructions more times than
+    # stacking them directly, so it is only used when the values dominate.
+    if len(instructions) < MIN_PACKED_CHANNELS:
+        return False
+    nbytes = sum(instruction.nbytes for instruction in instructions)
+    node_count = sum(instruction.node_count for instruction in instructions)
+    return nbytes > NODE_BYTES * node_count
+
+
+def _stack_packed(
+    packed: Sequence[PackedDigitalInstruction],
+) -> PackedDigitalInstruction:
+    # Same divide-and-conquer approach as for stack_instructions.
+    if len(packed) == 1:
+        return packed[0]
+    middle = len(packed) // 2
+    return _stack_packed(packed[:middle]).stack(_stack_packed(packed[middle:]))
+
+
+def pack_instruction(
+    instruction: TimedInstruction[np.void],
+) -> PackedDigitalInstruction:
+    """Packs the boolean fields of a structured instruction into words.
+
+    This is the inverse of :meth:`PackedDigitalInstruction.unpack`.
+
+    Raises:
+        TypeError: If the instruction has a field that is not boolean.
+        ValueError: If the instruction has more than 64 fields.
+    """
+
+    names = instruction.dtype.names
+    if names is None:
+        raise TypeError("Instruction must have a structured dtype")
+    for name in names:
+        if instruction.dtype[name] != np.bool_:
+            raise TypeError(
+                f"Field '{name}' must have dtype bool, got {instruction.dtype[name]}"
+            )
+    dtype = word_dtype(len(names))
+    words = (
+        defer(instruction)
+        .apply(functools.partial(_pack_fields, names=names, dtype=dtype))
+        .evaluate()
+    )
+    return PackedDigitalInstruction(channels=names, words=words)
+
+
+def _channels_mask(number_channels: int) -> np.unsignedinteger:
+    dtype = word_dtype(number_channels)
+    return dtype.type((1 << number_channels) - 1)
+
+
+def _merge_words(
+    low: np.ndarray, high: np.ndarray, bits: int, dtype: np.dtype
+) -> np.ndarray:
+    words = high.astype(dtype)
+    np.left_shift(words, dtype.type(bits), out=words)
+    np.bitwise_or(words, low, out=words)
+    return words
+
+
+def _extract_bit(words: np.ndarray, bit: int) -> np.ndarray:
+    shifted = np.right_shift(words, words.dtype.type(bit))
+    return np.bitwise_and(shifted, words.dtype.type(1)).astype(np.bool_)
+
+
+def _pack_fields(
+    values: np.ndarray, names: Sequence[str], dtype: np.dtype
+) -> np.ndarray:
+    words = np.zeros(len(values), dtype=dtype)
+    for bit, name in enumerate(names):
+        field = values[name].astype(dtype)
+        np.left_shift(field, dtype.type(bit), out=field)
+        np.bitwise_or(words, field, out=words)
+    return words
+
+
+def _unpack_words(words: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    values = np.empty(len(words), dtype=dtype)
+    assert dtype.names is not None
+    for bit, name in enumerate(dtype.names):
+        values[name] = _extract_bit(words, bit)
+    return values
@@ -0,0 +1,618 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Callable, overload
+
+import numpy as np
+import numpy.typing as npt
+
+from caqtus.utils._no_public_constructor import NoPublicConstructor
+from ._instructions import (
+    TimedInstruction,
+    Array1D,
+    Depth,
+    Length,
+    NodeCount,
+    Pattern,
+    Concatenated,
+    Repeated,
+    _has_only_finite_values,
+    _new_digest,
+    _update_digest,
+    _digest_to_int,
+    _normalize_index,
+    _normalize_slice,
+    empty_like,
+    empty_with_dtype,
+    concatenate,
+)
+from ._ramp import Ramp
+from ._stack import (
+    stack,
+    stack_generic,
+    stack_concatenation_left,
+    stack_concatenation_right,
+    merge_dtypes,
+)
+
+
+def create_piecewise_linear(
+    starts: npt.ArrayLike, stops: npt.ArrayLike, lengths: npt.ArrayLike
+) -> TimedInstruction[np.float64]:
+    """Create an instruction made of consecutive linear segments.
+
+    The segment at index `i` takes the same values as
+    `create_ramp(starts[i], stops[i], lengths[i])`.
+
+    Args:
+        starts: The initial value of each segment.
+        stops: The final value of each segment.
+        lengths: The number of points in each segment.
+            Segments with a length of 0 are ignored.
+
+    Raises:
+        ValueError: If the arguments don't have the same length, if a value is not
+            finite or if a length is negative.
+    """
+
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1)
+    stops = np.asarray(stops, dtype=np.float64).reshape(-1)
+    lengths = np.asarray(lengths).reshape(-1)
+
+    if not (len(starts) == len(stops) == len(lengths)):
+        raise ValueError("Starts, stops and lengths must have the same length.")
+    if not np.issubdtype(lengths.dtype, np.integer) and len(lengths) > 0:
+        raise ValueError("Lengths must be integers.")
+    lengths = lengths.astype(np.int64)
+    if np.any(lengths < 0):
+        raise ValueError("Lengths must be non-negative.")
+    if not _has_only_finite_values(starts):
+        raise ValueError("Starts must be finite.")
+    if not _has_only_finite_values(stops):
+        raise ValueError("Stops must be finite.")
+
+    non_empty = lengths > 0
+    starts = starts[non_empty]
+    stops = stops[non_empty]
+    lengths = lengths[non_empty]
+    if len(lengths) == 0:
+        return empty_with_dtype(np.dtype(np.float64))
+    bounds = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    return PiecewiseLinear._create(bounds, starts, stops)
+
+
+class PiecewiseLinear[T: (np.floating, np.void)](
+    TimedInstruction[T], metaclass=NoPublicConstructor
+):
+    """Represents consecutive linear segments.
+
+    This instruction has the same values as a concatenation of :class:`Ramp`, but it
+    stores the segments in arrays instead of one Python object per segment.
+    This makes it cheaper to create, slice, pickle and transform instructions with
+    many ramps.
+
+    Use the :func:`create_piecewise_linear` function to create instances of this class
+    and don't use the constructor directly.
+
+    Like :class:`Ramp`, this class is generic over floating point types and structured
+    types with only floating point leaf fields.
+    """
+
+    __slots__ = ("_bounds", "_starts", "_stops", "_hash")
+
+    def __init__(
+        self, bounds: Array1D[np.int64], starts: Array1D[T], stops: Array1D[T]
+    ):
+        # The constructor is private. Use the :func:`create_piecewise_linear` function
+        # to create instances of this class.
+        self._bounds = bounds
+        self._starts = starts
+        self._stops = stops
+        self._hash = None
+
+        for array in (self._bounds, self._starts, self._stops):
+            array.setflags(write=False)
+
+        assert self._bounds.dtype == np.int64
+        assert len(self._bounds) == len(self._starts) + 1 == len(self._stops) + 1
+        assert len(self._starts) >= 1
+        assert self._bounds[0] == 0
+        assert np.all(np.diff(self._bounds) > 0)
+        assert Ramp.is_valid_dtype(self._starts.dtype)
+        assert self._starts.dtype == self._stops.dtype
+
+    @property
+    def bounds(self) -> Array1D[np.int64]:
+        """The indices at which each segment starts, followed by the total length."""
+
+        return self._bounds
+
+    @property
+    def starts(self) -> Array1D[T]:
+        """The initial value of each segment."""
+
+        return self._starts
+
+    @property
+    def stops(self) -> Array1D[T]:
+        """The final value of each segment."""
+
+        return self._stops
+
+    @property
+    def number_segments(self) -> int:
+        """The number of linear segments in the instruction."""
+
+        return len(self._starts)
+
+    @property
+    def dtype(self) -> np.dtype[T]:
+        return self._starts.dtype
+
+    def __len__(self) -> Length:
+        return Length(int(self._bounds[-1]))
+
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}(starts={self._starts.tolist()!r}, "
+            f"stops={self._stops.tolist()!r}, "
+            f"lengths={np.diff(self._bounds).tolist()!r})"
+        )
+
+    def __str__(self):
+        return " + ".join(
+            f"{start} -{length}-> {stop}"
+            for start, stop, length in zip(
+                self._starts, self._stops, np.diff(self._bounds), strict=True
+            )
+        )
+
+    @overload
+    def __getitem__(self, item: int) -> T: ...
+
+    @overload
+    def __getitem__(self, item: slice) -> TimedInstruction[T]: ...
+
+    @overload
+    def __getitem__(self, item: str) -> PiecewiseLinear: ...
+
+    def __getitem__(self, item):
+        if isinstance(item, int):
+            index = _normalize_index(item, len(self))
+            return self._values_at(np.array([index]))[0]
+        elif isinstance(item, slice):
+            return self._get_slice(item)
+        elif isinstance(item, str):
+            return self._get_channel(item)
+
+    def _get_slice(self, slice_: slice) -> TimedInstruction[T]:
+        start, stop, step = _normalize_slice(slice_, len(self))
+        if step != 1:
+            raise NotImplementedError
+        if stop <= start:
+            return empty_like(self)
+        first = np.searchsorted(self._bounds, start, side="right") - 1
+        last = np.searchsorted(self._bounds, stop, side="left")
+        bounds = self._bounds[first : last + 1].copy()
+        bounds[0] = start
+        bounds[-1] = stop
+        return self._resegment(bounds - start, offset=start)
+
+    def _get_channel(self, channel: str) -> PiecewiseLinear:
+        if not np.issubdtype(self.dtype, np.void):
+            raise ValueError("Can't get field if dtype is not a structured type.")
+        assert self.dtype.names is not None
+        if channel not in self.dtype.names:
+            raise ValueError(f"Channel {channel} not found in dtype {self.dtype}.")
+        starts: npt.NDArray[np.void] = self._starts  # pyright: ignore[reportAssignmentType]
+        stops: npt.NDArray[np.void] = self._stops  # pyright: ignore[reportAssignmentType]
+        return PiecewiseLinear._create(
+            self._bounds,
+            np.ascontiguousarray(starts[channel]),
+            np.ascontiguousarray(stops[channel]),
+        )
+
+    def _resegment(
+        self, bounds: Array1D[np.int64], offset: int = 0
+    ) -> PiecewiseLinear[T]:
+        """Splits the segments at new boundaries.
+
+        Args:
+            bounds: The boundaries of the new segments.
+                They must be relative to `offset`, and each new segment must be
+                contained in a single segment of this instruction.
+            offset: The index in this instruction of the first new boundary.
+        """
+
+        segment_starts = bounds[:-1] + offset
+        segment_stops = bounds[1:] + offset
+        source = np.searchsorted(self._bounds, segment_starts, side="right") - 1
+        starts = self._values_in_segments(source, segment_starts)
+        stops = self._values_in_segments(source, segment_stops)
+        # When a new segment ends at the end of its source segment, we keep the exact
+        # final value instead of recomputing it.
+        ends_at_source = segment_stops == self._bounds[source + 1]
+        stops[ends_at_source] = self._stops[source[ends_at_source]]
+        return PiecewiseLinear._create(bounds.astype(np.int64), starts, stops)
+
+    def as_type[S: np.generic](self, dtype: np.dtype[S]) -> TimedInstruction[S]:
+        starts = self._starts.astype(dtype)
+        stops = self._stops.astype(dtype)
+        if not Ramp.is_valid_dtype(starts.dtype):
+            raise TypeError("Can only convert to floating point or structured type.")
+        return PiecewiseLinear._create(self._bounds, starts, stops)
+
+    @property
+    def depth(self) -> Depth:
+        return Depth(1)
+
+    @property
+    def node_count(self) -> NodeCount:
+        return NodeCount(1)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bounds.nbytes + self._starts.nbytes + self._stops.nbytes
+
+    def to_pattern(self) -> Pattern[T]:
+        values = np.empty(len(self), dtype=self.dtype)
+        self._copy_to(values, 0)
+        return Pattern.create_without_copy(values, check_finite=False)
+
+    def _copy_to(self, out: Array1D[T], start: int) -> None:
+        stop = start + len(out)
+        if stop <= start:
+            return
+        # The indices are contiguous, so the values are computed per segment and
+        # repeated, instead of looking up the segment of each index.
+        first = np.searchsorted(self._bounds, start, side="right") - 1
+        last = np.searchsorted(self._bounds, stop, side="left")
+        bounds = self._bounds[first : last + 1]
+        covered = np.clip(bounds, start, stop)
+        counts = np.diff(covered)
+        local_indices = np.arange(start, stop) - np.repeat(bounds[:-1], counts)
+        out[:] = _repeated_linear_values(
+            self._starts[first:last],
+            self._stops[first:last],
+            np.diff(bounds),
+            counts,
+            local_indices,
+        )
+
+    def _values_at(self, indices: Array1D[np.int64]) -> Array1D[T]:
+        segments = np.searchsorted(self._bounds, indices, side="right") - 1
+        return self._values_in_segments(segments, indices)
+
+    def _values_in_segments(
+        self, segments: Array1D[np.intp], indices: Array1D[np.int64]
+    ) -> Array1D[T]:
+        # This computes the same values as Ramp for each segment.
+        local_indices = indices - self._bounds[segments]
+        lengths = np.diff(self._bounds)[segments]
+        return _linear_values(
+            self._starts[segments], self._stops[segments], lengths, local_indices
+        )
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, PiecewiseLinear):
+            return NotImplemented
+        return bool(
+            len(self) == len(other)
+            and not self._has_different_hash(other)
+            and np.array_equal(self._bounds, other._bounds)
+            and np.array_equal(self._starts, other._starts)
+            and np.array_equal(self._stops, other._stops)
+        )
+
+    # Defining __eq__ removes the inherited __hash__, so we restore it explicitly.
+    __hash__ = TimedInstruction.__hash__
+
+    def _compute_hash(self) -> int:
+        digest = _new_digest()
+        digest.update(b"piecewise-linear")
+        _update_digest(digest, self._bounds)
+        _update_digest(digest, self._starts)
+        _update_digest(digest, self._stops)
+        return _digest_to_int(digest)
+
+    def apply[
+        S: np.generic
+    ](self, func: Callable[[Array1D[T]], Array1D[S]]) -> TimedInstruction[S]:
+        """Map a function element-wise to the instruction.
+
+        Warning:
+            Since an arbitrary function will not necessarily preserve linear segments,
+            the values are explicitly computed before applying the function.
+            Use :func:`defer` to apply affine maps without computing the values.
+        """
+
+        return self.to_pattern().apply(func)
+
+    def to_ramps(self) -> TimedInstruction[T]:
+        """Returns the segments as a concatenation of :class:`Ramp`."""
+
+        return concatenate(
+            *(
+                Ramp._create(start, stop, int(length))
+                for start, stop, length in zip(
+                    self._starts, self._stops, np.diff(self._bounds), strict=True
+                )
+            )
+        )
+
+
+def _linear_values(
+    starts: np.ndarray, stops: np.ndarray, lengths: np.ndarray, indices: np.ndarray
+) -> np.ndarray:
+    if starts.dtype.names is not None:
+        values = np.empty(len(indices), dtype=starts.dtype)
+        for name in starts.dtype.names:
+            values[name] = _linear_values(starts[name], stops[name], lengths, indices)
+        return values
+    differences = stops - starts
+    steps = differences / lengths
+    values = indices * steps + starts
+    # Like np.linspace, the indices are scaled by the whole difference when the step
+    # underflows to zero.
+    underflow = (steps == 0) & (differences != 0)
+    if np.any(underflow):
+        fractions = indices[underflow] / lengths[underflow]
+        values[underflow] = fractions * differences[underflow] + starts[underflow]
+    return values
+
+
+def _repeated_linear_values(
+    starts: np.ndarray,
+    stops: np.ndarray,
+    lengths: np.ndarray,
+    counts: np.ndarray,
+    local_indices: np.ndarray,
+) -> np.ndarray:
+    # Same as _linear_values, with the segments repeated counts times.
+    if starts.dtype.names is not None:
+        values = np.empty(len(local_indices), dtype=starts.dtype)
+        for name in starts.dtype.names:
+            values[name] = _repeated_linear_values(
+                starts[name], stops[name], lengths, counts, local_indices
+            )
+        return values
+    differences = stops - starts
+    steps = differences / lengths
+    values = local_indices * np.repeat(steps, counts)
+    values += np.repeat(starts, counts)
+    underflow = (steps == 0) & (differences != 0)
+    if np.any(underflow):
+        repeated_underflow = np.repeat(underflow, counts)
+        values[repeated_underflow] = _linear_values(
+            np.repeat(starts[underflow], counts[underflow]),
+            np.repeat(stops[underflow], counts[underflow]),
+            np.repeat(lengths[underflow], counts[underflow]),
+            local_indices[repeated_underflow],
+        )
+    return values
+
+
+def concatenate_piecewise_linear[
+    T: (np.floating, np.void)
+](instructions: Sequence[PiecewiseLinear[T] | Ramp[T]]) -> PiecewiseLinear[T]:
+    """Merges consecutive linear instructions into a single one."""
+
+    bounds = [np.zeros(1, dtype=np.int64)]
+    starts = []
+    stops = []
+    offset = 0
+    for instruction in instructions:
+        if isinstance(instruction, Ramp):
+            bounds.append(np.array([offset + len(instruction)], dtype=np.int64))
+            starts.append(np.array([instruction.start], dtype=instruction.dtype))
+            stops.append(np.array([instruction.stop], dtype=instruction.dtype))
+        else:
+            bounds.append(instruction.bounds[1:] + offset)
+            starts.append(instruction.starts)
+            stops.append(instruction.stops)
+        offset += len(instruction)
+    return PiecewiseLinear._create(
+        np.concatenate(bounds), np.concatenate(starts), np.concatenate(stops)
+    )
+
+
+def merge_linear_runs(
+    instructions: Sequence[TimedInstruction],
+) -> list[TimedInstruction]:
+    """Merges runs of consecutive piecewise linear instructions and ramps.
+
+    Runs that only contain ramps are left untouched, so that concatenating ramps still
+    gives a concatenation of ramps.
+    """
+
+    if not any(
+        isinstance(instruction, PiecewiseLinear) for instruction in instructions
+    ):
+        return list(instructions)
+
+    result: list[TimedInstruction] = []
+    run: list[PiecewiseLinear | Ramp] = []
+    for instruction in [*instructions, None]:
+        if isinstance(instruction, (PiecewiseLinear, Ramp)):
+            run.append(instruction)
+            continue
+        if any(isinstance(linear, PiecewiseLinear) for linear in run):
+            result.append(concatenate_piecewise_linear(run))
+        else:
+            result.extend(run)
+        run = []
+        if instruction is not None:
+            result.append(instruction)
+    return result
+
+
+def _as_piecewise_linear(instruction: TimedInstruction) -> PiecewiseLinear | None:
+    """Converts an instruction with linear values to a piecewise linear instruction.
+
+    Returns:
+        The converted instruction, or None if the instruction is not made of ramps and
+        repeated constants, or if its segments would take more memory than its values.
+    """
+
+    if isinstance(instruction, PiecewiseLinear):
+        return instruction
+    if not Ramp.is_valid_dtype(instruction.dtype):
+        return None
+    if isinstance(instruction, Ramp):
+        return concatenate_piecewise_linear([instruction])
+    if isinstance(instruction, Repeated):
+        if len(instruction.instruction) == 1:
+            value = instruction.instruction.to_pattern().array
+            return PiecewiseLinear._create(
+                np.array([0, len(instruction)], dtype=np.int64), value, value.copy()
+            )
+        block = _as_piecewise_linear(instruction.instruction)
+        if block is None:
+            return None
+        number_segments = block.number_segments * instruction.repetitions
+        if _segments_nbytes(number_segments, block.dtype) > _values_nbytes(
+            instruction
+        ):
+            return None
+        return _tile_segments(block, instruction.repetitions)
+    if isinstance(instruction, Concatenated):
+        children = []
+        for child in instruction.instructions:
+            converted = _as_piecewise_linear(child)
+            if converted is None:
+                return None
+            children.append(converted)
+        return concatenate_piecewise_linear(children)
+    return None
+
+
+def _tile_segments[
+    T: (np.floating, np.void)
+](block: PiecewiseLinear[T], repetitions: int) -> PiecewiseLinear[T]:
+    offsets = np.arange(repetitions, dtype=np.int64) * len(block)
+    bounds = (block.bounds[1:] + offsets[:, np.newaxis]).reshape(-1)
+    return PiecewiseLinear._create(
+        np.concatenate([[0], bounds]).astype(np.int64),
+        np.tile(block.starts, repetitions),
+        np.tile(block.stops, repetitions),
+    )
+
+
+def _segments_nbytes(number_segments: int, dtype: np.dtype) -> int:
+    # Each segment has a bound, a start and a stop.
+    return number_segments * (np.dtype(np.int64).itemsize + 2 * dtype.itemsize)
+
+
+def _values_nbytes(instruction: TimedInstruction) -> int:
+    return len(instruction) * instruction.dtype.itemsize
+
+
+@stack.register(PiecewiseLinear, PiecewiseLinear)
+def _stack_piecewise_linear(a: PiecewiseLinear, b: PiecewiseLinear) -> TimedInstruction:
+    assert len(a) == len(b)
+
+    if np.array_equal(a.bounds, b.bounds):
+        a_segments, b_segments = a, b
+    else:
+        bounds = np.union1d(a.bounds, b.bounds)
+        a_segments = a._resegment(bounds)
+        b_segments = b._resegment(bounds)
+    return PiecewiseLinear._create(
+        a_segments.bounds,
+        _merge_arrays(a_segments.starts, b_segments.starts),
+        _merge_arrays(a_segments.stops, b_segments.stops),
+    )
+
+
+# When the other instruction is not linear, the piecewise linear instruction is split
+# along its structure.
+# The pieces are slices of the piecewise linear instruction, which only copy the
+# segments they contain, and consecutive pieces are merged again by concatenate.
+
+
+@stack.register(PiecewiseLinear, TimedInstruction)
+def _stack_piecewise_linear_left(
+    a: PiecewiseLinear, b: TimedInstruction
+) -> TimedInstruction:
+    converted = _as_piecewise_linear(b)
+    if converted is not None:
+        return stack(a, converted)
+    return stack_generic(a, b)
+
+
+@stack.register(TimedInstruction, PiecewiseLinear)
+def _stack_piecewise_linear_right(
+    a: TimedInstruction, b: PiecewiseLinear
+) -> TimedInstruction:
+    converted = _as_piecewise_linear(a)
+    if converted is not None:
+        return stack(converted, b)
+    return stack_generic(a, b)
+
+
+@stack.register(Concatenated, PiecewiseLinear)
+def _stack_concatenated_piecewise_linear(
+    a: Concatenated, b: PiecewiseLinear
+) -> TimedInstruction:
+    converted = _as_piecewise_linear(a)
+    if converted is not None:
+        return stack(converted, b)
+    return stack_concatenation_left(a, b)
+
+
+@stack.register(PiecewiseLinear, Concatenated)
+def _stack_piecewise_linear_concatenated(
+    a: PiecewiseLinear, b: Concatenated
+) -> TimedInstruction:
+    converted = _as_piecewise_linear(b)
+    if converted is not None:
+        return stack(a, converted)
+    return stack_concatenation_right(a, b)
+
+
+@stack.register(Ramp, Repeated)
+def _stack_ramp_repeated(a: Ramp, b: Repeated) -> TimedInstruction:
+    assert len(a) == len(b)
+
+    if len(b.instruction) == 1:
+        return stack(a, _as_ramp(b))
+    # A repeated block made of ramps and constants, like a pulse train, is converted
+    # to segments instead of splitting the ramp in one piece per block.
+    converted = _as_piecewise_linear(b)
+    if converted is not None:
+        return stack(concatenate_piecewise_linear([a]), converted)
+    return stack_generic(a, b)
+
+
+@stack.register(Repeated, Ramp)
+def _stack_repeated_ramp(a: Repeated, b: Ramp) -> TimedInstruction:
+    assert len(a) == len(b)
+
+    if len(a.instruction) == 1:
+        return stack(_as_ramp(a), b)
+    converted = _as_piecewise_linear(a)
+    if converted is not None:
+        return stack(converted, concatenate_piecewise_linear([b]))
+    return stack_generic(a, b)
+
+
+def _as_ramp(constant: Repeated) -> Ramp:
+    value = constant.instruction[0]
+    if not Ramp.is_valid_dtype(value.dtype):
+        raise TypeError(
+            f"Can't stack a ramp with an instruction having dtype {value.dtype}."
+        )
+    return Ramp._create(value, value, len(constant))
+
+
+def _merge_arrays(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    merged = np.empty(len(a), dtype=merge_dtypes(a.dtype, b.dtype))
+    assert a.dtype.names is not None
+    for name in a.dtype.names:
+        merged[name] = a[name]
+    assert b.dtype.names is not None
+    for name in b.dtype.names:
+        merged[name] = b[name]
+    return merged
@@ -8,6 +8,7 @@ from typing import (
 )
 
 import numpy as np
+import numpy.typing as npt
 
 from caqtus.utils._no_public_constructor import NoPublicConstructor
 from ._instructions import (
@@ -15,11 +16,14 @@ from ._instructions import (
     _normalize_slice,
     empty_with_dtype,
     Depth,
+    NodeCount,
+    _new_digest,
+    _update_digest,
+    _digest_to_int,
     Pattern,
     Array1D,
     _normalize_index,
     Length,
-    Repeated,
     empty_like,
 )
 from ._stack import stack, merge_dtypes
@@ -72,7 +76,7 @@ class Ramp[T: (np.floating, np.void)](
     point leaf fields.
     """
 
-    __slots__ = ("_start", "_stop", "_length")
+    __slots__ = ("_start", "_stop", "_length", "_hash")
 
     def __init__(self, start: T, stop: T, length: int) -> None:
         # The constructor is private. Use the :func:`ramp` function to create instances
@@ -80,6 +84,7 @@ class Ramp[T: (np.floating, np.void)](
         self._start: T = start
         self._stop: T = stop
         self._length = Length(length)
+        self._hash = None
 
         assert isinstance(self._start, np.generic)
         assert isinstance(self._stop, np.generic)
@@ -230,6 +235,14 @@ class Ramp[T: (np.floating, np.void)](
     def depth(self) -> Depth:
         return Depth(1)
 
+    @property
+    def node_count(self) -> NodeCount:
+        return NodeCount(1)
+
+    @property
+    def nbytes(self) -> int:
+        return self._start.nbytes + self._stop.nbytes
+
     def to_pattern(self) -> Pattern[T]:
         if np.issubdtype(self.dtype, np.void):
             assert self.dtype.names is not None
@@ -240,22 +253,53 @@ class Ramp[T: (np.floating, np.void)](
                 values[name] = np.linspace(
                     self._start[name], self._stop[name], len(self), endpoint=False
                 )
-            return Pattern.create_without_copy(values)
+            return Pattern.create_without_copy(values, check_finite=False)
         else:
             assert isinstance(self._start, np.floating)
             assert isinstance(self._stop, np.floating)
             values = np.linspace(self._start, self._stop, self._length, endpoint=False)
-            return Pattern.create_without_copy(values)
+            return Pattern.create_without_copy(
+                values.astype(self.dtype, copy=False), check_finite=False
+            )
+
+    def _copy_to(self, out: Array1D[T], start: int) -> None:
+        # This computes the same values as np.linspace in to_pattern, but only for the
+        # requested indices.
+        indices = np.arange(start, start + len(out))
+        if np.issubdtype(self.dtype, np.void):
+            assert self.dtype.names is not None
+            assert isinstance(self._start, np.void)
+            assert isinstance(self._stop, np.void)
+            # The dtype of the output is the structured dtype of the ramp.
+            fields: npt.NDArray[np.void] = out  # pyright: ignore[reportAssignmentType]
+            for name in self.dtype.names:
+                fields[name] = _linspace_values(
+                    self._start[name], self._stop[name], self._length, indices
+                )
+        else:
+            out[:] = _linspace_values(self._start, self._stop, self._length, indices)
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, Ramp):
             return NotImplemented
-        return (
-            np.all(self._start == other._start)
+        return bool(
+            self._length == other._length
+            and not self._has_different_hash(other)
+            and np.all(self._start == other._start)
             and np.all(self._stop == other._stop)
-            and self._length == other._length
         )
 
+    # Defining __eq__ removes the inherited __hash__, so we restore it explicitly.
+    __hash__ = TimedInstruction.__hash__
+
+    def _compute_hash(self) -> int:
+        digest = _new_digest()
+        _update_digest(digest, np.array([self._start, self._stop], dtype=self.dtype))
+        digest.update(self._length.to_bytes(8, "little"))
+        return _digest_to_int(digest)
+
     def apply[
         S: np.generic
     ](self, func: Callable[[Array1D[T]], Array1D[S]]) -> TimedInstruction[S]:
@@ -279,38 +323,6 @@ def _stack_ramps(a: Ramp, b: Ramp) -> TimedInstruction:
     return Ramp._create(start, stop, len(a))
 
 
-@stack.register(Ramp, Repeated)
-def _stack_ramp_repeated(a: Ramp, b: Repeated) -> TimedInstruction:
-    if len(b.instruction) == 1:
-        value = b.instruction[0]
-        if not Ramp.is_valid_dtype(value.dtype):
-            raise TypeError(
-                f"Can't stack a ramp with an instruction having dtype {value.dtype}."
-            )
-        start = _merge_values(a.start, value)
-        stop = _merge_values(a.stop, value)
-        return Ramp._create(start, stop, len(a))
-    else:
-        return stack(a.to_pattern(), b.to_pattern())
-
-
-@stack.register(Repeated, Ramp)
-def _stack_repeated_ramp(a: Repeated, b: Ramp) -> TimedInstruction:
-    assert len(a) == len(b)
-
-    if len(a.instruction) == 1:
-        value = a.instruction[0]
-        if not Ramp.is_valid_dtype(value.dtype):
-            raise TypeError(
-                f"Can't stack a ramp with an instruction having dtype {value.dtype}."
-            )
-        start = _merge_values(value, b.start)
-        stop = _merge_values(value, b.stop)
-        return Ramp._create(start, stop, len(b))
-    else:
-        return stack(a.to_pattern(), b.to_pattern())
-
-
 def _merge_values(a: np.void, b: np.void) -> np.void:
     merged_dtype = merge_dtypes(a.dtype, b.dtype)
     assert a.dtype.names is not None
@@ -320,3 +332,13 @@ def _merge_values(a: np.void, b: np.void) -> np.void:
         + tuple(b[name] for name in b.dtype.names),
         dtype=merged_dtype,
     )
+
+
+def _linspace_values(start, stop, length: int, indices: np.ndarray) -> np.ndarray:
+    difference = stop - start
+    step = difference / length
+    if step == 0 and difference != 0:
+        # np.linspace scales the indices by the whole difference when the step
+        # underflows to zero.
+        return (indices / length) * difference + start
+    return indices * step + start
@@ -0,0 +1,266 @@
+"""Binary encoding of timed instructions.
+
+An encoded instruction is made of three consecutive sections:
+
+- A fixed size header containing a magic number, the version of the format and the
+  size of the metadata section.
+- A metadata section, which is a UTF-8 JSON document containing the table of the nodes
+  of the instruction tree, the dtypes of the nodes and the position of the leaf
+  buffers in the data section.
+- A data section containing the raw values of the leaves, each aligned on
+  :data:`_ALIGNMENT` bytes.
+
+Nodes are stored in the table after their children, so that the tree can be rebuilt
+in a single pass over the table.
+The same sub-instruction object appearing several times in the tree, for example
+after it has been interned, is only stored once.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import struct
+from typing import Any
+
+import numpy as np
+
+from ._instructions import TimedInstruction, Pattern, Concatenated, Repeated
+from ._piecewise_linear import PiecewiseLinear
+from ._ramp import Ramp
+
+ENCODING_VERSION = 1
+"""The version of the binary format produced by :func:`encode_instruction`."""
+
+_MAGIC = b"CQTI"
+
+# Magic number, version, reserved, size of the metadata section.
+_HEADER = struct.Struct("<4sHHQ")
+
+_ALIGNMENT = 64
+
+_BOUNDS_DTYPE = np.dtype("<i8")
+
+type _Buffer = bytes | bytearray | memoryview
+
+
+def encode_instruction(instruction: TimedInstruction) -> bytes:
+    """Encodes an instruction into a compact binary format.
+
+    The values of the leaves of the instruction are stored as raw bytes, without
+    flattening the instruction.
+    Use :func:`decode_instruction` to get the instruction back.
+
+    Raises:
+        NotImplementedError: If the instruction contains a node type that can't be
+            encoded.
+    """
+
+    encoder = _Encoder()
+    root = encoder.add(instruction)
+    metadata = json.dumps(
+        {
+            "root": root,
+            "nodes": encoder.nodes,
+            "dtypes": encoder.dtypes,
+            "buffers": encoder.buffer_bounds,
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+    header = _HEADER.pack(_MAGIC, ENCODING_VERSION, 0, len(metadata))
+
+    chunks: list[_Buffer] = [header, metadata]
+    position = len(header) + len(metadata)
+    data_start = _align(position)
+    chunks.append(bytes(data_start - position))
+    position = data_start
+    for buffer, (offset, nbytes) in zip(
+        encoder.buffers, encoder.buffer_bounds, strict=True
+    ):
+        chunks.append(bytes(data_start + offset - position))
+        chunks.append(buffer)
+        position = data_start + offset + nbytes
+    return b"".join(chunks)
+
+
+def decode_instruction(data: _Buffer) -> TimedInstruction:
+    """Decodes an instruction encoded with :func:`encode_instruction`.
+
+    The values of the leaves are not copied and are read directly from the data, so
+    the data must not be modified while the instruction is in use.
+
+    Raises:
+        ValueError: If the data is not an encoded instruction or if it was encoded
+            with an unsupported version of the format.
+    """
+
+    if len(data) < _HEADER.size:
+        raise ValueError("Data is too short to be an encoded instruction")
+    magic, version, _, metadata_size = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("Data is not an encoded instruction")
+    if version != ENCODING_VERSION:
+        raise ValueError(f"Unsupported instruction encoding version {version}")
+    metadata_stop = _HEADER.size + metadata_size
+    metadata = json.loads(bytes(data[_HEADER.size : metadata_stop]))
+    data_start = _align(metadata_stop)
+
+    dtypes = [_descr_to_dtype(descr) for descr in metadata["dtypes"]]
+    bounds = metadata["buffers"]
+
+    def read(buffer_index: int, dtype: np.dtype, count: int) -> np.ndarray:
+        offset, _ = bounds[buffer_index]
+        return np.frombuffer(
+            data, dtype=dtype, count=count, offset=data_start + offset
+        )
+
+    nodes: list[TimedInstruction] = []
+    for node in metadata["nodes"]:
+        match node:
+            case ["pattern", dtype_index, buffer_index, length]:
+                # The values were checked to be finite when the pattern was created.
+                nodes.append(
+                    Pattern.create_without_copy(
+                        read(buffer_index, dtypes[dtype_index], length),
+                        check_finite=False,
+                    )
+                )
+            case ["concatenated", children]:
+                nodes.append(Concatenated(*(nodes[child] for child in children)))
+            case ["repeated", repetitions, child]:
+                nodes.append(Repeated(repetitions, nodes[child]))
+            case ["ramp", dtype_index, buffer_index, length]:
+                start, stop = read(buffer_index, dtypes[dtype_index], 2)
+                nodes.append(Ramp._create(start, stop, length))
+            case [
+                "piecewise_linear",
+                dtype_index,
+                bounds_index,
+                starts_index,
+                stops_index,
+                segments,
+            ]:
+                dtype = dtypes[dtype_index]
+                nodes.append(
+                    PiecewiseLinear._create(
+                        read(bounds_index, _BOUNDS_DTYPE, segments + 1),
+                        read(starts_index, dtype, segments),
+                        read(stops_index, dtype, segments),
+                    )
+                )
+            case _:
+                raise ValueError(f"Unknown instruction node {node!r}")
+    return nodes[metadata["root"]]
+
+
+class _Encoder:
+    def __init__(self) -> None:
+        self.nodes: list[list[Any]] = []
+        self.dtypes: list[Any] = []
+        self.buffers: list[memoryview] = []
+        self.buffer_bounds: list[tuple[int, int]] = []
+        self._dtype_indices: dict[np.dtype, int] = {}
+        # Maps the id of an encoded instruction to its index in the node table.
+        # The instructions are kept alive by the tree being encoded, so their ids
+        # can't be reused during the encoding.
+        self._node_indices: dict[int, int] = {}
+        self._data_size = 0
+
+    def add(self, instruction: TimedInstruction) -> int:
+        if (index := self._node_indices.get(id(instruction))) is not None:
+            return index
+        node = _encode_node(instruction, self)
+        index = len(self.nodes)
+        self.nodes.append(node)
+        self._node_indices[id(instruction)] = index
+        return index
+
+    def add_dtype(self, dtype: np.dtype) -> int:
+        if (index := self._dtype_indices.get(dtype)) is not None:
+            return index
+        index = len(self.dtypes)
+        self.dtypes.append(np.lib.format.dtype_to_descr(dtype))
+        self._dtype_indices[dtype] = index
+        return index
+
+    def add_buffer(self, array: np.ndarray) -> int:
+        buffer = np.ascontiguousarray(array).view(np.uint8).data
+        offset = _align(self._data_size)
+        self._data_size = offset + buffer.nbytes
+        self.buffers.append(buffer)
+        self.buffer_bounds.append((offset, buffer.nbytes))
+        return len(self.buffers) - 1
+
+
+@functools.singledispatch
+def _encode_node(instruction: TimedInstruction, encoder: _Encoder) -> list[Any]:
+    raise NotImplementedError(f"Cannot encode {type(instruction)}")
+
+
+@_encode_node.register
+def _encode_pattern(instruction: Pattern, encoder: _Encoder) -> list[Any]:
+    return [
+        "pattern",
+        encoder.add_dtype(instruction.dtype),
+        encoder.add_buffer(instruction.array),
+        len(instruction),
+    ]
+
+
+@_encode_node.register
+def _encode_concatenated(instruction: Concatenated, encoder: _Encoder) -> list[Any]:
+    return [
+        "concatenated",
+        [encoder.add(child) for child in instruction.instructions],
+    ]
+
+
+@_encode_node.register
+def _encode_repeated(instruction: Repeated, encoder: _Encoder) -> list[Any]:
+    return [
+        "repeated",
+        instruction.repetitions,
+        encoder.add(instruction.instruction),
+    ]
+
+
+@_encode_node.register
+def _encode_ramp(instruction: Ramp, encoder: _Encoder) -> list[Any]:
+    values = np.array([instruction.start, instruction.stop], dtype=instruction.dtype)
+    return [
+        "ramp",
+        encoder.add_dtype(instruction.dtype),
+        encoder.add_buffer(values),
+        len(instruction),
+    ]
+
+
+@_encode_node.register
+def _encode_piecewise_linear(
+    instruction: PiecewiseLinear, encoder: _Encoder
+) -> list[Any]:
+    return [
+        "piecewise_linear",
+        encoder.add_dtype(instruction.dtype),
+        encoder.add_buffer(instruction.bounds.astype(_BOUNDS_DTYPE, copy=False)),
+        encoder.add_buffer(instruction.starts),
+        encoder.add_buffer(instruction.stops),
+        instruction.number_segments,
+    ]
+
+
+def _descr_to_dtype(descr: Any) -> np.dtype:
+    # JSON turns the tuples of structured dtype descriptions into lists.
+    return np.lib.format.descr_to_dtype(_lists_to_tuples(descr))
+
+
+def _lists_to_tuples(value: Any) -> Any:
+    if isinstance(value, list):
+        if all(isinstance(item, list) for item in value):
+            return [_lists_to_tuples(item) for item in value]
+        return tuple(_lists_to_tuples(item) for item in value)
+    return value
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
@@ -1,5 +1,7 @@
+import functools
 import heapq
 import math
+from collections.abc import Callable
 
 import multipledispatch
 import numpy as np
@@ -32,10 +34,12 @@ def merge_instructions(**instructions: TimedInstruction) -> TimedInstruction:
         and a structured dtype with a field for each input instruction.
 
     Warning:
-        If the input instructions have no simple common structure, this function will
-        convert each instruction to an explicit pattern and merge them.
-        If the input instructions have a very long length, this function might be slow
-        and consume a lot of memory.
+        When the other instruction has no compatible structure, for example when a
+        repeated pulse train is merged with a ramp, the other instruction is split at
+        the boundaries of the repeated blocks.
+        If the pieces would take more memory than the values of the merged
+        instructions, for example for many repetitions of a short block, the
+        instructions are converted to explicit patterns instead.
 
     Raises:
         ValueError: If the instructions have different lengths or no instructions are
@@ -57,6 +61,56 @@ def merge_instructions(**instructions: TimedInstruction) -> TimedInstruction:
     return _stack_instructions_no_checks(*named_instructions)
 
 
+def combine_instructions(
+    lhs: TimedInstruction,
+    rhs: TimedInstruction,
+    op: Callable[[np.ndarray, np.ndarray], np.ndarray],
+) -> TimedInstruction:
+    """Apply an element-wise binary operation to two instructions.
+
+    The instructions are aligned on a common structure as in
+    :func:`merge_instructions`, and the operation is applied once per leaf of this
+    structure, so repetitions are not expanded.
+
+    Args:
+        lhs: The first operand of the operation.
+        rhs: The second operand of the operation.
+            It must have the same length as `lhs`.
+        op: A binary function to apply to the values of the instructions, for example
+            a NumPy bitwise ufunc.
+            It is called with two arrays of the same length and must return an array of
+            that length.
+
+    Raises:
+        ValueError: If the instructions have different lengths.
+    """
+
+    merged = merge_instructions(lhs=lhs, rhs=rhs)
+    return _apply_binary(merged, op)
+
+
+@functools.singledispatch
+def _apply_binary(instr: TimedInstruction, op) -> TimedInstruction:
+    return _apply_binary(instr.to_pattern(), op)
+
+
+@_apply_binary.register
+def _(instr: Pattern, op) -> TimedInstruction:
+    return Pattern.create_without_copy(op(instr.array["lhs"], instr.array["rhs"]))
+
+
+@_apply_binary.register
+def _(instr: Concatenated, op) -> TimedInstruction:
+    return concatenate(
+        *(_apply_binary(instruction, op) for instruction in instr.instructions)
+    )
+
+
+@_apply_binary.register
+def _(instr: Repeated, op) -> TimedInstruction:
+    return instr.repetitions * _apply_binary(instr.instruction, op)
+
+
 def stack_instructions(
     *instructions: TimedInstruction[np.void],
 ) -> TimedInstruction[np.void]:
@@ -109,12 +163,27 @@ def _stack_instructions_no_checks(
 
 stack = multipledispatch.Dispatcher("stack")
 
+NODE_BYTES = 256
+"""Approximate memory taken by an instruction object, excluding its values.
+
+It is used to estimate whether splitting an instruction along the blocks of a
+repetition takes less memory than converting both instructions to patterns.
+"""
+
 
 @stack.register(TimedInstruction, TimedInstruction)
 def stack_generic(
     a: TimedInstruction[np.void], b: TimedInstruction[np.void]
 ) -> TimedInstruction:
     assert len(a) == len(b)
+
+    # The other instruction is split at the boundaries of the repeated block, and the
+    # pieces are stacked with the block with their structure preserved, unless the
+    # pieces would take more memory than explicit patterns.
+    if isinstance(a, Repeated):
+        return _stack_split_left(a, b)
+    if isinstance(b, Repeated):
+        return _stack_split_right(a, b)
     return _stack_patterns(a.to_pattern(), b.to_pattern())
 
 
@@ -129,7 +198,7 @@ def _stack_patterns(a: Pattern[np.void], b: Pattern[np.void]) -> Pattern[np.void
     assert b.dtype.names is not None
     for name in b.dtype.names:
         merged[name] = b.array[name]
-    return Pattern.create_without_copy(merged)
+    return Pattern.create_without_copy(merged, check_finite=False)
 
 
 @stack.register(Concatenated, Concatenated)
@@ -179,13 +248,16 @@ def stack_repeated(a: Repeated, b: Repeated) -> TimedInstruction:
 
     lcm = math.lcm(len(a.instruction), len(b.instruction))
     if lcm == len(a):
-        b_a = tile(a.instruction, a.repetitions)
-        b_b = tile(b.instruction, b.repetitions)
-    else:
-        r_a = lcm // len(a.instruction)
-        b_a = a.instruction * r_a
-        r_b = lcm // len(b.instruction)
-        b_b = b.instruction * r_b
+        # The blocks have no common period shorter than the instructions, so we split
+        # along the repetition that produces the smallest pieces.
+        if _split_nbytes(a, b) <= _split_nbytes(b, a):
+            return _stack_split_left(a, b)
+        else:
+            return _stack_split_right(a, b)
+    r_a = lcm // len(a.instruction)
+    b_a = a.instruction * r_a
+    r_b = lcm // len(b.instruction)
+    b_b = b.instruction * r_b
     block = stack(b_a, b_b)
     return block * (len(a) // len(block))
 
@@ -203,3 +275,48 @@ def tile[
     T: np.generic
 ](instruction: TimedInstruction[T], repetitions: int) -> TimedInstruction[T]:
     return concatenate(*([instruction] * repetitions))
+
+
+def _stack_split_left(a: Repeated, b: TimedInstruction) -> TimedInstruction:
+    """Stacks a repetition with an instruction split at the boundaries of its blocks."""
+
+    if not _should_split_along(a, b):
+        return _stack_patterns(a.to_pattern(), b.to_pattern())
+    block = a.instruction
+    length = len(block)
+    return concatenate(
+        *(stack(block, b[start : start + length]) for start in range(0, len(a), length))
+    )
+
+
+def _stack_split_right(a: TimedInstruction, b: Repeated) -> TimedInstruction:
+    """Stacks an instruction split at the boundaries of the blocks of a repetition."""
+
+    if not _should_split_along(b, a):
+        return _stack_patterns(a.to_pattern(), b.to_pattern())
+    block = b.instruction
+    length = len(block)
+    return concatenate(
+        *(stack(a[start : start + length], block) for start in range(0, len(b), length))
+    )
+
+
+def _should_split_along(repeated: Repeated, other: TimedInstruction) -> bool:
+    return _split_nbytes(repeated, other) < _pattern_nbytes(repeated, other)
+
+
+def _split_nbytes(repeated: Repeated, other: TimedInstruction) -> int:
+    """Estimates the memory of the pieces obtained by splitting along a repetition."""
+
+    block = repeated.instruction
+    piece_nbytes = NODE_BYTES * block.node_count
+    if isinstance(block, Pattern) or isinstance(other, Pattern):
+        # A piece stacked with a pattern is itself a pattern.
+        piece_nbytes += len(block) * (block.dtype.itemsize + other.dtype.itemsize)
+    return repeated.repetitions * piece_nbytes
+
+
+def _pattern_nbytes(a: TimedInstruction, b: TimedInstruction) -> int:
+    """Returns the memory of the pattern obtained by stacking two instructions."""
+
+    return len(a) * (a.dtype.itemsize + b.dtype.itemsize)
@@ -1,8 +1,10 @@
-import functools
+from typing import NamedTuple, Any
 
 import numpy as np
 
+from caqtus.utils.itertools import pairwise
 from ._instructions import TimedInstruction, Pattern, Concatenated, Repeated
+from ._piecewise_linear import PiecewiseLinear
 from ._ramp import Ramp
 
 
@@ -11,8 +13,14 @@ def convert_to_change_arrays(
 ) -> tuple[np.ndarray, np.ndarray]:
     """Convert a sequence to arrays of change times and values.
 
+    Consecutive identical values are merged, so that the arrays contain one entry per
+    change of value and not one entry per time step.
+    Repetitions are not expanded, and the cost of the conversion is proportional to
+    the number of changes in the sequence.
+
     Args:
         sequence: The sequence to convert.
+            It must have a length of at least 1.
 
     Returns:
         Two arrays, the first containing times indexes at which the values of the
@@ -20,57 +28,223 @@ def convert_to_change_arrays(
         change.
         The time array will have dtype np.int64 and the value array will have
         the same dtype as the sequence passed in argument.
+        The last element of the time array is the length of the sequence, and the last
+        element of the value array repeats the last value of the sequence.
+
+    Raises:
+        ValueError: If the sequence is empty.
     """
 
-    times, values = _convert_to_change_arrays(sequence)
-    return np.concatenate([times, [len(sequence)]], axis=0), np.concatenate(
-        [values, [values[-1]]], axis=0
-    )
+    if len(sequence) == 0:
+        raise ValueError("Can't convert an empty instruction to change arrays")
 
+    summaries = _summarize(sequence)
+    number_changes = summaries[id(sequence)].number_changes
 
-@functools.singledispatch
-def _convert_to_change_arrays(
-    sequence: TimedInstruction,
-) -> tuple[np.ndarray, np.ndarray]:
-    raise NotImplementedError(f"Cannot convert {type(sequence)} to time arrays")
+    times = np.empty(number_changes + 1, dtype=np.int64)
+    values = np.empty(number_changes + 1, dtype=sequence.dtype)
+    position = _fill_changes(sequence, summaries, times, values)
+    assert position == number_changes
 
+    times[-1] = len(sequence)
+    values[-1] = values[-2]
+    return times, values
 
-@_convert_to_change_arrays.register
-def _convert_pattern(sequence: Pattern) -> tuple[np.ndarray, np.ndarray]:
-    times = np.arange(len(sequence), dtype=np.int64)
-    values = sequence.array
 
-    return times, values
+class _Summary(NamedTuple):
+    first: Any
+    last: Any
+    # Number of changes in the instruction, including its first value.
+    number_changes: int
+    # For leaf instructions only, the indices and values of the changes.
+    changes: tuple[np.ndarray, np.ndarray] | None = None
 
 
-@_convert_to_change_arrays.register
-def _convert_ramp(sequence: Ramp) -> tuple[np.ndarray, np.ndarray]:
-    return _convert_pattern(sequence.to_pattern())
+def _summarize(root: TimedInstruction) -> dict[int, _Summary]:
+    """Computes the summaries of all the nodes of an instruction tree.
 
+    The summaries are indexed by the id of the nodes, so that sub-instructions shared
+    in several places of the tree are only summarized once.
+    """
 
-@_convert_to_change_arrays.register
-def _(sequence: Concatenated) -> tuple[np.ndarray, np.ndarray]:
-    time_arrays = []
-    value_arrays = []
+    summaries: dict[int, _Summary] = {}
+    stack: list[tuple[TimedInstruction, bool]] = [(root, False)]
+    while stack:
+        instruction, children_done = stack.pop()
+        if id(instruction) in summaries:
+            continue
+        if isinstance(instruction, Concatenated):
+            if not children_done:
+                stack.append((instruction, True))
+                stack.extend((child, False) for child in instruction.instructions)
+                continue
+            children = [summaries[id(child)] for child in instruction.instructions]
+            merged_boundaries = sum(
+                bool(previous.last == current.first)
+                for previous, current in pairwise(children)
+            )
+            summaries[id(instruction)] = _Summary(
+                first=children[0].first,
+                last=children[-1].last,
+                number_changes=sum(child.number_changes for child in children)
+                - merged_boundaries,
+            )
+        elif isinstance(instruction, Repeated):
+            if not children_done:
+                stack.append((instruction, True))
+                stack.append((instruction.instruction, False))
+                continue
+            inner = summaries[id(instruction.instruction)]
+            merged_boundaries = (instruction.repetitions - 1) * bool(
+                inner.last == inner.first
+            )
+            summaries[id(instruction)] = _Summary(
+                first=inner.first,
+                last=inner.last,
+                number_changes=instruction.repetitions * inner.number_changes
+                - merged_boundaries,
+            )
+        else:
+            summaries[id(instruction)] = _summarize_leaf(instruction)
+    return summaries
+
+
+def _summarize_leaf(instruction: TimedInstruction) -> _Summary:
+    if isinstance(instruction, Ramp) and bool(
+        np.all(instruction.start == instruction.stop)
+    ):
+        indices = np.zeros(1, dtype=np.int64)
+        values = np.array([instruction.start], dtype=instruction.dtype)
+    elif isinstance(instruction, PiecewiseLinear):
+        indices, values = _piecewise_linear_changes(instruction)
+    else:
+        if isinstance(instruction, Pattern):
+            array = instruction.array
+        elif isinstance(instruction, Ramp):
+            # A non-constant ramp changes at almost every step, so we need to compute
+            # all its values anyway.
+            array = np.empty(len(instruction), dtype=instruction.dtype)
+            instruction.copy_to(array)
+        else:
+            array = instruction.to_pattern().array
+        indices = np.concatenate(
+            [[0], np.flatnonzero(array[1:] != array[:-1]) + 1]
+        ).astype(np.int64)
+        values = array[indices]
+    return _Summary(
+        first=values[0],
+        last=values[-1],
+        number_changes=len(indices),
+        changes=(indices, values),
+    )
 
-    cumulated_start = 0
 
-    for instruction in sequence.instructions:
-        times, values = _convert_to_change_arrays(instruction)
-        time_arrays.append(times + cumulated_start)
-        value_arrays.append(values)
-        cumulated_start += len(instruction)
+def _piecewise_linear_changes(
+    instruction: PiecewiseLinear,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Constant segments only contribute their first index, and the other segments
+    # contribute all their indices.
+    lengths = np.diff(instruction.bounds)
+    constant = instruction.starts == instruction.stops
+    counts = np.where(constant, 1, lengths)
+    first_positions = np.cumsum(counts) - counts
+    candidates = np.repeat(instruction.bounds[:-1], counts) + (
+        np.arange(counts.sum()) - np.repeat(first_positions, counts)
+    )
+    candidate_values = instruction._values_at(candidates)
+    is_change = np.empty(len(candidates), dtype=bool)
+    is_change[0] = True
+    is_change[1:] = candidate_values[1:] != candidate_values[:-1]
+    return candidates[is_change].astype(np.int64), candidate_values[is_change]
 
-    return np.concatenate(time_arrays), np.concatenate(value_arrays)
 
+def _fill_changes(
+    root: TimedInstruction,
+    summaries: dict[int, _Summary],
+    times: np.ndarray,
+    values: np.ndarray,
+) -> int:
+    """Writes the changes of an instruction tree into preallocated arrays.
+
+    Returns:
+        The number of changes written.
+    """
 
-@_convert_to_change_arrays.register
-def _(sequence: Repeated) -> tuple[np.ndarray, np.ndarray]:
-    time_array, value_array = _convert_to_change_arrays(sequence.instruction)
-    if len(time_array) == 1:
-        return np.array([0], dtype=np.int64), value_array
-    start_times = np.arange(sequence.repetitions, dtype=np.int64) * len(
-        sequence.instruction
+    position = 0
+
+    # Each task is either a node to write, given its start time and whether its first
+    # change must be skipped because it has the same value as the previous change, or
+    # a repetition to complete once its first block has been written.
+    stack: list[tuple] = [("write", root, 0, False)]
+    while stack:
+        task = stack.pop()
+        if task[0] == "write":
+            _, instruction, start_time, skip_first = task
+            if isinstance(instruction, Concatenated):
+                children = instruction.instructions
+                child_tasks = []
+                for index, child in enumerate(children):
+                    if index == 0:
+                        skip = skip_first
+                    else:
+                        skip = bool(
+                            summaries[id(children[index - 1])].last
+                            == summaries[id(child)].first
+                        )
+                    child_start = start_time + instruction._instruction_bounds[index]
+                    child_tasks.append(("write", child, child_start, skip))
+                stack.extend(reversed(child_tasks))
+            elif isinstance(instruction, Repeated):
+                stack.append(("repeat", instruction, start_time))
+                stack.append(("write", instruction.instruction, start_time, skip_first))
+            else:
+                changes = summaries[id(instruction)].changes
+                assert changes is not None
+                indices, leaf_values = changes
+                if skip_first:
+                    indices, leaf_values = indices[1:], leaf_values[1:]
+                stop = position + len(indices)
+                times[position:stop] = indices + start_time
+                values[position:stop] = leaf_values
+                position = stop
+        else:
+            _, repeated, start_time = task
+            position = _write_repetitions(
+                repeated, summaries, times, values, position, start_time
+            )
+    return position
+
+
+def _write_repetitions(
+    repeated: Repeated,
+    summaries: dict[int, _Summary],
+    times: np.ndarray,
+    values: np.ndarray,
+    position: int,
+    start_time: int,
+) -> int:
+    # The first block of the repetition has just been written before `position`.
+    # Whatever the first change of this block, the following changes of the block are
+    # always written, so we use them as a template for the other repetitions.
+    inner = summaries[id(repeated.instruction)]
+    skip_first = bool(inner.last == inner.first)
+    template_times = times[position - (inner.number_changes - 1) : position]
+    template_values = values[position - (inner.number_changes - 1) : position]
+
+    block_size = inner.number_changes - skip_first
+    repetitions = repeated.repetitions - 1
+    stop = position + repetitions * block_size
+    block_times = times[position:stop].reshape(repetitions, block_size)
+    block_values = values[position:stop].reshape(repetitions, block_size)
+    offsets = np.arange(1, repeated.repetitions, dtype=np.int64) * len(
+        repeated.instruction
     )
-    time_arrays = time_array + start_times[:, np.newaxis]
-    return np.concatenate(time_arrays), np.tile(value_array, sequence.repetitions)
+    if skip_first:
+        block_times[:] = template_times + offsets[:, np.newaxis]
+        block_values[:] = template_values
+    else:
+        block_times[:, 0] = start_time + offsets
+        block_values[:, 0] = inner.first
+        block_times[:, 1:] = template_times + offsets[:, np.newaxis]
+        block_values[:, 1:] = template_values
+    return stop
@@ -2,22 +2,28 @@
 
 from ._timing import (
     Time,
+    Picoseconds,
     to_time,
+    to_picoseconds,
     to_time_bounds,
     get_step_bounds,
     start_tick,
     stop_tick,
     number_ticks,
+    get_step_ticks,
     ps,
 )
 
 __all__ = [
     "Time",
+    "Picoseconds",
     "to_time",
+    "to_picoseconds",
     "to_time_bounds",
     "get_step_bounds",
     "start_tick",
     "stop_tick",
     "number_ticks",
+    "get_step_ticks",
     "ps",
 ]
@@ -1,7 +1,10 @@
 import decimal
+import functools
 import math
 from itertools import accumulate
-from typing import Iterable, Sequence, NewType
+from typing import Any, Iterable, Sequence, NewType
+
+import numpy as np
 
 Time = NewType("Time", decimal.Decimal)
 """A type for representing time in seconds.
@@ -9,8 +12,16 @@ Time = NewType("Time", decimal.Decimal)
 It uses a decimal.Decimal to represent time in seconds to avoid floating point errors.
 """
 
+Picoseconds = NewType("Picoseconds", int)
+"""A type for representing time as an exact integer number of picoseconds.
+
+Integer arithmetic is exact and can be vectorized with numpy, which is used to compute
+the ticks of many times at once.
+"""
+
 
 ps = decimal.Decimal("1e-12")
+_PICOSECONDS_PER_SECOND = decimal.Decimal(10**12)
 
 
 def to_time(value: decimal.Decimal | float | str) -> Time:
@@ -26,6 +37,15 @@ def to_time(value: decimal.Decimal | float | str) -> Time:
     return Time(decimal.Decimal(value).quantize(ps))
 
 
+def to_picoseconds(time: Time) -> Picoseconds:
+    """Converts a time in seconds to an integer number of picoseconds.
+
+    The time is rounded to the nearest picosecond.
+    """
+
+    return Picoseconds(round(decimal.Decimal(time) * _PICOSECONDS_PER_SECOND))
+
+
 def to_time_bounds(durations: Iterable[float]) -> Sequence[Time]:
     """Converts an iterable of durations to an iterable of Time objects.
 
@@ -63,6 +83,41 @@ def stop_tick(stop_time: Time, time_step: Time) -> int:
     return math.ceil(stop_time / time_step)
 
 
+def get_step_ticks(
+    step_bounds: Sequence[Time], time_step: Time
+) -> np.ndarray[Any, np.dtype[np.int64]]:
+    """Returns the index of the first tick at or after each step bound.
+
+    This gives the same result as calling :func:`start_tick` on each bound, but
+    computes the ticks of all the bounds at once.
+    The number of ticks between the bounds i and j is ``ticks[j] - ticks[i]``.
+    The returned array is read-only.
+
+    Args:
+        step_bounds: The times at which the steps start, in seconds, for example
+            obtained with :func:`get_step_bounds`.
+        time_step: The time step in seconds.
+    """
+
+    # The lanes of a shot share the same step bounds, so the ticks are only computed
+    # once per shot for each time step.
+    return _get_step_ticks(tuple(step_bounds), time_step)
+
+
+@functools.lru_cache(maxsize=32)
+def _get_step_ticks(
+    step_bounds: tuple[Time, ...], time_step: Time
+) -> np.ndarray[Any, np.dtype[np.int64]]:
+    bounds = np.fromiter(
+        (to_picoseconds(bound) for bound in step_bounds),
+        dtype=np.int64,
+        count=len(step_bounds),
+    )
+    ticks = -(-bounds // to_picoseconds(time_step))
+    ticks.flags.writeable = False
+    return ticks
+
+
 def number_ticks(start_time: Time, stop_time: Time, time_step: Time) -> int:
     """Returns the number of ticks between start_time and stop_time.
 
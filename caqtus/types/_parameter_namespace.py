@@ -21,10 +21,11 @@ class VariableNamespace(Generic[T]):
             self._dict[str(key)] = value
 
     def to_flat_dict(self) -> dict[DottedVariableName, T]:
-        return {
-            DottedVariableName(name.replace("$", ".")): value
-            for name, value in self._dict.flatten(separator="$").items()
-        }
+        # This gives the same result as benedict.flatten, which copies the whole
+        # namespace before flattening it.
+        flat: dict[DottedVariableName, T] = {}
+        _flatten(self._dict, "", flat)
+        return flat
 
     def __getitem__(self, item: DottedVariableName) -> T:
         return self._dict[str(item)]  # type: ignore[reportReturnType]
@@ -48,3 +49,15 @@ class VariableNamespace(Generic[T]):
 
     def dict(self):
         return self._dict
+
+
+def _flatten(values: Mapping, prefix: str, flat: dict[DottedVariableName, T]) -> None:
+    # benedict wraps the values it returns, so the items are read from the underlying
+    # dict when possible.
+    items = dict.items(values) if isinstance(values, dict) else values.items()
+    for key, value in items:
+        name = f"{prefix}{key}"
+        if isinstance(value, Mapping):
+            _flatten(value, f"{name}.", flat)
+        else:
+            flat[DottedVariableName(name)] = value
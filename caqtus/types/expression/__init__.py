@@ -1,5 +1,19 @@
 """Defines user expressions that can be evaluated later."""
 
-from ._expression import Expression, expression_builtins, DEFAULT_BUILTINS
+from ._expression import (
+    Expression,
+    expression_builtins,
+    DEFAULT_BUILTINS,
+    warm_expression_cache,
+    get_expression_cache_info,
+    clear_expression_cache,
+)
 
-__all__ = ["Expression", "expression_builtins", "DEFAULT_BUILTINS"]
+__all__ = [
+    "Expression",
+    "expression_builtins",
+    "DEFAULT_BUILTINS",
+    "warm_expression_cache",
+    "get_expression_cache_info",
+    "clear_expression_cache",
+]
@@ -1,9 +1,11 @@
 import ast
+import collections
 import contextvars
+import functools
 import re
-from collections.abc import Mapping
+from collections.abc import Iterable, Mapping
 from functools import cached_property
-from typing import Optional, Any
+from typing import NamedTuple, Optional, Any
 
 import numpy
 import token_utils
@@ -17,8 +19,11 @@ from ..variable_name import DottedVariableName, VariableName
 
 EXPRESSION_REGEX = re.compile(".*")
 
+EXPRESSION_CACHE_SIZE = 4096
+"""The maximum number of parsed expression bodies kept in memory by each process."""
 
-DEFAULT_BUILTINS: Mapping[str, Any] = {
+
+_FUNCTIONS_AND_CONSTANTS: dict[str, Any] = {
     "abs": numpy.abs,
     "arccos": numpy.arccos,
     "arcsin": numpy.arcsin,
@@ -45,7 +50,14 @@ DEFAULT_BUILTINS: Mapping[str, Any] = {
     "min": min,
     "Enabled": True,
     "Disabled": False,
-} | {str(name): value for name, value in units.items()}
+}
+
+# The units are looked up in the registry the first time they are used, which is
+# faster than looking up all of them when this module is imported.
+# ChainMap only writes to its first mapping, so the units can be read-only.
+DEFAULT_BUILTINS: Mapping[str, Any] = collections.ChainMap(
+    _FUNCTIONS_AND_CONSTANTS, units  # pyright: ignore[reportArgumentType]
+)
 """Default built-in functions and constants available in expressions."""
 
 expression_builtins: contextvars.ContextVar[Mapping[str, Any]] = contextvars.ContextVar(
@@ -118,24 +130,18 @@ class Expression:
             EvaluationError: if an error occurred during evaluation.
         """
 
-        return self._evaluate({str(expr): variables[expr] for expr in variables})
+        return self._evaluate(variables)
 
     @cached_property
     def upstream_variables(self) -> frozenset[VariableName]:
         """Return the name of the other variables the expression depend on."""
 
-        variables = set()
-
         builtins = self.builtins
-
-        class FindNameVisitor(ast.NodeVisitor):
-            def visit_Name(self, node: ast.Name):  # noqa: N802
-                if isinstance(node.ctx, ast.Load):
-                    if node.id not in builtins:
-                        variables.add(VariableName(node.id))
-
-        FindNameVisitor().visit(self._ast)
-        return frozenset(variables)
+        return frozenset(
+            VariableName(name)
+            for name in _compile_body(self.body).names
+            if name not in builtins
+        )
 
     def check_syntax(self) -> Optional[SyntaxError]:
         """Force parsing of the expression.
@@ -150,37 +156,38 @@ class Expression:
         """
 
         try:
-            self._parse_ast()
+            _compile_body(self.body)
         except SyntaxError as error:
             return error
 
-    def _evaluate(self, variables: Mapping[str, Any]) -> Any:
+    def _evaluate(self, variables: Mapping[DottedVariableName, Any]) -> Any:
         try:
-            value = eval(self._code, {"__builtins__": self.builtins}, variables)
+            compiled = _compile_body(self.body)
+            # Only the names used by the expression are looked up, so that the
+            # variables that are not used are not accessed.
+            local_variables = {
+                name: variables[name]  # pyright: ignore[reportArgumentType]
+                for name in compiled.names
+                if name in variables
+            }
+            value = eval(
+                compiled.code, {"__builtins__": self.builtins}, local_variables
+            )
         except Exception as error:
             raise EvaluationError(
                 f"Could not evaluate {fmt.expression(self)}"
             ) from error
         return value
 
-    @cached_property
+    @property
     def _ast(self) -> ast.Expression:
         """Computes the abstract syntax tree for this expression"""
 
-        return self._parse_ast()
-
-    def _parse_ast(self) -> ast.Expression:
-        expr = self.body
+        return _compile_body(self.body).tree
 
-        expr = expr.replace("%", "*(1e-2)")
-        expr = expr.replace("°", "*deg")
-        expr = add_implicit_multiplication(expr)
-
-        return ast.parse(expr, mode="eval")
-
-    @cached_property
+    @property
     def _code(self):
-        return compile(self._ast, filename="<string>", mode="eval")
+        return _compile_body(self.body).code
 
     def __eq__(self, other):
         if isinstance(other, Expression):
@@ -199,6 +206,66 @@ serialization.register_unstructure_hook(Expression, lambda expr: expr.body)
 serialization.register_structure_hook(Expression, lambda body, _: Expression(body))
 
 
+class _CompiledBody(NamedTuple):
+    tree: ast.Expression
+    code: Any
+    # The names loaded by the expression, including the builtins it uses.
+    names: frozenset[str]
+
+
+@functools.lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def _compile_body(body: str) -> _CompiledBody:
+    # Expressions are deserialized anew for every sequence and shot, so the parsing
+    # results are shared between all the expressions with the same body instead of
+    # being computed for each instance.
+    # The syntax tree is shared and must not be modified.
+    # Invalid expressions raise an exception and are not cached.
+    expr = body.replace("%", "*(1e-2)")
+    expr = expr.replace("°", "*deg")
+    expr = add_implicit_multiplication(expr)
+    tree = ast.parse(expr, mode="eval")
+
+    names = frozenset(
+        node.id
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+    )
+    return _CompiledBody(
+        tree=tree, code=compile(tree, filename="<string>", mode="eval"), names=names
+    )
+
+
+def warm_expression_cache(expressions: Iterable[Expression | str]) -> None:
+    """Parses expressions in advance so that their evaluation doesn't need to.
+
+    The parsing results are cached for each process.
+    Processes created by forking inherit the cache of their parent, but processes that
+    are spawned start with an empty cache, so this function can be used to fill it
+    when they start.
+
+    Expressions with invalid syntax are ignored, the error is raised when they are
+    evaluated.
+    """
+
+    for expression in expressions:
+        try:
+            _compile_body(str(expression))
+        except SyntaxError:
+            pass
+
+
+def get_expression_cache_info() -> functools._CacheInfo:
+    """Returns the number of hits and misses of the expression cache in this process."""
+
+    return _compile_body.cache_info()
+
+
+def clear_expression_cache() -> None:
+    """Removes all parsed expressions from the cache and resets its counters."""
+
+    _compile_body.cache_clear()
+
+
 def add_implicit_multiplication(source: str) -> str:
     """This adds a multiplication symbol where it would be understood as
     being implicit by the normal way algebraic equations are written but would
@@ -0,0 +1,162 @@
+"""Conversion of units to base units without going through pint arithmetic.
+
+Converting a quantity with pint builds several intermediate objects and walks the
+definitions of the registry on each call.
+Instead, the conversion of each unit to base units is computed once, as a
+multiplicative factor and the exponents of the base units, and stored in a table.
+"""
+
+from __future__ import annotations
+
+import functools
+from collections.abc import Iterable
+from typing import Optional
+
+import attrs
+import pint.util
+
+from ._units import Unit, BaseUnit, Quantity, ureg, dimensionless
+
+type Dimensions = tuple[tuple[str, int | float], ...]
+"""The exponents of the base units of a quantity, sorted by base unit name.
+
+Base units with a zero exponent are not present, so a dimensionless value has empty
+dimensions.
+"""
+
+
+@attrs.frozen
+class UnitConversion:
+    """How to convert a value expressed in a unit to base units.
+
+    Attributes:
+        factor: The value of one unit in base units.
+        dimensions: The exponents of the base units of the unit.
+    """
+
+    factor: float
+    dimensions: Dimensions
+
+
+def get_unit_conversion(unit: Unit) -> Optional[UnitConversion]:
+    """Returns the conversion of a unit to base units.
+
+    Returns:
+        The conversion of the unit, or None if the unit can't be converted by a simple
+        multiplication, like decibels or offset temperatures.
+    """
+
+    try:
+        return _CONVERSIONS[unit]
+    except KeyError:
+        conversion = _CONVERSIONS[unit] = _compute_conversion(unit)
+        return conversion
+
+
+def _compute_conversion(unit: Unit) -> Optional[UnitConversion]:
+    for name in unit._units:  # pyright: ignore[reportAttributeAccessIssue]
+        definition = ureg._units[name]
+        if not definition.is_multiplicative or definition.is_logarithmic:
+            return None
+    in_base_units = Quantity(1.0, unit).to_base_units()
+    return UnitConversion(
+        factor=in_base_units.magnitude,
+        dimensions=normalize_dimensions(
+            in_base_units.units._units.items()  # pyright: ignore
+        ),
+    )
+
+
+def normalize_dimensions(
+    exponents: pint.util.UnitsContainer | dict[str, int | float] | Dimensions,
+) -> Dimensions:
+    """Sorts the base units and removes the ones with a zero exponent."""
+
+    items: Iterable[tuple[str, int | float]]
+    if isinstance(exponents, (pint.util.UnitsContainer, dict)):
+        # pint annotates the exponents with a broader type, but they are numbers.
+        items = exponents.items()  # pyright: ignore[reportAssignmentType]
+    else:
+        items = exponents
+    return tuple(
+        sorted(
+            (name, int(exponent) if float(exponent).is_integer() else exponent)
+            for name, exponent in items
+            if exponent != 0
+        )
+    )
+
+
+def combine_dimensions(left: Dimensions, right: Dimensions, sign: int) -> Dimensions:
+    """Returns the dimensions of the product or quotient of two values.
+
+    Args:
+        left: The dimensions of the first value.
+        right: The dimensions of the second value.
+        sign: 1 for a product, -1 for a quotient.
+    """
+
+    exponents = dict(left)
+    for name, exponent in right:
+        exponents[name] = exponents.get(name, 0) + sign * exponent
+    return normalize_dimensions(exponents)
+
+
+@functools.lru_cache(maxsize=None)
+def get_base_unit(dimensions: Dimensions) -> BaseUnit:
+    """Returns the base unit with the given dimensions."""
+
+    if not dimensions:
+        return dimensionless
+    unit = ureg.Unit(pint.util.UnitsContainer(dict(dimensions)))
+    assert isinstance(unit, Unit)
+    return BaseUnit(unit)
+
+
+@functools.lru_cache(maxsize=None)
+def is_dimensionless(dimensions: Dimensions) -> bool:
+    """Indicates if base units are dimensionless, like radians."""
+
+    if not dimensions:
+        return True
+    return get_base_unit(dimensions).dimensionless
+
+
+def magnitude_in_base_units(quantity: Quantity[float]) -> tuple[float, BaseUnit]:
+    """Returns the magnitude and units of a scalar quantity in base units.
+
+    This gives the same result as :meth:`Quantity.to_base_units`, but uses the
+    conversion table when possible.
+    """
+
+    conversion = get_unit_conversion(quantity.units)
+    if conversion is None:
+        in_base_units = quantity.to_base_units()
+        return in_base_units.magnitude, in_base_units.units
+    return (
+        quantity.magnitude * conversion.factor,
+        get_base_unit(conversion.dimensions),
+    )
+
+
+def magnitude_in_unit(quantity: Quantity[float], unit: Unit) -> float:
+    """Returns the magnitude of a scalar quantity converted to the given unit.
+
+    This gives the same result as :meth:`Quantity.to_unit`, but uses the conversion
+    table when possible.
+
+    Raises:
+        DimensionalityError: If the units are not compatible.
+    """
+
+    source = get_unit_conversion(quantity.units)
+    target = get_unit_conversion(unit)
+    if source is None or target is None or source.dimensions != target.dimensions:
+        # Let pint deal with special units and raise the error for incompatible ones.
+        return quantity.to_unit(unit).magnitude
+    return quantity.magnitude * (source.factor / target.factor)
+
+
+# The conversion of a unit is computed the first time it is needed, since computing it
+# for all the units that can be written in expressions slows down the import.
+_CONVERSIONS: dict[Unit, Optional[UnitConversion]] = {}
@@ -147,7 +147,11 @@ UndefinedUnitError = pint.UndefinedUnitError
 
 DimensionalityError = pint.DimensionalityError
 Dimensionless = NewType("Dimensionless", BaseUnit)
-dimensionless = Dimensionless(BaseUnit(Unit("dimensionless")))
+# Units must be created from the registry to be combined with the units of quantities.
+# The registry creates instances of Unit, but pint annotates them with its own type.
+dimensionless = Dimensionless(
+    BaseUnit(ureg.Unit("dimensionless"))  # pyright: ignore[reportArgumentType]
+)
 
 TIME_UNITS = {"s", "ms", "µs", "us", "ns"}
 
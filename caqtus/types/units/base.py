@@ -14,6 +14,7 @@ from typing import overload, Optional
 
 from typing_extensions import TypeIs
 
+from ._conversion import magnitude_in_base_units, magnitude_in_unit
 from ._units import (
     Unit,
     BaseUnit,
@@ -22,6 +23,14 @@ from ._units import (
     Magnitude,
 )
 
+__all__ = [
+    "is_in_base_units",
+    "is_base_quantity",
+    "convert_to_base_units",
+    "magnitude_in_base_units",
+    "magnitude_in_unit",
+]
+
 
 def is_in_base_units(units: Unit) -> TypeIs[BaseUnit]:
     """Check if the units is only expressed in terms of base SI units.
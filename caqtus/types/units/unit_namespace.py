@@ -1,7 +1,38 @@
-from collections.abc import Mapping
+from collections.abc import Iterable, Iterator, Mapping
 
 from ._units import UNITS, Unit, ureg
 
-# TODO: Some tests fail when trying to replace `getattr(ureg, unit)` with `Unit(unit)`.
-#  To check.
-units: Mapping[str, Unit] = {unit: getattr(ureg, unit) for unit in UNITS}
+
+class _UnitNamespace(Mapping[str, Unit]):
+    """Maps the names of the units that can be used in expressions to their units.
+
+    A unit is only fetched from the registry when it is first accessed, because
+    fetching all of them makes importing this module noticeably slower.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._names = frozenset(names)
+        self._units: dict[str, Unit] = {}
+
+    def __getitem__(self, name: str) -> Unit:
+        try:
+            return self._units[name]
+        except KeyError:
+            if name not in self._names:
+                raise
+        # TODO: Some tests fail when trying to replace `getattr(ureg, unit)` with
+        #  `Unit(unit)`. To check.
+        unit = self._units[name] = getattr(ureg, name)
+        return unit
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+units: Mapping[str, Unit] = _UnitNamespace(UNITS)
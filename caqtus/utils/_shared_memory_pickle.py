@@ -0,0 +1,144 @@
+"""Transfer of pickled objects between processes through shared memory.
+
+Objects are pickled with protocol 5, and their large buffers, like the arrays of
+numpy-backed objects, are placed out-of-band in a single shared memory block instead of
+being copied in the pickled bytes.
+The receiving process maps the block and reconstructs the arrays directly on top of it.
+
+The block stays registered with the resource tracker of the multiprocessing module
+until the receiving process unlinks it.
+Worker processes share the resource tracker of the process that started them, so a
+block that is never loaded, for example because the worker was terminated, is released
+when the main process exits.
+
+On Windows, a shared memory block is destroyed when its last handle is closed, so it
+can't outlive the process that created it and objects are always pickled in-band.
+"""
+
+from __future__ import annotations
+
+import pickle
+import sys
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Optional
+
+import attrs
+
+# Buffers smaller than this are pickled in-band, since the overhead of placing them in
+# shared memory is larger than the cost of copying them.
+MIN_SHARED_BUFFER_SIZE = 2**16
+
+# Buffers are aligned in the shared memory block, so that arrays created on top of them
+# are aligned for any dtype.
+_ALIGNMENT = 64
+
+
+@attrs.frozen
+class SharedMemoryPickle:
+    """An object pickled with its large buffers in shared memory.
+
+    Use :func:`dump_to_shared_memory` to create an instance of this class, and
+    :func:`load_from_shared_memory` to retrieve the object in another process.
+    An instance must be loaded exactly once, since loading it releases the shared
+    memory block.
+
+    Attributes:
+        payload: The pickled object, without its out-of-band buffers.
+        shared_memory_name: The name of the shared memory block holding the buffers, or
+            None if there are no out-of-band buffers.
+        buffer_bounds: The start and stop offsets of each out-of-band buffer in the
+            shared memory block.
+    """
+
+    payload: bytes
+    shared_memory_name: Optional[str]
+    buffer_bounds: tuple[tuple[int, int], ...]
+
+
+def dump_to_shared_memory(obj: Any) -> SharedMemoryPickle:
+    """Pickles an object and places its large buffers in shared memory.
+
+    The shared memory block is not released by the calling process, so that the
+    returned object can be sent to another process that will load it.
+    On Windows, the buffers are always pickled in-band.
+    """
+
+    if sys.platform == "win32":
+        return SharedMemoryPickle(pickle.dumps(obj, protocol=5), None, ())
+
+    buffers: list[pickle.PickleBuffer] = []
+
+    def buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+        # Returning True means that the buffer is serialized in-band.
+        if buffer.raw().nbytes < MIN_SHARED_BUFFER_SIZE:
+            return True
+        buffers.append(buffer)
+        return False
+
+    payload = pickle.dumps(obj, protocol=5, buffer_callback=buffer_callback)
+    if not buffers:
+        return SharedMemoryPickle(payload, None, ())
+
+    bounds = []
+    offset = 0
+    for buffer in buffers:
+        start = _align(offset)
+        offset = start + buffer.raw().nbytes
+        bounds.append((start, offset))
+
+    shared_memory = SharedMemory(create=True, size=offset)
+    try:
+        assert shared_memory.buf is not None
+        for buffer, (start, stop) in zip(buffers, bounds, strict=True):
+            shared_memory.buf[start:stop] = buffer.raw()
+            buffer.release()
+        name = shared_memory.name
+    except BaseException:
+        shared_memory.close()
+        shared_memory.unlink()
+        raise
+    shared_memory.close()
+    return SharedMemoryPickle(payload, name, tuple(bounds))
+
+
+def load_from_shared_memory(pickled: SharedMemoryPickle) -> Any:
+    """Reconstructs an object pickled with :func:`dump_to_shared_memory`.
+
+    The arrays of the object are not copied and use the shared memory block directly.
+    The block is released when all the arrays that use it are garbage collected.
+    """
+
+    if pickled.shared_memory_name is None:
+        return pickle.loads(pickled.payload)
+
+    shared_memory = SharedMemory(name=pickled.shared_memory_name)
+    # Only this process uses the block, so it can be unlinked right away, which also
+    # removes it from the resource tracker.
+    # The memory stays mapped until it is closed.
+    shared_memory.unlink()
+    view = memoryview(_SharedMemoryOwner(shared_memory))
+    buffers = [view[start:stop] for start, stop in pickled.buffer_bounds]
+    return pickle.loads(pickled.payload, buffers=buffers)
+
+
+class _SharedMemoryOwner:
+    """Closes a shared memory block once no buffer uses it anymore.
+
+    Buffers obtained from this object keep it alive, so the block is closed only
+    after all arrays created on top of it have been garbage collected.
+    """
+
+    def __init__(self, shared_memory: SharedMemory) -> None:
+        self._shared_memory = shared_memory
+
+    def __buffer__(self, flags: int) -> memoryview:
+        buffer = self._shared_memory.buf
+        assert buffer is not None
+        return buffer
+
+    def __del__(self) -> None:
+        self._shared_memory.close()
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
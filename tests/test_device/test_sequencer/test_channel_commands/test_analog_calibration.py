@@ -12,6 +12,8 @@ from caqtus.shot_compilation.timed_instructions import (
     Ramp,
     create_ramp,
     Pattern,
+    create_piecewise_linear,
+    PiecewiseLinear,
 )
 from ..test_instructions import analog_instruction, pattern, ramp_strategy
 
@@ -147,3 +149,13 @@ def test_calibration_apply(
     cal: DimensionlessCalibration, instr: TimedInstruction[np.floating]
 ):
     validate_calibration(cal, instr)
+
+
+def test_calibration_on_piecewise_linear():
+    cal = DimensionlessCalibration([(0.0, 0.0), (1.0, 2.0), (2.0, 0.0)])
+    instr = create_piecewise_linear([0.0, 2.0, 1.5], [2.0, 2.0, 0.0], [10, 5, 7])
+
+    result = cal.apply(instr)
+
+    assert isinstance(result, PiecewiseLinear)
+    validate_calibration(cal, instr)
@@ -4,6 +4,12 @@ import numpy as np
 from pytest import approx, raises
 
 from caqtus.device.sequencer.timing import to_time_step, ns
+from caqtus.shot_compilation.lane_compilation import (
+    _block_cache,
+    _compile_analog_lane,
+    clear_block_cache,
+    get_block_cache_info,
+)
 from caqtus.shot_compilation.lane_compilation._compile_analog_lane import (
     compile_analog_lane,
     evaluate_constant_expression,
@@ -11,7 +17,14 @@ from caqtus.shot_compilation.lane_compilation._compile_analog_lane import (
     ConstantBlockResult,
     TimeDependentBlockResult,
 )
-from caqtus.shot_compilation.timed_instructions import Pattern, create_ramp
+from caqtus.shot_compilation.lane_compilation._numpy_expression import (
+    compile_time_expression,
+)
+from caqtus.shot_compilation.timed_instructions import (
+    Pattern,
+    create_ramp,
+    PiecewiseLinear,
+)
 from caqtus.shot_compilation.timing import to_time, get_step_bounds, Time
 from caqtus.types.expression import Expression
 from caqtus.types.recoverable_exceptions import InvalidValueError, InvalidTypeError
@@ -23,6 +36,7 @@ from caqtus.types.units import (
     SECOND,
     dimensionless,
     BaseUnit,
+    Quantity,
 )
 
 
@@ -155,6 +169,26 @@ def test_ramp_2():
     assert result.units == Unit("V")
 
 
+def test_consecutive_ramps_are_piecewise_linear():
+    lane = AnalogTimeLane(
+        [Expression("0"), Ramp(), Expression("10"), Ramp(), Expression("5")]
+    )
+    result = compile_analog_lane(
+        lane, {}, into_bounds([1e-8, 2e-8, 3e-8, 2e-8, 1e-8]), into_time(10)
+    )
+    expected = (
+        Pattern([0.0]) * 1
+        + create_ramp(0, 10, 2)
+        + Pattern([10.0]) * 3
+        + create_ramp(10, 5, 2)
+        + Pattern([5.0]) * 1
+    )
+
+    assert isinstance(result.values, PiecewiseLinear)
+    assert result.values.number_segments == 5
+    assert result.values == approx(expected)
+
+
 def test_logarithmic_ramp():
     lane = AnalogTimeLane([Expression("0 dB"), Ramp(), Expression("10 dB")])
     result = compile_analog_lane(
@@ -242,3 +276,87 @@ def test_invalid_ramp_3():
         compile_analog_lane(
             lane, {}, into_bounds([10e-9, 10e-9, 10e-9, 10e-9]), into_time(1)
         )
+
+
+def test_compiled_time_dependent_expression_matches_pint(monkeypatch):
+    variables = {
+        "tau": Quantity(2.0, "ms"),
+        "a": 3.0,
+        "f": Quantity(5.0, "MHz"),
+    }
+    bodies = [
+        "10 V * exp(-t / tau)",
+        "a * t / (1 ms)",
+        "sin(2 * pi * f * t) * 1 mW",
+        "sqrt(t / tau) + a",
+        "a * t**2 * V / s**2",
+    ]
+    times = (to_time(0.1e-3), to_time(1e-3), into_time(30))
+    results = []
+    for body in bodies:
+        expression = Expression(body)
+        assert compile_time_expression(expression, variables) is not None, body
+        results.append(
+            evaluate_time_dependent_expression(expression, variables, *times)
+        )
+
+    monkeypatch.setattr(
+        _compile_analog_lane, "compile_time_expression", lambda *args: None
+    )
+    for body, result in zip(bodies, results, strict=True):
+        reference = evaluate_time_dependent_expression(
+            Expression(body), variables, *times
+        )
+        assert result.unit == reference.unit, body
+        assert result.initial_value == approx(reference.initial_value), body
+        assert result.final_value == approx(reference.final_value), body
+        assert result.values == approx(reference.values), body
+
+
+def test_time_dependent_expression_not_compiled():
+    variables = {"p": Quantity(3.0, "dBm")}
+    for body in ["floor(t / ms)", "p * t / s", "t + 1", "(-8) ** 0.5 * t / s"]:
+        assert compile_time_expression(Expression(body), variables) is None, body
+
+
+def test_compiled_time_dependent_expression_error():
+    expression = Expression("t + 1")
+
+    with raises(RecoverableException):
+        evaluate_time_dependent_expression(
+            expression, {}, to_time(0), to_time(10e-9), into_time(1)
+        )
+
+
+def test_unchanged_blocks_are_reused():
+    lane = AnalogTimeLane(
+        [Expression("a * 1 V"), Ramp(), Expression("b * 1 V * t / us")]
+    )
+    bounds = into_bounds([1e-6, 1e-6, 1e-6])
+    clear_block_cache()
+
+    compile_analog_lane(lane, {"a": 1.0, "b": 2.0}, bounds, into_time(100))
+    result = compile_analog_lane(lane, {"a": 1.0, "b": 3.0}, bounds, into_time(100))
+
+    # Only the last block uses the parameter that changed.
+    info = get_block_cache_info()
+    assert (info.hits, info.misses) == (2, 4)
+    clear_block_cache()
+    expected = compile_analog_lane(lane, {"a": 1.0, "b": 3.0}, bounds, into_time(100))
+    assert result == expected
+
+
+def test_block_cache_is_bounded_by_bytes(monkeypatch):
+    cache = _block_cache._BlockCache(maxsize=1024, maxbytes=1000)
+    monkeypatch.setattr(_block_cache, "_block_cache", cache)
+
+    for key in range(3):
+        _block_cache.reuse_compiled_value(key, lambda: np.zeros(50))
+    # Each array takes 400 bytes, so only the last two are kept.
+    info = get_block_cache_info()
+    assert (info.currsize, info.currbytes) == (2, 800)
+
+    _block_cache.reuse_compiled_value("large", lambda: np.zeros(200))
+    # Blocks larger than the cache are not kept at all.
+    assert get_block_cache_info().currsize == 2
+    assert get_block_cache_info().currbytes == 800
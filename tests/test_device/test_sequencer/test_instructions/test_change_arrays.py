@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from hypothesis import given
+
+from caqtus.shot_compilation.timed_instructions import (
+    Pattern,
+    create_ramp,
+    convert_to_change_arrays,
+    with_name,
+)
+from .instruction_strategy import digital_instruction, analog_instruction
+
+
+def expected_change_arrays(instr):
+    array = instr.to_pattern().array
+    indices = np.concatenate([[0], np.flatnonzero(array[1:] != array[:-1]) + 1])
+    return (
+        np.concatenate([indices, [len(array)]]),
+        np.concatenate([array[indices], [array[-1]]]),
+    )
+
+
+@given(digital_instruction(max_leaves=10, max_length=10_000))
+def test_digital(instr):
+    times, values = convert_to_change_arrays(instr)
+    expected_times, expected_values = expected_change_arrays(instr)
+    assert np.array_equal(times, expected_times)
+    assert np.array_equal(values, expected_values)
+
+
+@given(analog_instruction(max_leaves=10, max_length=10_000))
+def test_analog(instr):
+    times, values = convert_to_change_arrays(instr)
+    expected_times, expected_values = expected_change_arrays(instr)
+    assert np.array_equal(times, expected_times)
+    assert np.array_equal(values, expected_values)
+
+
+def test_repeated_pulses():
+    pulse = Pattern([True]) * 50 + Pattern([False]) * 50
+    instr = 1_000_000 * pulse + Pattern([False]) * 30
+
+    times, values = convert_to_change_arrays(instr)
+
+    assert len(times) == 2_000_001
+    assert times[:4].tolist() == [0, 50, 100, 150]
+    assert times[-2:].tolist() == [99_999_950, 100_000_030]
+    assert values[-2:].tolist() == [False, False]
+
+
+def test_ramp():
+    instr = with_name(Pattern([0.0]) * 2 + create_ramp(0.0, 1.0, 4), "a")
+    times, values = convert_to_change_arrays(instr)
+    assert times.tolist() == [0, 3, 4, 5, 6]
+    assert values["a"].tolist() == [0.0, 0.25, 0.5, 0.75, 0.75]
+
+
+def test_empty():
+    with pytest.raises(ValueError):
+        convert_to_change_arrays(Pattern([]))
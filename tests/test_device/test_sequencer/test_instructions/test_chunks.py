@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from hypothesis import given
+from hypothesis.strategies import integers
+
+from caqtus.shot_compilation.timed_instructions import Pattern, create_ramp, with_name
+from .instruction_strategy import analog_instruction, digital_instruction
+
+
+@given(
+    digital_instruction(max_leaves=10, max_length=10_000),
+    integers(min_value=1, max_value=100),
+)
+def test_chunks_digital(instr, chunk_size):
+    chunks = list(instr.iter_chunks(chunk_size))
+    assert all(len(chunk) == chunk_size for chunk in chunks[:-1])
+    assert np.array_equal(np.concatenate(chunks), instr.to_pattern().array)
+
+
+@given(
+    analog_instruction(max_leaves=10, max_length=10_000),
+    integers(min_value=1, max_value=100),
+)
+def test_chunks_analog(instr, chunk_size):
+    chunks = list(instr.iter_chunks(chunk_size))
+    assert np.array_equal(np.concatenate(chunks), instr.to_pattern().array)
+
+
+def test_chunks_ramp():
+    instr = with_name((create_ramp(0.0, 1.0, 17) + Pattern([2.0]) * 5) * 3, "a")
+    chunks = list(instr.iter_chunks(7))
+    assert np.array_equal(np.concatenate(chunks), instr.to_pattern().array)
+
+
+def test_copy_to():
+    instr = Pattern([0, 1, 2]) * 1000
+    out = np.empty(5, dtype=instr.dtype)
+    instr.copy_to(out, start=1)
+    assert out.tolist() == [1, 2, 0, 1, 2]
+
+
+def test_copy_to_out_of_bounds():
+    instr = Pattern([0, 1, 2]) * 2
+    with pytest.raises(ValueError):
+        instr.copy_to(np.empty(5, dtype=instr.dtype), start=2)
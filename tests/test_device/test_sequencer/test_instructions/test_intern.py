@@ -0,0 +1,81 @@
+import pickle
+
+import numpy as np
+from hypothesis import given
+
+from caqtus.shot_compilation.timed_instructions import (
+    Pattern,
+    create_ramp,
+    intern_instruction,
+    InternTable,
+)
+from caqtus.shot_compilation.timed_instructions._intern import MAX_INTERNED_LEAF_BYTES
+from .instruction_strategy import analog_instruction
+
+
+def test_equal_patterns_have_same_hash():
+    a = Pattern([0.0, 1.0, 2.0])
+    b = Pattern([-0.0, 1.0, 2.0])
+    assert a == b
+    assert hash(a) == hash(b)
+
+
+def test_interning_keeps_dtype():
+    table = InternTable()
+    a = table.intern(Pattern([0, 1], dtype=np.int32))
+    b = table.intern(Pattern([0, 1], dtype=np.int64))
+    assert a == b
+    assert a.dtype == np.int32
+    assert b.dtype == np.int64
+
+
+def test_equal_sub_instructions_are_shared():
+    a = Pattern([True]) * 50 + Pattern([False]) * 50
+    b = Pattern([True]) * 50 + Pattern([False]) * 50
+
+    interned_a = intern_instruction(a)
+    interned_b = intern_instruction(b)
+    assert interned_a is interned_b
+    assert interned_a == a
+
+
+def test_intern_ramp():
+    table = InternTable()
+    a = table.intern(create_ramp(0.0, 1.0, 10) + Pattern([1.0]))
+    b = table.intern(create_ramp(0.0, 1.0, 10) + Pattern([1.0]))
+    assert a is b
+    assert table.hits == 3
+
+
+def test_structural_metadata():
+    instr = (Pattern([1.0, 2.0]) + create_ramp(0, 1, 10)) * 3
+    assert instr.depth == 3
+    assert instr.node_count == 4
+    assert instr.nbytes == 2 * 8 + 2 * 8
+
+
+@given(analog_instruction())
+def test_hash_survives_pickling(instr):
+    unpickled = pickle.loads(pickle.dumps(instr))
+    assert unpickled == instr
+    assert hash(unpickled) == hash(instr)
+
+
+def test_dense_leaves_are_not_hashed():
+    table = InternTable()
+    dense = Pattern(np.arange(MAX_INTERNED_LEAF_BYTES, dtype=np.float64))
+    instruction = Pattern([1.0]) * 10 + dense
+
+    interned = table.intern(instruction)
+
+    assert interned == instruction
+    assert dense._hash is None
+    assert table.intern(Pattern([1.0]) * 10) is interned.instructions[0]
+
+
+def test_equality_does_not_compute_hashes():
+    a = Pattern(np.arange(100.0))
+    b = Pattern(np.arange(100.0))
+
+    assert a == b
+    assert a._hash is None and b._hash is None
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from caqtus.shot_compilation.timed_instructions import (
+    Pattern,
+    Ramp,
+    create_ramp,
+    defer,
+)
+
+
+def test_fused_operations_on_pattern():
+    instr = (Pattern([1.0, 2.0]) * 3 + Pattern(np.arange(50_000, dtype=float))) * 2
+
+    result = defer(instr).multiply(2.0).add(1.0).negate().evaluate()
+
+    expected = -(instr.to_pattern().array * 2.0 + 1.0)
+    assert np.array_equal(result.to_pattern().array, expected)
+    assert result.depth == instr.depth
+
+
+def test_ramp_stays_ramp():
+    instr = create_ramp(0.0, 1.0, 10)
+
+    result = defer(instr).multiply(3.0).add(1.0).evaluate()
+
+    assert isinstance(result, Ramp)
+    assert result == create_ramp(1.0, 4.0, 10)
+
+
+def test_ramp_to_structured_type():
+    dtype = np.dtype([("a", np.float64)])
+    result = defer(create_ramp(0.0, 1.0, 10)).add(1.0).as_type(dtype).evaluate()
+
+    assert isinstance(result, Ramp)
+    assert result["a"] == create_ramp(1.0, 2.0, 10)
+
+
+def test_apply_on_ramp():
+    result = defer(create_ramp(0.0, 1.0, 4)).apply(np.square).evaluate()
+    assert result == Pattern([0.0, 0.0625, 0.25, 0.5625])
+
+
+def test_overflow():
+    with pytest.raises(ValueError):
+        defer(Pattern([1e308])).multiply(10.0).evaluate()
+
+
+def test_overflow_in_narrowing_conversion():
+    instr = defer(Pattern([1e300, 1.0])).as_type(np.dtype(np.float32))
+
+    with pytest.raises(ValueError):
+        instr.as_type(np.dtype(np.float64)).evaluate()
+
+
+def test_digital_conversion():
+    dtype = np.dtype([("ch 0", np.bool_)])
+    instr = Pattern([True, False]) * 5
+
+    result = defer(instr).as_type(np.dtype(np.bool_)).as_type(dtype).evaluate()
+
+    assert result["ch 0"] == instr
@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+from hypothesis import given
+from hypothesis.strategies import lists
+
+from caqtus.shot_compilation.timed_instructions import (
+    Pattern,
+    pack_digital,
+    pack_instruction,
+    stack_digital,
+    stack_instructions,
+    word_dtype,
+    with_name,
+    combine_instructions,
+)
+from .instruction_strategy import digital_instruction
+
+
+def test_pack_and_unpack():
+    a = Pattern([True, False]) * 3 + Pattern([False]) * 4
+    b = Pattern([False, True, True]) * 2 + Pattern([True, False, True, False])
+
+    packed = pack_digital(a=a, b=b)
+
+    assert packed.channels == ("a", "b")
+    assert packed.words.dtype == np.uint8
+    assert packed["a"].to_pattern() == a.to_pattern()
+    assert packed["b"].to_pattern() == b.to_pattern()
+    assert packed.unpack() == stack_instructions(with_name(a, "a"), with_name(b, "b"))
+
+
+def test_pack_preserves_repetitions():
+    a = Pattern([True, False]) * 1_000_000
+    b = Pattern([True, True, False, False]) * 500_000
+
+    packed = pack_digital(a=a, b=b)
+
+    assert packed.words.nbytes <= 4
+    assert packed["a"].to_pattern() == a.to_pattern()
+    assert packed["b"].to_pattern() == b.to_pattern()
+
+
+def test_pack_64_channels():
+    channels = {
+        f"ch {i}": Pattern([bool((i >> j) & 1) for j in range(6)]) for i in range(64)
+    }
+
+    packed = pack_digital(**channels)
+
+    assert packed.words.dtype == np.uint64
+    assert packed.words.to_pattern().array.tolist() == [
+        sum(1 << i for i in range(64) if (i >> j) & 1) for j in range(6)
+    ]
+    for name, instruction in channels.items():
+        assert packed[name] == instruction
+    assert ~packed == pack_digital(
+        **{name: instruction.apply(np.invert) for name, instruction in channels.items()}
+    )
+
+
+def test_word_dtype():
+    assert word_dtype(1) == np.uint8
+    assert word_dtype(8) == np.uint8
+    assert word_dtype(9) == np.uint16
+    assert word_dtype(33) == np.uint64
+    with pytest.raises(ValueError):
+        word_dtype(65)
+
+
+def test_too_many_channels():
+    with pytest.raises(ValueError):
+        pack_digital(**{f"ch {i}": Pattern([True]) for i in range(65)})
+
+
+def test_stack_duplicate_channels():
+    packed = pack_digital(a=Pattern([True]))
+    with pytest.raises(ValueError):
+        packed.stack(packed)
+
+
+def test_bitwise_operations():
+    a = pack_digital(x=Pattern([True, True, False, False]), y=Pattern([True] * 4))
+    b = pack_digital(x=Pattern([True, False]) * 2, y=Pattern([False] * 4))
+
+    assert (a & b)["x"] == Pattern([True, False, False, False])
+    assert (a | b)["x"] == Pattern([True, True, True, False])
+    assert (a ^ b)["y"] == Pattern([True] * 4)
+    assert (~a)["x"] == Pattern([False, False, True, True])
+
+
+@given(
+    lists(digital_instruction(max_leaves=10, max_length=1_000), min_size=1, max_size=8)
+)
+def test_pack_instruction_round_trip(instructions):
+    length = min(len(instruction) for instruction in instructions)
+    named = [
+        with_name(instruction[:length], f"ch {i}")
+        for i, instruction in enumerate(instructions)
+    ]
+    stacked = stack_instructions(*named)
+
+    assert pack_instruction(stacked).unpack() == stacked
+
+
+def test_combine_instructions():
+    a = Pattern([True, False]) * 3
+    b = Pattern([True, True, False]) * 2
+
+    result = combine_instructions(a, b, np.bitwise_and)
+
+    assert result == Pattern([True, False, False, False, True, False])
+
+
+@pytest.mark.parametrize("number_channels", [3, 16, 70])
+def test_stack_digital(number_channels):
+    rng = np.random.default_rng(0)
+    channels = {
+        # Dense channels are stacked through packed words.
+        f"ch {i}": Pattern(rng.integers(0, 2, 10_000).astype(bool))
+        for i in range(number_channels // 2)
+    } | {
+        f"ch {i}": Pattern([True, False]) * 2_000 + Pattern([False]) * 6_000
+        for i in range(number_channels // 2, number_channels)
+    }
+
+    stacked = stack_digital(**channels)
+
+    expected = stack_instructions(
+        *(with_name(instruction, name) for name, instruction in channels.items())
+    )
+    assert stacked.dtype == expected.dtype
+    assert stacked.to_pattern() == expected.to_pattern()
+
+
+def test_stack_digital_rejects_analog_channels():
+    with pytest.raises(TypeError):
+        stack_digital(a=Pattern([True]), b=Pattern([1.0]))
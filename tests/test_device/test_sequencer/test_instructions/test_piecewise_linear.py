@@ -0,0 +1,211 @@
+import pickle
+
+import numpy as np
+import pytest
+from hypothesis import given
+from hypothesis.strategies import integers, lists, tuples, floats
+
+from caqtus.shot_compilation.timed_instructions import (
+    Pattern,
+    PiecewiseLinear,
+    Ramp,
+    concatenate,
+    convert_to_change_arrays,
+    create_piecewise_linear,
+    create_ramp,
+    defer,
+    merge_instructions,
+)
+
+segments = lists(
+    tuples(
+        floats(allow_nan=False, allow_infinity=False, min_value=-1e6, max_value=1e6),
+        floats(allow_nan=False, allow_infinity=False, min_value=-1e6, max_value=1e6),
+        integers(min_value=1, max_value=100),
+    ),
+    min_size=1,
+    max_size=20,
+)
+
+
+def as_ramps(starts, stops, lengths):
+    return concatenate(
+        *(
+            create_ramp(start, stop, length)
+            for start, stop, length in zip(starts, stops, lengths, strict=True)
+        )
+    )
+
+
+@given(segments)
+def test_same_values_as_ramps(segments):
+    starts, stops, lengths = zip(*segments, strict=True)
+    instruction = create_piecewise_linear(starts, stops, lengths)
+
+    assert isinstance(instruction, PiecewiseLinear)
+    assert np.array_equal(
+        instruction.to_pattern().array,
+        as_ramps(starts, stops, lengths).to_pattern().array,
+    )
+
+
+@given(segments, integers(min_value=0), integers(min_value=0))
+def test_slicing(segments, start, stop):
+    starts, stops, lengths = zip(*segments, strict=True)
+    instruction = create_piecewise_linear(starts, stops, lengths)
+    start = start % (len(instruction) + 1)
+    stop = stop % (len(instruction) + 1)
+
+    sliced = instruction[start:stop]
+
+    assert len(sliced) == len(instruction.to_pattern().array[start:stop])
+    assert np.allclose(
+        sliced.to_pattern().array, instruction.to_pattern().array[start:stop]
+    )
+
+
+def test_indexing():
+    instruction = create_piecewise_linear([0.0, 1.0], [1.0, 3.0], [4, 2])
+
+    assert instruction[2] == 0.5
+    assert instruction[5] == 2.0
+    assert instruction[-1] == 2.0
+    with pytest.raises(IndexError):
+        instruction[6]
+
+
+def test_zero_length_segments_are_ignored():
+    instruction = create_piecewise_linear([0.0, 5.0, 1.0], [1.0, 5.0, 0.0], [2, 0, 2])
+
+    assert instruction.number_segments == 2
+    assert len(instruction) == 4
+
+
+def test_empty():
+    assert create_piecewise_linear([], [], []) == Pattern([], dtype=np.float64)
+
+
+def test_non_finite_values():
+    with pytest.raises(ValueError):
+        create_piecewise_linear([0.0], [np.inf], [2])
+
+
+def test_concatenation_merges_segments():
+    instruction = create_piecewise_linear([0.0, 1.0], [1.0, 1.0], [2, 3])
+
+    result = instruction + create_ramp(1.0, 0.0, 4) + instruction
+
+    assert isinstance(result, PiecewiseLinear)
+    assert result.number_segments == 5
+    assert len(result) == 14
+
+
+def test_concatenation_of_ramps_is_unchanged():
+    result = create_ramp(0.0, 1.0, 2) + create_ramp(1.0, 0.0, 2)
+
+    assert not isinstance(result, PiecewiseLinear)
+
+
+def test_affine_map_keeps_segments():
+    instruction = create_piecewise_linear([0.0, 1.0], [1.0, 3.0], [4, 2])
+
+    result = defer(instruction).multiply(2.0).add(1.0).evaluate()
+
+    assert result == create_piecewise_linear([1.0, 3.0], [3.0, 7.0], [4, 2])
+
+
+def test_stack_with_different_bounds():
+    a = create_piecewise_linear([0.0, 1.0], [1.0, 3.0], [4, 2])
+    b = create_piecewise_linear([5.0, 5.0, 0.0], [5.0, 0.0, 0.0], [1, 2, 3])
+
+    merged = merge_instructions(a=a, b=b)
+
+    assert isinstance(merged, PiecewiseLinear)
+    assert merged.number_segments == 4
+    assert np.allclose(merged["a"].to_pattern().array, a.to_pattern().array)
+    assert np.allclose(merged["b"].to_pattern().array, b.to_pattern().array)
+
+
+def test_stack_with_constant():
+    a = create_piecewise_linear([0.0, 1.0], [1.0, 3.0], [4, 2])
+
+    merged = merge_instructions(a=a, b=Pattern([2.0]) * 6)
+
+    assert isinstance(merged, PiecewiseLinear)
+    assert merged["b"].to_pattern() == (Pattern([2.0]) * 6).to_pattern()
+
+
+def test_stack_with_other_structure():
+    a = create_piecewise_linear([0.0, 1.0], [1.0, 3.0], [4, 2])
+    b = Pattern([True, False]) * 3
+
+    merged = merge_instructions(a=a, b=b)
+
+    assert np.allclose(merged["a"].to_pattern().array, a.to_pattern().array)
+    assert merged["b"].to_pattern() == b.to_pattern()
+
+
+def test_stack_with_concatenated_ramps():
+    a = create_piecewise_linear([0.0, 1.0], [1.0, 3.0], [4, 2])
+    b = create_ramp(0.0, 1.0, 3) + Pattern([2.0]) * 3
+
+    merged = merge_instructions(a=a, b=b)
+
+    assert isinstance(merged, PiecewiseLinear)
+    assert np.allclose(merged["a"].to_pattern().array, a.to_pattern().array)
+    assert np.allclose(merged["b"].to_pattern().array, b.to_pattern().array)
+
+
+def test_stack_with_pulse_train():
+    a = create_piecewise_linear([0.0, 1.0], [1.0, 3.0], [3000, 1000])
+    train = (Pattern([1.0]) * 10 + Pattern([0.0]) * 10) * 200
+
+    merged = merge_instructions(a=a, b=train)
+
+    # The train is tiled into segments instead of being expanded.
+    assert isinstance(merged, PiecewiseLinear)
+    assert merged.number_segments == 2 * train.repetitions
+    assert np.allclose(merged["a"].to_pattern().array, a.to_pattern().array)
+    assert merged["b"].to_pattern() == train.to_pattern()
+
+
+def test_stack_with_concatenated_pattern():
+    a = create_piecewise_linear([0.0, 1.0], [1.0, 3.0], [4000, 2000])
+    b = Pattern(np.linspace(0.0, 1.0, 3000) ** 2) + create_ramp(1.0, 0.0, 3000)
+
+    merged = merge_instructions(a=a, b=b)
+
+    # The piecewise linear instruction is sliced along the concatenation.
+    assert isinstance(merged, type(b))
+    assert isinstance(merged.instructions[1], PiecewiseLinear)
+    assert np.allclose(merged["a"].to_pattern().array, a.to_pattern().array)
+    assert np.allclose(merged["b"].to_pattern().array, b.to_pattern().array)
+
+
+def test_change_arrays():
+    instruction = create_piecewise_linear([0.0, 1.0, 1.0], [1.0, 1.0, 0.0], [2, 3, 2])
+
+    times, values = convert_to_change_arrays(instruction)
+    expected_times, expected_values = convert_to_change_arrays(instruction.to_pattern())
+
+    assert np.array_equal(times, expected_times)
+    assert np.array_equal(values, expected_values)
+
+
+def test_to_ramps():
+    instruction = create_piecewise_linear([0.0, 1.0], [1.0, 3.0], [4, 2])
+
+    ramps = instruction.to_ramps()
+
+    assert all(isinstance(ramp, Ramp) for ramp in ramps.instructions)
+    assert ramps.to_pattern() == instruction.to_pattern()
+
+
+def test_pickle_size():
+    starts = np.arange(200, dtype=float)
+    instruction = create_piecewise_linear(starts, starts + 1, [10] * 200)
+
+    pickled = pickle.dumps(instruction)
+
+    assert pickle.loads(pickled) == instruction
+    assert len(pickled) < len(pickle.dumps(instruction.to_ramps())) / 2
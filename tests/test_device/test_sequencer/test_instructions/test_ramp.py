@@ -1,7 +1,9 @@
+import numpy as np
 import pytest
 
 from caqtus.shot_compilation.timed_instructions import (
     Pattern,
+    PiecewiseLinear,
     with_name,
     create_ramp,
     merge_instructions,
@@ -49,3 +51,43 @@ def test_3():
     merged = merge_instructions(a=r, b=pattern)
 
     assert merged["a"] == create_ramp(0.0, 0.6, 3) + create_ramp(0.6, 1.0, 2)
+
+
+def test_merge_ramp_with_pulse_train():
+    pulse = Pattern([1.0]) * 50 + Pattern([0.0]) * 50
+    train = pulse * 1000
+    r = create_ramp(0.0, 1.0, len(train))
+
+    merged = merge_instructions(a=r, b=train)
+
+    # The pulse train must not be expanded into a pattern.
+    assert merged.nbytes < len(train)
+    assert np.allclose(merged["a"].to_pattern().array, r.to_pattern().array)
+    assert merged["b"].to_pattern() == train.to_pattern()
+
+
+def test_merge_ramp_with_repeated_pattern():
+    train = Pattern([0.0, 1.0]) * 10**6
+    r = create_ramp(0.0, 1.0, len(train))
+
+    merged = merge_instructions(a=r, b=train)
+
+    # Splitting the ramp along the short blocks would create one piece per block,
+    # which takes more memory than a single pattern.
+    assert isinstance(merged, Pattern)
+    assert np.allclose(merged["a"].to_pattern().array, r.to_pattern().array)
+    assert merged["b"].to_pattern() == train.to_pattern()
+
+
+def test_merge_ramp_with_many_repetitions():
+    pulse = Pattern([1.0]) * 500 + Pattern([0.0]) * 500
+    train = pulse * 10**4
+    r = create_ramp(0.0, 1.0, len(train))
+
+    merged = merge_instructions(a=r, b=train)
+
+    # The train is converted to segments instead of being expanded.
+    assert isinstance(merged, PiecewiseLinear)
+    assert merged.nbytes < len(train)
+    assert np.allclose(merged["a"].to_pattern().array, r.to_pattern().array)
+    assert merged["b"].to_pattern() == train.to_pattern()
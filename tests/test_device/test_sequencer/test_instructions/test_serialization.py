@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from hypothesis import given
+
+from caqtus.shot_compilation.timed_instructions import (
+    Pattern,
+    create_ramp,
+    create_piecewise_linear,
+    decode_instruction,
+    encode_instruction,
+    merge_instructions,
+)
+from .instruction_strategy import analog_instruction, digital_instruction
+
+
+@given(analog_instruction(max_leaves=10))
+def test_analog_round_trip(instr):
+    assert decode_instruction(encode_instruction(instr)) == instr
+
+
+@given(digital_instruction(max_leaves=10))
+def test_digital_round_trip(instr):
+    assert decode_instruction(encode_instruction(instr)) == instr
+
+
+def test_ramps_round_trip():
+    instr = (
+        create_ramp(0, 1, 10) + create_piecewise_linear([0, 1], [1, 2], [5, 5])
+    ) * 3 + Pattern([4.0])
+    decoded = decode_instruction(encode_instruction(instr))
+    assert decoded == instr
+    assert decoded.to_pattern() == instr.to_pattern()
+
+
+def test_structured_round_trip():
+    instr = merge_instructions(
+        a=Pattern([True, False]) * 10, b=create_ramp(0, 1, 20).to_pattern()
+    )
+    decoded = decode_instruction(encode_instruction(instr))
+    assert decoded.dtype == instr.dtype
+    assert decoded == instr
+
+
+def test_decoding_does_not_copy_values():
+    instr = Pattern(np.arange(1000, dtype=np.float64)) * 5
+    encoded = encode_instruction(instr)
+    decoded = decode_instruction(encoded)
+    assert decoded.instruction.array.base is not None
+    assert not decoded.instruction.array.flags.writeable
+
+
+def test_shared_sub_instructions_are_encoded_once():
+    block = Pattern(np.arange(1000, dtype=np.float64))
+    shared = encode_instruction(block + create_ramp(0, 1, 10) + block)
+    single = encode_instruction(block + create_ramp(0, 1, 10))
+    assert len(shared) < len(single) + 100
+
+
+def test_invalid_data():
+    with pytest.raises(ValueError):
+        decode_instruction(b"not an instruction")
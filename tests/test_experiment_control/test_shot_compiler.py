@@ -0,0 +1,97 @@
+import contextlib
+
+import pytest
+
+from caqtus.experiment_control.sequence_execution import ShotCompilationConfig
+from caqtus.experiment_control.sequence_execution._shot_compiler import (
+    CompilationContext,
+    CompileWorkerPool,
+    ShotCompiler,
+    _create_shot_compiler,
+)
+from caqtus.experiment_control.sequence_execution._shot_primitives import (
+    ShotParameters,
+)
+from caqtus.shot_compilation import SequenceContext
+from caqtus.types._parameter_namespace import VariableNamespace
+from caqtus.types.expression import Expression
+from caqtus.types.parameter import ParameterSchema
+from caqtus.types.parameter._schema import Float
+from caqtus.types.recoverable_exceptions import EvaluationError
+from caqtus.types.timelane import TimeLanes
+from caqtus.types.units import Quantity
+from caqtus.types.variable_name import DottedVariableName
+
+schema = ParameterSchema(
+    _constant_schema={DottedVariableName("a"): Quantity(2.0, "ms")},
+    _variable_schema={DottedVariableName("x"): Float()},
+)
+
+time_lanes = TimeLanes(
+    step_names=["load", "wait"],
+    step_durations=[Expression("a"), Expression("x * 1 ms")],
+    lanes={},
+)
+
+
+@pytest.mark.parametrize("anyio_backend", ["trio"])
+async def test_shots_are_compiled_by_workers(anyio_backend):
+    with contextlib.closing(
+        ShotCompiler(SequenceContext({}, schema, time_lanes), {}, max_workers=2)
+    ) as shot_compiler:
+        for x in [1.0, 3.0, 5.0]:
+            parameters = VariableNamespace(
+                {"a": Quantity(2.0, "ms"), "x": x}  # pyright: ignore
+            )
+            result, duration = await shot_compiler.compile_shot(
+                ShotParameters(index=0, parameters=parameters)
+            )
+            assert result == {}
+            assert duration == pytest.approx(2e-3 + x * 1e-3)
+
+
+@pytest.mark.parametrize("anyio_backend", ["trio"])
+async def test_worker_error_is_raised(anyio_backend):
+    with contextlib.closing(
+        ShotCompiler(SequenceContext({}, schema, time_lanes), {}, max_workers=1)
+    ) as shot_compiler:
+        parameters = VariableNamespace({"a": Quantity(2.0, "ms")})  # pyright: ignore
+        with pytest.raises(EvaluationError):
+            await shot_compiler.compile_shot(
+                ShotParameters(index=0, parameters=parameters)
+            )
+
+
+@pytest.mark.parametrize("anyio_backend", ["trio"])
+async def test_workers_are_started_before_compiling(anyio_backend):
+    compilation_context = CompilationContext(
+        SequenceContext({}, schema, time_lanes), {}
+    )
+    with contextlib.closing(
+        CompileWorkerPool(compilation_context, max_workers=2, initial_workers=1)
+    ) as pool:
+        # noinspection PyProtectedMember
+        async with pool.reserve_worker():
+            assert all(future.done() for future in pool._warm_ups)
+            async with pool.reserve_worker():
+                assert pool._started_workers == 2
+                assert all(future.done() for future in pool._warm_ups)
+            async with pool.reserve_worker():
+                assert pool._started_workers == 2
+
+
+@pytest.mark.parametrize(
+    "config, started_workers, max_workers",
+    [
+        (ShotCompilationConfig(min_workers=1, max_workers=3), 1, 3),
+        (ShotCompilationConfig(min_workers=1, max_workers=3, adaptive=False), 3, 3),
+    ],
+)
+def test_workers_follow_compilation_config(config, started_workers, max_workers):
+    with contextlib.closing(
+        _create_shot_compiler(SequenceContext({}, schema, time_lanes), {}, config)
+    ) as shot_compiler:
+        # noinspection PyProtectedMember
+        pool = shot_compiler._worker_pool
+        assert pool._started_workers == started_workers
+        assert pool._max_workers == max_workers
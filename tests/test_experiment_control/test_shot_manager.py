@@ -6,6 +6,7 @@ from typing import Any, Never
 import anyio
 import anyio.lowlevel
 import anyio.to_process
+from anyio.streams.memory import MemoryObjectStreamStatistics
 import pytest
 
 from caqtus.device import DeviceName
@@ -14,6 +15,8 @@ from caqtus.experiment_control.sequence_execution._shot_primitives import (
     ShotParameters,
 )
 from caqtus.experiment_control.sequence_execution.shots_manager import (
+    CompilationConcurrency,
+    ShotCompilationConfig,
     ShotRunnerProtocol,
     ShotCompilerProtocol,
     ShotManager,
@@ -115,3 +118,82 @@ async def test_consumption_failure(anyio_backend):
     except* RuntimeError:
         exception_raised = True
     assert exception_raised
+
+
+class SlowShotCompiler(ShotCompilerMock):
+    def __init__(self):
+        self.concurrent_compilations = 0
+        self.max_concurrent_compilations = 0
+
+    async def compile_shot(
+        self, shot_parameters: ShotParameters
+    ) -> tuple[Mapping[DeviceName, Mapping[str, Any]], float]:
+        self.concurrent_compilations += 1
+        self.max_concurrent_compilations = max(
+            self.max_concurrent_compilations, self.concurrent_compilations
+        )
+        await anyio.sleep(0.01)
+        self.concurrent_compilations -= 1
+        return await super().compile_shot(shot_parameters)
+
+
+@pytest.mark.parametrize("anyio_backend", ["trio"])
+async def test_compilation_concurrency_increases(anyio_backend):
+    shot_compiler = SlowShotCompiler()
+
+    async def collect_data(data_cm):
+        async with data_cm as shots_data:
+            async for _ in shots_data:
+                pass
+
+    async with (
+        ShotManager(
+            ShotRunnerMock(),
+            shot_compiler,
+            ShotRetryConfig(),
+            ShotCompilationConfig(min_workers=1, max_workers=3),
+        ) as (scheduler_cm, data_stream_cm),
+        anyio.create_task_group() as tg,
+    ):
+        tg.start_soon(collect_data, data_stream_cm)
+        tg.start_soon(schedule_shots, scheduler_cm, 20)
+
+    assert shot_compiler.max_concurrent_compilations == 3
+
+
+def execution_queue(waiting_send: int, waiting_receive: int):
+    return MemoryObjectStreamStatistics(
+        current_buffer_used=0,
+        max_buffer_size=0,
+        open_send_streams=1,
+        open_receive_streams=1,
+        tasks_waiting_send=waiting_send,
+        tasks_waiting_receive=waiting_receive,
+    )
+
+
+def test_compilation_concurrency_update():
+    concurrency = CompilationConcurrency(
+        ShotCompilationConfig(min_workers=2, max_workers=4)
+    )
+    assert concurrency.workers == 2
+
+    runner_waiting = execution_queue(waiting_send=0, waiting_receive=1)
+    concurrency.update(runner_waiting)
+    concurrency.update(runner_waiting)
+    concurrency.update(runner_waiting)
+    assert concurrency.workers == 4
+
+    queue_full = execution_queue(waiting_send=1, waiting_receive=0)
+    for _ in range(3):
+        concurrency.update(queue_full)
+    assert concurrency.workers == 2
+
+
+def test_fixed_compilation_concurrency():
+    concurrency = CompilationConcurrency(
+        ShotCompilationConfig(min_workers=2, max_workers=4, adaptive=False)
+    )
+    assert concurrency.workers == 4
+    concurrency.update(execution_queue(waiting_send=1, waiting_receive=0))
+    assert concurrency.workers == 4
@@ -0,0 +1,171 @@
+from caqtus.device import DeviceName
+from caqtus.shot_compilation import SequenceContext, ShotContext
+from caqtus.shot_compilation._compilation_cache import DeviceCompilationCache
+from caqtus.types.expression import Expression
+from caqtus.types.parameter import ParameterSchema
+from caqtus.types.parameter._schema import Float
+from caqtus.shot_compilation.compilation_contexts import LaneCacheInfo
+from caqtus.shot_compilation.timing import to_time
+from caqtus.types.timelane import AnalogTimeLane, DigitalTimeLane, TimeLanes
+from caqtus.types.units import Quantity
+from caqtus.types.variable_name import DottedVariableName
+
+schema = ParameterSchema(
+    _constant_schema={},
+    _variable_schema={
+        DottedVariableName("a"): Float(),
+        DottedVariableName("b"): Float(),
+        DottedVariableName("T"): Float(),
+    },
+)
+
+time_lanes = TimeLanes(
+    step_names=["wait"],
+    step_durations=[Expression("T")],
+    lanes={"digital": DigitalTimeLane([True])},
+)
+
+sequence_context = SequenceContext({}, schema, time_lanes)
+
+
+class CountingCompiler:
+    reuse_shot_parameters = True
+
+    def __init__(self):
+        self.compilations = 0
+
+    def compile_shot_parameters(self, shot_context: ShotContext):
+        self.compilations += 1
+        return self.compile(shot_context)
+
+
+class ParameterCompiler(CountingCompiler):
+    def compile(self, shot_context):
+        return {"a": shot_context.get_parameters()["a"]}
+
+
+class TimingCompiler(CountingCompiler):
+    def compile(self, shot_context):
+        shot_context.get_lane("digital")
+        return {"duration": shot_context.get_shot_duration()}
+
+
+class DependentCompiler(CountingCompiler):
+    def compile(self, shot_context):
+        return {"a": shot_context.get_shot_parameters(DeviceName("parameter"))["a"]}
+
+
+class ShotIndexCompiler(CountingCompiler):
+    reuse_shot_parameters = False
+
+    def compile(self, shot_context):
+        return {"index": self.compilations}
+
+
+def compile_shots(compilers, shots):
+    cache = DeviceCompilationCache()
+    shot_contexts = []
+    for parameters in shots:
+        shot_context = ShotContext(sequence_context, parameters, compilers, cache)
+        for device_name in compilers:
+            shot_context.get_shot_parameters(device_name)
+        shot_contexts.append(shot_context)
+    return shot_contexts
+
+
+def shot(a, b, duration):
+    return {"a": a, "b": b, "T": Quantity(duration, "ms")}
+
+
+def test_devices_are_compiled_when_their_dependencies_change():
+    compilers = {
+        DeviceName("parameter"): ParameterCompiler(),
+        DeviceName("timing"): TimingCompiler(),
+        DeviceName("dependent"): DependentCompiler(),
+        DeviceName("index"): ShotIndexCompiler(),
+    }
+
+    shot_contexts = compile_shots(
+        compilers,
+        [shot(1.0, 0.0, 1), shot(1.0, 1.0, 1), shot(2.0, 2.0, 1), shot(2.0, 3.0, 2)],
+    )
+
+    assert compilers[DeviceName("parameter")].compilations == 2
+    assert compilers[DeviceName("timing")].compilations == 2
+    assert compilers[DeviceName("dependent")].compilations == 2
+    assert compilers[DeviceName("index")].compilations == 4
+    # Lanes read by reused compilations are still marked as used.
+    assert all(not shot_context._unused_lanes() for shot_context in shot_contexts)
+    assert shot_contexts[1].get_shot_parameters(DeviceName("dependent")) == {"a": 1.0}
+
+
+def test_compilers_are_not_reused_by_default():
+    class Compiler:
+        def __init__(self):
+            self.compilations = 0
+
+        def compile_shot_parameters(self, shot_context: ShotContext):
+            self.compilations += 1
+            return {"a": shot_context.get_parameters()["a"]}
+
+    compilers = {DeviceName("device"): Compiler()}
+
+    compile_shots(compilers, [shot(1.0, 0.0, 1), shot(1.0, 0.0, 1)])
+
+    assert compilers[DeviceName("device")].compilations == 2
+
+
+def test_quantities_with_different_units_are_not_reused():
+    compilers = {DeviceName("parameter"): ParameterCompiler()}
+
+    compile_shots(
+        compilers,
+        [
+            {"a": Quantity(1.0, "MHz"), "T": Quantity(1, "ms")},
+            {"a": Quantity(1000.0, "kHz"), "T": Quantity(1, "ms")},
+            {"a": Quantity(1.0, "MHz"), "T": Quantity(1, "ms")},
+        ],
+    )
+
+    assert compilers[DeviceName("parameter")].compilations == 2
+
+
+class LaneCompiler(CountingCompiler):
+    def compile(self, shot_context):
+        return {"values": shot_context.compile_lane("analog", to_time(1e-6)).values}
+
+
+def test_lanes_are_compiled_once_per_shot_and_time_step():
+    lane_sequence_context = SequenceContext(
+        {},
+        schema,
+        TimeLanes(
+            step_names=["wait"],
+            step_durations=[Expression("T")],
+            lanes={"analog": AnalogTimeLane([Expression("a * 1 V")])},
+        ),
+    )
+    compilers = {
+        DeviceName("first"): LaneCompiler(),
+        DeviceName("second"): LaneCompiler(),
+    }
+    cache = DeviceCompilationCache()
+
+    for a in [1.0, 1.0, 2.0]:
+        shot_context = ShotContext(
+            lane_sequence_context, shot(a, 0.0, 1), compilers, cache
+        )
+        for device_name in compilers:
+            shot_context.get_shot_parameters(device_name)
+
+    # The second device reads the lane compiled for the first one, but still depends
+    # on the parameters used by the lane.
+    assert compilers[DeviceName("first")].compilations == 2
+    assert compilers[DeviceName("second")].compilations == 2
+    assert shot_context.get_lane_cache_info() == LaneCacheInfo(
+        hits=1, misses=1, currsize=1
+    )
+    shot_context.compile_lane("analog", to_time(2e-6))
+    assert shot_context.get_lane_cache_info() == LaneCacheInfo(
+        hits=1, misses=2, currsize=2
+    )
@@ -0,0 +1,66 @@
+import numpy as np
+from pytest import approx
+
+from caqtus.shot_compilation._evaluation import parse_expression
+from caqtus.shot_compilation._evaluation._time_dependent_expression._affine_expression import (  # noqa: E501
+    evaluate_affine,
+)
+from caqtus.shot_compilation._evaluation._time_dependent_expression._analog_expression import (  # noqa: E501
+    evaluate_analog_ast,
+)
+from caqtus.shot_compilation.timed_instructions import Pattern, Ramp
+from caqtus.shot_compilation.timing import to_time
+from caqtus.types.expression import Expression
+from caqtus.types.units import Quantity, SECOND, dimensionless
+
+PARAMETERS = {
+    "a": Quantity(2.0, "V"),
+    "b": Quantity(100.0, "mV"),
+    "t0": Quantity(1.0, "ms"),
+    "T": Quantity(4.0, "ms"),
+}
+
+
+def evaluate(body: str, parameters=PARAMETERS):
+    return evaluate_analog_ast(
+        parse_expression(Expression(body)),
+        parameters,
+        to_time(0.5e-6),
+        to_time(10e-6),
+        to_time(1e-6),
+    )
+
+
+def test_affine_expression_is_ramp():
+    result = evaluate("a * (t - t0) / T + b")
+
+    assert isinstance(result.magnitudes, Ramp)
+    assert result.units == Quantity(1, "V").to_base_units().units
+    t = np.arange(1, 10) * 1e-6 - 0.5e-6
+    expected = 2.0 * (t - 1e-3) / 4e-3 + 0.1
+    assert np.array(result.magnitudes.to_pattern().array) == approx(expected)
+
+
+def test_cancelling_terms_are_constant():
+    result = evaluate("(t + t0) * (t - t0) / T - t * t / T")
+
+    assert result.magnitudes == Pattern([-(1e-3**2) / 4e-3]) * 9
+    assert result.units == SECOND
+
+
+def test_constant_power_of_affine_expression():
+    result = evaluate("((t - t0) / T)**1")
+
+    assert isinstance(result.magnitudes, Ramp)
+    assert result.units == dimensionless
+
+
+def test_not_affine():
+    for body in ["t * t / T", "a * sin(t / T)", "b / (t + t0)", "(t / T)**b"]:
+        ast = parse_expression(Expression(body))
+        assert evaluate_affine(ast, PARAMETERS) is None, body
+
+
+def test_undefined_parameter_not_affine():
+    ast = parse_expression(Expression("t / T"))
+    assert evaluate_affine(ast, {}) is None
@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+
+from caqtus.shot_compilation._evaluation import (
+    evaluate_expression_batch,
+    evaluate_scalar_expression,
+    to_parameter_table,
+)
+from caqtus.shot_compilation import SequenceContext, ShotContext
+from caqtus.shot_compilation.compilation_contexts import (
+    evaluate_step_durations,
+    evaluate_step_durations_batch,
+)
+from caqtus.types.expression import Expression
+from caqtus.types.iteration import ExecuteShot, LinspaceLoop, StepsConfiguration
+from caqtus.types.iteration._step_context import StepContext
+from caqtus.types.parameter import ParameterNamespace
+from caqtus.types.recoverable_exceptions import EvaluationError, InvalidValueError
+from caqtus.types.timelane import TimeLanes
+from caqtus.types.units import Quantity, Unit
+from caqtus.types.variable_name import DottedVariableName
+
+A = DottedVariableName("a")
+T = DottedVariableName("t")
+
+shots = [
+    {
+        A: float(i),
+        T: Quantity(i, Unit("ms")) if i % 2 else Quantity(i * 1e3, Unit("us")),
+    }
+    for i in range(10)
+]
+
+
+def test_table_uses_units_of_first_shot():
+    table = to_parameter_table(shots)
+    assert table[T].units == Unit("us")
+    np.testing.assert_allclose(table[T].magnitude, np.arange(10) * 1e3)
+
+
+@pytest.mark.parametrize(
+    "body", ["a + 1", "2 * t", "sin(a) ** 2", "-t + 10 ms", "1 MHz", "Enabled"]
+)
+def test_batch_matches_scalar_evaluation(body):
+    expr = Expression(body)
+    result = evaluate_expression_batch(expr, to_parameter_table(shots), len(shots))
+
+    for index, parameters in enumerate(shots):
+        expected = evaluate_scalar_expression(expr, parameters)
+        if isinstance(expected, Quantity):
+            assert result[index].to_unit(expected.units).magnitude == pytest.approx(
+                expected.magnitude
+            )
+        elif isinstance(expected, bool):
+            assert result[index] == expected
+        else:
+            assert result[index] == pytest.approx(expected)
+
+
+def test_undefined_parameter():
+    with pytest.raises(EvaluationError):
+        evaluate_expression_batch(Expression("b"), to_parameter_table(shots), 10)
+
+
+def test_incompatible_units():
+    with pytest.raises(EvaluationError):
+        evaluate_expression_batch(
+            Expression("t + 1 MHz"), to_parameter_table(shots), 10
+        )
+
+
+@pytest.mark.parametrize("body", ["t", "10 ms * a", "abs(t - 5 ms)"])
+def test_step_durations(body):
+    names = ["load", "wait"]
+    durations = [Expression(body), Expression("10 ms")]
+    table = to_parameter_table(shots)
+
+    result = evaluate_step_durations_batch(names, durations, table, len(shots))
+
+    assert result.shape == (2, len(shots))
+    for index, parameters in enumerate(shots):
+        expected = evaluate_step_durations(names, durations, parameters)
+        assert result[:, index] == pytest.approx([float(d) for d in expected])
+
+
+def test_negative_step_duration():
+    table = to_parameter_table(shots)
+    with pytest.raises(InvalidValueError):
+        evaluate_step_durations_batch(
+            ["step"], [Expression("t - 5 ms")], table, len(shots)
+        )
+
+
+def test_step_duration_not_applied_element_wise():
+    table = to_parameter_table(shots)
+    with pytest.raises(InvalidValueError):
+        evaluate_step_durations_batch(["step"], [Expression("max(t)")], table, 10)
+
+
+def test_step_durations_are_evaluated_when_the_sequence_is_prepared():
+    steps = StepsConfiguration(
+        [
+            LinspaceLoop(
+                variable=T,
+                start=Expression("1 ms"),
+                stop=Expression("10 ms"),
+                num=7,
+                sub_steps=[ExecuteShot()],
+            )
+        ]
+    )
+    time_lanes = TimeLanes(
+        step_names=["load", "wait", "hold"],
+        step_durations=[
+            Expression("2 * t"),
+            Expression("10 ms"),
+            # Can't be evaluated on arrays, so it is evaluated for each shot.
+            Expression("max(t, 5 ms)"),
+        ],
+        lanes={},
+    )
+    constants = ParameterNamespace([])
+    sequence_context = SequenceContext._new({}, steps, constants, time_lanes)
+
+    # noinspection PyProtectedMember
+    assert len(sequence_context._shot_step_durations) == 7
+    # noinspection PyProtectedMember
+    assert all(
+        durations[2] is None
+        for durations in sequence_context._shot_step_durations.values()
+    )
+    for context in steps.walk(StepContext(constants.evaluate())):
+        variables = context.variables
+        shot_context = ShotContext(sequence_context, variables.dict(), {})
+        assert list(shot_context.get_step_durations()) == evaluate_step_durations(
+            time_lanes.step_names, time_lanes.step_durations, variables.to_flat_dict()
+        )
@@ -0,0 +1,88 @@
+import pickle
+
+from caqtus.shot_compilation import SequenceContext, ShotContext
+from caqtus.shot_compilation._evaluation import (
+    Constant,
+    evaluate_scalar_expression,
+    fold_constants,
+    get_folded_constant,
+    parse_expression,
+    use_folded_expressions,
+)
+from caqtus.types.expression import Expression
+from caqtus.types.parameter import ParameterSchema
+from caqtus.types.parameter._schema import Float
+from caqtus.types.timelane import AnalogTimeLane, DigitalTimeLane, TimeLanes
+from caqtus.types.units import Quantity
+from caqtus.types.variable_name import DottedVariableName
+
+schema = ParameterSchema(
+    _constant_schema={
+        DottedVariableName("a"): 2.0,
+        DottedVariableName("f"): Quantity(10.0, "MHz"),
+    },
+    _variable_schema={DottedVariableName("x"): Float()},
+)
+
+
+def fold(body: str):
+    return fold_constants(parse_expression(Expression(body)), schema)
+
+
+def test_constant_expression_is_folded_to_value():
+    assert fold("a * 3 + 1") == 7.0
+    assert fold("2 * f") == Constant(Quantity(20.0, "MHz"))
+
+
+def test_varying_part_is_kept():
+    folded = fold("x * (a + 1)")
+    assert folded == parse_expression(Expression("x * 3.0"))
+
+
+def test_time_is_not_folded():
+    assert fold("a * t") == parse_expression(Expression("2.0 * t"))
+
+
+def test_invalid_sub_expression_is_not_folded():
+    assert fold("a / 0") == parse_expression(Expression("2.0 / 0"))
+
+
+def test_folded_expression_gives_same_result():
+    expression = Expression("x * sin(a) + f / (10 MHz)")
+    parameters = {
+        DottedVariableName("a"): 2.0,
+        DottedVariableName("f"): Quantity(10.0, "MHz"),
+        DottedVariableName("x"): 3.0,
+    }
+    expected = evaluate_scalar_expression(expression, parameters)
+    ast = parse_expression(expression)
+    with use_folded_expressions({str(expression): fold_constants(ast, schema)}):
+        assert get_folded_constant(expression) is None
+        assert evaluate_scalar_expression(expression, parameters) == expected
+
+
+def test_sequence_context_folds_lanes_and_durations():
+    time_lanes = TimeLanes(
+        step_names=["load", "wait"],
+        step_durations=[Expression("a * 1 ms"), Expression("x * 1 ms")],
+        lanes={
+            "analog": AnalogTimeLane([Expression("a * 1 V"), Expression("x * 1 V")]),
+            "digital": DigitalTimeLane([Expression("Enabled"), True]),
+        },
+    )
+    sequence_context = pickle.loads(
+        pickle.dumps(SequenceContext({}, schema, time_lanes))
+    )
+    shot_context = ShotContext(
+        sequence_context,
+        {DottedVariableName("x"): 3.0, DottedVariableName("a"): 2.0},
+        {},
+    )
+
+    assert [float(d) for d in shot_context.get_step_durations()] == [2e-3, 3e-3]
+    # noinspection PyProtectedMember
+    folded = sequence_context._folded_expressions
+    with use_folded_expressions(folded):
+        assert get_folded_constant(Expression("a * 1 V")) == Quantity(2.0, "V")
+        assert get_folded_constant(Expression("Enabled")) is True
+        assert get_folded_constant(Expression("x * 1 V")) is None
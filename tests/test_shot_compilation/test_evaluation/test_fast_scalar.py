@@ -0,0 +1,58 @@
+import pytest
+
+from caqtus.shot_compilation._evaluation import parse_expression
+from caqtus.shot_compilation._evaluation._evaluate_scalar_expression import (
+    evaluate_expression,
+)
+from caqtus.shot_compilation._evaluation._fast_scalar import evaluate_in_base_units
+from caqtus.types.expression import Expression
+from caqtus.types.units import Quantity, Unit, dimensionless
+from caqtus.types.variable_name import DottedVariableName
+
+parameters = {
+    DottedVariableName("f"): Quantity(2.0, Unit("MHz")),
+    DottedVariableName("n"): 3,
+    DottedVariableName("p"): Quantity(-3.0, Unit("dBm")),
+}
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        "n * f",
+        "f * 1 us",
+        "10 MHz + f",
+        "f ** 2 / 1 kHz",
+        "-f / n",
+        "sin(pi / 2) * 1 V",
+        "pi",
+        "5 %",
+        "2 dB",
+        "p",
+        "exp(f * 1 us)",
+    ],
+)
+def test_same_result_as_pint(body):
+    ast = parse_expression(Expression(body))
+    expected = evaluate_expression(ast, parameters)
+    if isinstance(expected, Quantity):
+        expected = expected.to_base_units()
+        if expected.units == dimensionless:
+            expected = expected.magnitude
+
+    result = evaluate_in_base_units(ast, parameters)
+
+    if isinstance(expected, Quantity):
+        assert isinstance(result, Quantity)
+        assert result.units == expected.units
+        assert result.magnitude == pytest.approx(expected.magnitude)
+    else:
+        assert result == pytest.approx(expected)
+
+
+def test_errors_are_raised_by_pint():
+    ast = parse_expression(Expression("f + 1 s"))
+    with pytest.raises(Exception) as expected:
+        evaluate_expression(ast, parameters)
+    with pytest.raises(type(expected.value)):
+        evaluate_in_base_units(ast, parameters)
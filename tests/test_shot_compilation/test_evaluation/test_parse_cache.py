@@ -0,0 +1,54 @@
+import pytest
+
+from caqtus.shot_compilation._evaluation import (
+    evaluate_scalar_expression,
+    parse_expression,
+    get_parse_cache_info,
+    clear_parse_cache,
+    warm_parse_cache,
+)
+from caqtus.types.expression import Expression
+from caqtus.types.recoverable_exceptions import EvaluationError
+from caqtus.types.variable_name import DottedVariableName
+
+
+def test_expression_is_parsed_once():
+    clear_parse_cache()
+    expr = Expression("a + 1")
+
+    for value in range(10):
+        parameters = {DottedVariableName("a"): value}
+        assert evaluate_scalar_expression(expr, parameters) == value + 1
+
+    info = get_parse_cache_info()
+    assert info.misses == 1
+    assert info.hits == 9
+
+
+def test_same_body_shares_tree():
+    assert parse_expression(Expression("2 * b")) is parse_expression(
+        Expression("2 * b")
+    )
+
+
+def test_invalid_expression_is_not_cached():
+    clear_parse_cache()
+    expr = Expression("1 +")
+
+    for _ in range(2):
+        with pytest.raises(EvaluationError):
+            evaluate_scalar_expression(expr, {})
+
+    assert get_parse_cache_info().currsize == 0
+
+
+def test_warm_parse_cache():
+    clear_parse_cache()
+    warm_parse_cache([Expression("a + 1"), "10 ms * b", "1 +"])
+
+    parameters = {DottedVariableName("a"): 1}
+    assert evaluate_scalar_expression(Expression("a + 1"), parameters) == 2
+    info = get_parse_cache_info()
+    assert info.hits == 1
+    # Invalid expressions are not cached.
+    assert info.currsize == 2
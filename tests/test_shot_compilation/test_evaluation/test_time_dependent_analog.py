@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from pytest import approx
+
+from caqtus.shot_compilation._evaluation import parse_expression
+from caqtus.shot_compilation._evaluation._time_dependent_expression._analog_expression import (  # noqa: E501
+    apply,
+    evaluate_analog_ast,
+)
+from caqtus.shot_compilation.timed_instructions import Pattern, create_ramp
+from caqtus.shot_compilation.timing import to_time
+from caqtus.types.expression import Expression
+from caqtus.types.recoverable_exceptions import InvalidValueError
+from caqtus.types.units import InvalidDimensionalityError, Quantity, dimensionless
+
+PARAMETERS = {
+    "a": Quantity(2.0, "V"),
+    "T": Quantity(4.0, "us"),
+    "n": 2,
+}
+
+TIMES = np.arange(10) * 1e-6
+
+
+def evaluate(body: str):
+    return evaluate_analog_ast(
+        parse_expression(Expression(body)),
+        PARAMETERS,
+        to_time(0),
+        to_time(10e-6),
+        to_time(1e-6),
+    )
+
+
+def values(result) -> np.ndarray:
+    return np.array(result.magnitudes.to_pattern().array)
+
+
+def test_function_of_time():
+    result = evaluate("a * exp(-t / T)")
+
+    assert result.units == Quantity(1, "V").to_base_units().units
+    assert values(result) == approx(2.0 * np.exp(-TIMES / 4e-6))
+
+
+def test_nested_functions():
+    result = evaluate("exp(-t / T) * sin(t / T)")
+
+    assert result.units == dimensionless
+    expected = np.exp(-TIMES / 4e-6) * np.sin(TIMES / 4e-6)
+    assert values(result) == approx(expected)
+
+
+def test_power_of_time():
+    result = evaluate("a * (t / T)**n")
+
+    assert result.units == Quantity(1, "V").to_base_units().units
+    assert values(result) == approx(2.0 * (TIMES / 4e-6) ** 2)
+
+
+def test_time_dependent_exponent():
+    result = evaluate("2**(t / T)")
+
+    assert result.units == dimensionless
+    assert values(result) == approx(2 ** (TIMES / 4e-6))
+
+
+def test_function_of_repeated_value_stays_compact():
+    instruction = Pattern([0.5]) * 1000 + create_ramp(0, 1, 10)
+
+    result = apply(instruction, np.sin, "sin()")
+
+    assert result[:1000] == Pattern([np.sin(0.5)]) * 1000
+    assert np.array(result[1000:].to_pattern().array) == approx(
+        np.sin(np.linspace(0, 1, 10, endpoint=False))
+    )
+
+
+def test_function_of_dimensioned_argument():
+    with pytest.raises(InvalidDimensionalityError):
+        evaluate("sin(t)")
+
+
+def test_non_finite_values():
+    with pytest.raises(InvalidValueError):
+        evaluate("log(t / T)")
@@ -0,0 +1,30 @@
+from hypothesis import given
+from hypothesis.strategies import integers, lists
+
+from caqtus.shot_compilation.timing import (
+    get_step_bounds,
+    get_step_ticks,
+    start_tick,
+    to_picoseconds,
+    to_time,
+)
+
+
+def test_to_picoseconds():
+    assert to_picoseconds(to_time("1.5e-9")) == 1500
+    assert to_picoseconds(to_time(0)) == 0
+
+
+@given(
+    lists(integers(min_value=0, max_value=10**9), max_size=20),
+    integers(min_value=1, max_value=10**5),
+)
+def test_step_ticks_match_start_tick(durations_ps, time_step_ps):
+    step_bounds = get_step_bounds(
+        to_time(duration * 1e-12) for duration in durations_ps
+    )
+    time_step = to_time(time_step_ps * 1e-12)
+
+    ticks = get_step_ticks(step_bounds, time_step)
+
+    assert ticks.tolist() == [start_tick(bound, time_step) for bound in step_bounds]
@@ -1,4 +1,12 @@
-from caqtus.types.expression import Expression, expression_builtins, DEFAULT_BUILTINS
+from caqtus.types.expression import (
+    DEFAULT_BUILTINS,
+    Expression,
+    clear_expression_cache,
+    expression_builtins,
+    get_expression_cache_info,
+    warm_expression_cache,
+)
+from caqtus.types.units import Quantity, units
 
 
 def test_default_builtins():
@@ -13,3 +21,41 @@ def test_builtins_override():
         assert expr.evaluate({}) == 42
     finally:
         expression_builtins.reset(token)
+
+
+def test_equal_expressions_share_parsing():
+    clear_expression_cache()
+    first = Expression("a * exp(-t / T)")
+    second = Expression("a * exp(-t / T)")
+
+    assert first.upstream_variables == {"a", "t", "T"}
+    assert second.upstream_variables == {"a", "t", "T"}
+    assert first._ast is second._ast
+    assert get_expression_cache_info().misses == 1
+
+
+def test_warm_expression_cache():
+    clear_expression_cache()
+    warm_expression_cache([Expression("2 a"), "b + 1", "(("])
+
+    assert Expression("2 a").evaluate({"a": 3}) == 6
+    assert Expression("b + 1").upstream_variables == {"b"}
+    # Invalid expressions are not cached.
+    assert get_expression_cache_info().misses == 3
+    assert Expression("((").check_syntax() is not None
+
+
+def test_default_builtins_units():
+    assert "MHz" in DEFAULT_BUILTINS
+    assert "foo" not in DEFAULT_BUILTINS
+    assert DEFAULT_BUILTINS["MHz"] == units["MHz"]
+    assert Expression("10 MHz").evaluate({}) == Quantity(10, "MHz")
+    assert dict(DEFAULT_BUILTINS).keys() >= units.keys()
+
+
+def test_evaluate_only_looks_up_used_variables():
+    class NotIterable(dict):
+        def __iter__(self):
+            raise AssertionError("Variables must not be iterated")
+
+    assert Expression("a + 1").evaluate(NotIterable(a=1, b=2)) == 2
@@ -0,0 +1,32 @@
+import pytest
+
+from caqtus.types.units import (
+    DECIBEL,
+    MEGAHERTZ,
+    NANOSECOND,
+    SECOND,
+    DimensionalityError,
+    Quantity,
+    Unit,
+    dimensionless,
+)
+from caqtus.types.units.base import magnitude_in_base_units, magnitude_in_unit
+
+
+@pytest.mark.parametrize("unit", ["MHz", "ms", "mV", "dBm", "deg", "percent"])
+def test_same_result_as_pint(unit):
+    quantity = Quantity(2.5, Unit(unit))
+    magnitude, base_unit = magnitude_in_base_units(quantity)
+    expected = quantity.to_base_units()
+    assert magnitude == pytest.approx(expected.magnitude)
+    assert base_unit == expected.units
+
+
+def test_convert_to_unit():
+    assert magnitude_in_unit(Quantity(3, NANOSECOND), SECOND) == pytest.approx(3e-9)
+    assert magnitude_in_unit(Quantity(10, dimensionless), DECIBEL) == pytest.approx(10)
+
+
+def test_incompatible_units():
+    with pytest.raises(DimensionalityError):
+        magnitude_in_unit(Quantity(10, MEGAHERTZ), SECOND)
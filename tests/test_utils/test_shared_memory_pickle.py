@@ -0,0 +1,76 @@
+import gc
+import pickle
+import sys
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+from caqtus.shot_compilation.lane_compilation import DimensionedSeries
+from caqtus.shot_compilation.timed_instructions import Pattern, create_ramp
+from caqtus.types.units import dimensionless
+from caqtus.utils._shared_memory_pickle import (
+    dump_to_shared_memory,
+    load_from_shared_memory,
+)
+
+
+def test_pattern_buffers_are_out_of_band():
+    values = np.arange(1000, dtype=np.float64)
+    structured = np.zeros(1000, dtype=[("a", np.float64), ("b", np.bool_)])
+    structured["a"] = values
+    instruction = (
+        Pattern.create_without_copy(structured)["a"] * 2 + create_ramp(0, 1, 10)
+    ) * 3
+    series = DimensionedSeries(instruction, dimensionless)
+
+    buffers = []
+    pickled = pickle.dumps(series, protocol=5, buffer_callback=buffers.append)
+
+    assert len(pickled) < values.nbytes
+    assert sum(buffer.raw().nbytes for buffer in buffers) == values.nbytes
+    assert pickle.loads(pickled, buffers=buffers) == series
+
+
+def test_round_trip_through_shared_memory():
+    instruction = Pattern(np.linspace(0, 1, 100_000)) * 2 + Pattern([0.0, 1.0]) * 10
+    pickled = dump_to_shared_memory({"sequence": instruction})
+
+    assert pickled.shared_memory_name is not None
+    assert len(pickled.payload) < 10_000
+
+    loaded = load_from_shared_memory(pickled)["sequence"]
+
+    assert loaded == instruction
+    assert not loaded.instructions[0].instruction.array.flags.writeable
+    del loaded
+    gc.collect()
+
+
+def test_small_objects_stay_in_band():
+    pickled = dump_to_shared_memory(Pattern([1, 2, 3]))
+
+    assert pickled.shared_memory_name is None
+    assert load_from_shared_memory(pickled) == Pattern([1, 2, 3])
+
+
+def test_block_is_released_once_loaded():
+    pickled = dump_to_shared_memory(Pattern(np.linspace(0, 1, 100_000)))
+    assert pickled.shared_memory_name is not None
+
+    loaded = load_from_shared_memory(pickled)
+    del loaded
+    gc.collect()
+
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=pickled.shared_memory_name)
+
+
+def test_buffers_stay_in_band_on_windows(monkeypatch):
+    monkeypatch.setattr(sys, "platform", "win32")
+    instruction = Pattern(np.linspace(0, 1, 100_000))
+
+    pickled = dump_to_shared_memory(instruction)
+
+    assert pickled.shared_memory_name is None
+    assert load_from_shared_memory(pickled) == instruction